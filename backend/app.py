@@ -1,15 +1,16 @@
 import streamlit as st
 import pandas as pd
-from recommender_backend import recommend, data
+from recommender_backend import recommend, title_index
 
 st.title("🎬 Movie Recommendation Engine")
-movie_list = data['title'].dropna().unique().tolist()
-movie_list.sort()
 
-selected_movie = st.selectbox("Choose a movie you like:", movie_list)
+# Search instead of shipping the whole title list to the browser
+query = st.text_input("Search for a movie you like:")
+matches = [match['title'] for match in title_index.search(query, limit=10)] if query else []
+selected_movie = st.selectbox("Choose a movie you like:", matches)
 n = st.slider("Number of recommendations:", 1, 20, 5)
 
-if st.button("Recommend"):
+if st.button("Recommend") and selected_movie:
     try:
         result = recommend(selected_movie, n)
         st.dataframe(result.reset_index(drop=True))
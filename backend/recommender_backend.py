@@ -1,8 +1,14 @@
 # 1. Imports and Data Loading
+import os
+import sys
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+# Make the shared src package importable when run from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.title_index import TitleSearchIndex
+
 df = pd.read_csv('/Users/sahitipotini/Desktop/movie_rec/netflix_processed.csv')
 
 # 2. Build "soup" feature (if not already in processed file)
@@ -24,8 +30,13 @@ cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
 # 5. Recommendation Function
 indices = pd.Series(df.index, index=df['title'].str.lower())
 
+# Title search index: tolerates typos and powers autocomplete
+title_index = TitleSearchIndex().fit(df['title'])
+
 def recommend(title, n=5):
-    idx = indices[title.lower()]
+    idx = title_index.resolve(title)
+    if idx is None:
+        raise KeyError(f"No title matching '{title}'")
     sim_scores = list(enumerate(cosine_sim[idx]))
     sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
     sim_scores = sim_scores[1:n+1]
@@ -0,0 +1,2 @@
+# Benchmark suite for the recommendation engine.
+# Run with: python -m benchmarks.run --help
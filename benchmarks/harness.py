@@ -0,0 +1,126 @@
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+
+
+def measure(fn, repeats=5, number=1, warmup=1):
+    """
+    Time a callable and summarise the per-call latency.
+
+    Args:
+        fn (callable): Zero-argument function to time
+        repeats (int, optional): Number of timed samples
+        number (int, optional): Calls per sample; the sample time is divided by this
+        warmup (int, optional): Untimed calls made before sampling
+
+    Returns:
+        dict: min/median/mean/p95/max latency in milliseconds plus sample counts
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+
+    samples.sort()
+    p95_idx = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    return {
+        'min_ms': samples[0],
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'p95_ms': samples[p95_idx],
+        'max_ms': samples[-1],
+        'repeats': repeats,
+        'number': number
+    }
+
+
+def environment_info():
+    """Describe the machine and interpreter the benchmarks ran on"""
+    import numpy as np
+    import pandas as pd
+    import sklearn
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def write_results(path, results, meta=None):
+    """
+    Write benchmark results to a JSON file.
+
+    Args:
+        path (str): Output file path
+        results (dict): Mapping of benchmark name to measurement
+        meta (dict, optional): Extra run metadata (sizes, seed, ...)
+    """
+    payload = {
+        'meta': {**environment_info(), **(meta or {})},
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    """Load the 'results' mapping from a JSON file written by write_results"""
+    with open(path, 'r') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, tolerance=0.2, min_delta_ms=0.05, metric='median_ms'):
+    """
+    Compare results against a baseline run.
+
+    A benchmark regresses when it is more than `tolerance` slower than the
+    baseline and the absolute slowdown exceeds `min_delta_ms`, so that
+    sub-microsecond noise on tiny benchmarks does not fail the run.
+
+    Args:
+        results (dict): Current results
+        baseline (dict): Baseline results
+        tolerance (float, optional): Allowed relative slowdown (0.2 = 20%)
+        min_delta_ms (float, optional): Absolute slowdown below which changes are ignored
+        metric (str, optional): Measurement key to compare
+
+    Returns:
+        list: One dict per benchmark present in both runs, with a 'regressed' flag
+    """
+    rows = []
+    for name in sorted(set(results) & set(baseline)):
+        old = baseline[name][metric]
+        new = results[name][metric]
+        ratio = new / old if old > 0 else float('inf')
+        rows.append({
+            'name': name,
+            'baseline': old,
+            'current': new,
+            'ratio': ratio,
+            'regressed': ratio > 1 + tolerance and new - old > min_delta_ms
+        })
+    return rows
+
+
+def format_comparison(rows):
+    """Render comparison rows as a fixed-width text table"""
+    lines = [f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'ratio':>8}"]
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        lines.append(
+            f"{row['name']:<45} {row['baseline']:>10.3f}ms {row['current']:>10.3f}ms "
+            f"{row['ratio']:>7.2f}x{flag}"
+        )
+    return '\n'.join(lines)
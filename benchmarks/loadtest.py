@@ -0,0 +1,383 @@
+"""
+Load-test the Flask API with synthetic user traffic.
+
+Virtual users (asyncio tasks) replay a weighted mix of survey,
+recommendation, similar-title and rating calls. Each user has a
+realistically sized liked-title profile drawn from a skewed popularity
+distribution. The report gives throughput and p50/p95/p99 latency per
+endpoint, plus the server's resident memory growth (read from /metrics).
+
+Usage:
+    python -m benchmarks.loadtest --titles 10000 --duration 30 --concurrency 16
+    python -m benchmarks.loadtest --serve --port 5050 --duration 30
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --duration 60
+    python -m benchmarks.loadtest --output load.json --baseline previous.json
+
+Without --url or --serve, requests go through the Flask test client in this
+process. --serve starts the app (on synthetic data) on a local threaded
+server and drives it over HTTP; --url targets an already running server.
+With --baseline, the run exits with status 1 when an endpoint's p95 is more
+than --tolerance slower than in the baseline.
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from benchmarks.harness import compare, format_comparison, load_results, write_results
+from benchmarks.synthetic import make_catalogue, make_ratings
+
+ENDPOINTS = ('survey', 'recommendations', 'title', 'rate')
+DEFAULT_MIX = 'survey=1,recommendations=4,title=4,rate=2'
+
+
+def parse_mix(spec):
+    """'survey=1,title=4' -> {'survey': 0.2, 'title': 0.8}"""
+    weights = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError('The request mix needs a positive weight')
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class TestClientTransport:
+    """Sends requests through Flask test clients on a thread pool (one client per thread)"""
+
+    def __init__(self, app, workers):
+        self.app = app
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='loadtest')
+
+    def _send(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+    async def request(self, method, path, body=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._send, method, path, body)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class HttpTransport:
+    """
+    Minimal asyncio HTTP/1.1 client (one connection per request, so the
+    latency includes connection setup, as for clients without keep-alive)
+    """
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+
+    async def request(self, method, path, body=None):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        headers = [
+            f'{method} {self.prefix}{path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: close',
+            f'Content-Length: {len(payload)}'
+        ]
+        if body is not None:
+            headers.append('Content-Type: application/json')
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, data = response.partition(b'\r\n\r\n')
+        return int(head.split(b' ', 2)[1]), data
+
+    def close(self):
+        pass
+
+
+class SyntheticUsers:
+    """
+    Users with liked-title profiles: profile sizes are log-normal (most
+    users like a handful of titles, a few like dozens) and titles are drawn
+    with Zipf-skewed popularity
+    """
+
+    def __init__(self, titles, n_users, profile_size=5, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.titles = list(titles)
+        weights = 1.0 / np.arange(1, len(self.titles) + 1) ** 1.1
+        self.popularity = weights[self.rng.permutation(len(self.titles))] / weights.sum()
+        sizes = np.clip(self.rng.lognormal(np.log(profile_size), 0.6, n_users).astype(int), 1, 50)
+        self.profiles = [self.sample_titles(size) for size in sizes]
+
+    def sample_titles(self, n):
+        n = min(n, len(self.titles))
+        picks = self.rng.choice(len(self.titles), size=n, replace=False, p=self.popularity)
+        return [self.titles[i] for i in picks]
+
+    def __len__(self):
+        return len(self.profiles)
+
+
+def make_request(endpoint, user, users):
+    """(method, path, json body) for one call of `endpoint` by user index `user`"""
+    user_id = f'load-{user}'
+    if endpoint == 'survey':
+        return 'GET', '/api/survey', None
+    if endpoint == 'recommendations':
+        return 'POST', '/api/recommendations', {'user_id': user_id, 'liked_titles': users.profiles[user]}
+    title = users.sample_titles(1)[0]
+    if endpoint == 'title':
+        return 'GET', f"/api/title/{quote(title, safe='')}?n=10", None
+    return 'POST', f'/api/user/{user_id}/rate', {'title': title, 'rating': int(users.rng.integers(1, 6))}
+
+
+async def server_memory(transport):
+    """The server's resident memory in bytes (from /metrics), or None if not exported"""
+    try:
+        status, data = await transport.request('GET', '/metrics')
+    except OSError:
+        return None
+    if status != 200:
+        return None
+    for line in data.decode('utf-8').splitlines():
+        if line.startswith('process_resident_memory_bytes'):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+async def run_load(transport, users, mix, concurrency, duration=None, requests=None, think_ms=0.0):
+    """
+    Drive `concurrency` virtual users until `duration` seconds have passed
+    or `requests` calls were made.
+
+    Returns:
+        tuple: ({endpoint: [latency seconds]}, {endpoint: error count}, elapsed seconds)
+    """
+    names = list(mix)
+    probabilities = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    budget = [requests]
+    deadline = None if duration is None else time.perf_counter() + duration
+
+    async def virtual_user(worker):
+        rng = np.random.default_rng(worker)
+        while deadline is None or time.perf_counter() < deadline:
+            if budget[0] is not None:
+                if budget[0] <= 0:
+                    return
+                budget[0] -= 1
+            endpoint = names[rng.choice(len(names), p=probabilities)]
+            method, path, body = make_request(endpoint, int(rng.integers(len(users))), users)
+            start = time.perf_counter()
+            try:
+                status, _ = await transport.request(method, path, body)
+            except OSError:
+                status = None
+            latencies[endpoint].append(time.perf_counter() - start)
+            if status is None or status >= 500:
+                errors[endpoint] += 1
+            if think_ms:
+                await asyncio.sleep(rng.exponential(think_ms / 1000))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(worker) for worker in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarise(latencies, errors, elapsed):
+    """Per-endpoint (and 'all') request counts, throughput and latency percentiles"""
+    results = {}
+    everything = [seconds for samples in latencies.values() for seconds in samples]
+    for name, samples in list(latencies.items()) + [('all', everything)]:
+        if not samples:
+            continue
+        ms = np.array(samples) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        results[f'load.{name}'] = {
+            'requests': len(samples),
+            'errors': sum(errors.values()) if name == 'all' else errors[name],
+            'throughput_rps': len(samples) / elapsed,
+            'median_ms': float(p50),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(ms.max())
+        }
+    return results
+
+
+def build_app(args, data_dir):
+    """Flask app over a synthetic catalogue and rating log (as in the benchmark suite)"""
+    from src.app import create_app, routes
+    from src.app.recommendation_engine import RecommendationEngine
+    from src.app.user_manager import UserManager
+
+    print(f'Generating catalogue with {args.titles} titles...', file=sys.stderr)
+    df = make_catalogue(args.titles, seed=args.seed)
+    ratings_df = make_ratings(df, args.users, args.ratings, seed=args.seed)
+    user_manager = UserManager(data_dir)
+    engine = RecommendationEngine(df, user_manager=user_manager).fit_collaborative(ratings_df)
+    engine.enable_precomputed(list_size=100).refresh_all()
+    engine.precomputed.start(interval=1.0)
+    routes.rec_engine = engine
+    routes.user_manager = user_manager
+    app = create_app({'TESTING': True, 'DEBUG': False, 'METRICS_ENABLED': True})
+    return app, df['title'].tolist(), engine
+
+
+def serve(app, port):
+    """Start `app` on a threaded local server in a daemon thread; returns the server"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass  # one access log line per request would dominate the output
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    return server
+
+
+async def fetch_titles(transport, n=200):
+    """Catalogue titles seen through repeated /api/survey calls (for --url)"""
+    titles = []
+    for _ in range(max(1, n // 50)):
+        status, data = await transport.request('GET', '/api/survey')
+        if status != 200:
+            raise RuntimeError(f'/api/survey returned {status}')
+        titles.extend(item['title'] for item in json.loads(data)['titles'])
+    return list(dict.fromkeys(titles))
+
+
+async def main_async(args, transport, titles):
+    mix = parse_mix(args.mix)
+    if titles is None:
+        titles = await fetch_titles(transport)
+    users = SyntheticUsers(titles, args.users, profile_size=args.profile_size, seed=args.seed)
+
+    if args.warmup:
+        await run_load(transport, users, mix, args.concurrency, duration=args.warmup)
+    memory_before = await server_memory(transport)
+    latencies, errors, elapsed = await run_load(
+        transport, users, mix, args.concurrency,
+        duration=None if args.requests else args.duration, requests=args.requests, think_ms=args.think_ms
+    )
+    memory_after = await server_memory(transport)
+    return summarise(latencies, errors, elapsed), memory_before, memory_after
+
+
+def format_report(results, memory_before, memory_after):
+    lines = [f"{'endpoint':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50':>10} {'p95':>10} {'p99':>10}"]
+    for name, row in sorted(results.items(), key=lambda item: item[0] == 'load.all'):
+        lines.append(
+            f"{name:<24} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>9.1f} "
+            f"{row['p50_ms']:>8.2f}ms {row['p95_ms']:>8.2f}ms {row['p99_ms']:>8.2f}ms"
+        )
+    if memory_before is not None and memory_after is not None:
+        lines.append(
+            f'server RSS {memory_before / 2 ** 20:.1f} MB -> {memory_after / 2 ** 20:.1f} MB '
+            f'({(memory_after - memory_before) / 2 ** 20:+.1f} MB)'
+        )
+    else:
+        lines.append('server RSS: not available (metrics disabled?)')
+    return '\n'.join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process test client)')
+    parser.add_argument('--serve', action='store_true', help='Start the app on a local server and load it over HTTP')
+    parser.add_argument('--port', type=int, default=5050, help='Port for --serve')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint weights, e.g. survey=1,title=4')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load (after warm-up)')
+    parser.add_argument('--requests', type=int, help='Stop after this many requests instead of --duration')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Seconds of untimed load first')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Mean pause between a user\'s requests')
+    parser.add_argument('--titles', type=int, default=5000, help='Synthetic catalogue size (not with --url)')
+    parser.add_argument('--users', type=int, default=500, help='Number of synthetic users')
+    parser.add_argument('--ratings', type=int, default=20000, help='Synthetic rating events (not with --url)')
+    parser.add_argument('--profile-size', type=int, default=5, help='Median liked titles per user')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='JSON results from a previous run to compare p95 latency against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative p95 slowdown before an endpoint counts as a regression')
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    data_dir = None
+    engine = None
+    server = None
+    titles = None
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        data_dir = tempfile.mkdtemp(prefix='loadtest-users-')
+        app, titles, engine = build_app(args, data_dir)
+        if args.serve:
+            server = serve(app, args.port)
+            transport = HttpTransport(f'http://127.0.0.1:{args.port}')
+        else:
+            transport = TestClientTransport(app, workers=args.concurrency)
+
+    try:
+        results, memory_before, memory_after = asyncio.run(main_async(args, transport, titles))
+    finally:
+        transport.close()
+        if server is not None:
+            server.shutdown()
+        if engine is not None:
+            engine.close()
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(format_report(results, memory_before, memory_after))
+    if args.output:
+        write_results(args.output, results, meta={
+            'target': args.url or ('serve' if args.serve else 'test_client'),
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'titles': None if args.url else args.titles,
+            'users': args.users,
+            'server_rss_before': memory_before,
+            'server_rss_after': memory_after
+        })
+
+    if args.baseline:
+        rows = compare(results, load_results(args.baseline), args.tolerance, metric='p95_ms')
+        print()
+        print(format_comparison(rows))
+        if any(row['regressed'] for row in rows):
+            print('\nLatency regression detected', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
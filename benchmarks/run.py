@@ -0,0 +1,607 @@
+"""
+Benchmark the recommendation models, engine, user manager and API.
+
+Usage:
+    python -m benchmarks.run --sizes 1000,10000 --output bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.2
+
+The process exits with status 1 when any benchmark regresses against the
+baseline, so it can gate CI.
+"""
+import argparse
+import itertools
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.harness import compare, format_comparison, load_results, measure, write_results
+from benchmarks.synthetic import make_catalogue, make_ratings, misspell
+
+# A selective filter ("TV shows since 2015 rated TV-MA or TV-14")
+FILTERS = {'type': 'TV Show', 'rating': ['TV-MA', 'TV-14'], 'year_min': 2015}
+
+
+def _cycle(items):
+    """Return a zero-argument function yielding items round-robin"""
+    it = itertools.cycle(items)
+    return lambda: next(it)
+
+
+def bench_models(df, ratings_df, args):
+    """Benchmark the content-based and collaborative models directly"""
+    from src.models.collaborative_filtering import CollaborativeFilteringRecommender
+    from src.models.content_based import ContentBasedRecommender
+
+    rng = np.random.default_rng(args.seed)
+    titles = df['title'].values[rng.integers(0, len(df), args.queries)].tolist()
+    results = {}
+
+    results['content.fit'] = measure(
+        lambda: ContentBasedRecommender().fit(df), repeats=args.fit_repeats, warmup=0
+    )
+    content_model = ContentBasedRecommender().fit(df)
+    next_title = _cycle(titles)
+    results['content.recommend'] = measure(
+        lambda: content_model.recommend(next_title(), n=10),
+        repeats=args.repeats, number=args.queries
+    )
+
+    from src.models.title_index import TitleSearchIndex
+
+    results['search.fit'] = measure(
+        lambda: TitleSearchIndex().fit(df['title']), repeats=args.fit_repeats, warmup=0
+    )
+    title_index = content_model.title_index
+    next_title = _cycle(titles)
+    results['search.lookup'] = measure(
+        lambda: title_index.lookup(next_title()), repeats=args.repeats, number=args.queries
+    )
+    next_prefix = _cycle([t[:4] for t in titles])
+    results['search.autocomplete'] = measure(
+        lambda: title_index.autocomplete(next_prefix()), repeats=args.repeats, number=args.queries
+    )
+    next_typo = _cycle(misspell(titles, seed=args.seed))
+    results['search.fuzzy'] = measure(
+        lambda: title_index.fuzzy(next_typo()), repeats=args.repeats, number=args.queries
+    )
+
+    results['collab.fit'] = measure(
+        lambda: CollaborativeFilteringRecommender().fit(ratings_df),
+        repeats=args.fit_repeats, warmup=0
+    )
+    collab_model = CollaborativeFilteringRecommender().fit(ratings_df)
+    users = ratings_df['user_id'].unique()[:args.queries].tolist()
+    next_user = _cycle(users)
+    results['collab.recommend'] = measure(
+        lambda: collab_model.recommend(next_user(), n=10),
+        repeats=args.repeats, number=len(users)
+    )
+    return results
+
+
+def bench_engine(df, ratings_df, user_manager, args):
+    """Benchmark RecommendationEngine and UserManager"""
+    from src.app.recommendation_engine import RecommendationEngine
+
+    rng = np.random.default_rng(args.seed)
+    results = {}
+
+    results['engine.init'] = measure(
+        lambda: RecommendationEngine(df),
+        repeats=args.fit_repeats, warmup=0
+    )
+    engine = RecommendationEngine(df, user_manager=user_manager)
+    results['engine.fit_collaborative'] = measure(
+        lambda: engine.fit_collaborative(ratings_df), repeats=args.fit_repeats, warmup=0
+    )
+
+    titles = df['title'].values[rng.integers(0, len(df), args.queries)].tolist()
+    next_title = _cycle(titles)
+    results['engine.recommend_similar'] = measure(
+        lambda: engine.recommend_similar(next_title(), n=10),
+        repeats=args.repeats, number=args.queries
+    )
+
+    # Same request with filters pushed down into the top-k
+    results['engine.recommend_similar_filtered'] = measure(
+        lambda: engine.recommend_similar(next_title(), n=10, filters=FILTERS),
+        repeats=args.repeats, number=args.queries
+    )
+
+    # Batched: one personalised request covering a realistic liked-title list
+    liked_lists = [
+        df['title'].values[rng.integers(0, len(df), args.profile_size)].tolist()
+        for _ in range(args.queries)
+    ]
+    # Users known to the collaborative model, so every source contributes
+    rated_users = ratings_df['user_id'].unique()[:args.queries].tolist()
+    next_liked = _cycle(list(zip(rated_users, liked_lists)))
+
+    def recommend_batch():
+        user_id, liked = next_liked()
+        engine.recommend_for_user(user_id, liked_titles=liked, n=10)
+
+    results['engine.recommend_for_user'] = measure(
+        recommend_batch, repeats=args.repeats, number=args.queries
+    )
+
+    def recommend_filtered_batch():
+        user_id, liked = next_liked()
+        engine.recommend_for_user(user_id, liked_titles=liked, n=10, filters=FILTERS)
+
+    results['engine.recommend_for_user_filtered'] = measure(
+        recommend_filtered_batch, repeats=args.repeats, number=args.queries
+    )
+
+    # Precomputed lists: one batched job for every known user, after which a
+    # request is a lookup plus filtering
+    precomputed = engine.enable_precomputed()
+    results['precompute.refresh_all'] = measure(
+        precomputed.refresh_all, repeats=args.fit_repeats, warmup=0
+    )
+    next_rated_user = _cycle(rated_users)
+    results['engine.recommend_for_user_precomputed'] = measure(
+        lambda: engine.recommend_for_user(next_rated_user(), n=10),
+        repeats=args.repeats, number=args.queries
+    )
+
+    # Replay the rating log into the trending index, then time cold-start requests
+    trending_events = ratings_df[['show_id', 'rating', 'timestamp']].values.tolist()
+    positions = engine.hybrid_model.show_index.get_indexer([e[0] for e in trending_events])
+    next_trending = _cycle(list(zip(positions.tolist(), trending_events)))
+
+    def record_trending():
+        pos, (_, rating, timestamp) = next_trending()
+        engine.trending.record(pos, rating * 0.4, timestamp)
+
+    results['trending.record'] = measure(
+        record_trending, repeats=args.repeats, number=min(len(trending_events), 1000)
+    )
+    next_cold_user = _cycle([f'cold-{i}' for i in range(args.queries)])
+    results['engine.cold_start'] = measure(
+        lambda: engine.recommend_for_user(next_cold_user(), n=10),
+        repeats=args.repeats, number=args.queries
+    )
+
+    events = ratings_df[['user_id', 'title', 'rating']].head(args.queries).values.tolist()
+    next_event = _cycle(events)
+
+    def add_rating():
+        user_id, title, rating = next_event()
+        user_manager.add_rating(user_id, title, int(rating))
+
+    results['users.add_rating'] = measure(add_rating, repeats=args.repeats, number=len(events))
+
+    next_liked_user = _cycle(list(enumerate(liked_lists)))
+
+    def update_preferences():
+        i, liked = next_liked_user()
+        user_manager.update_preferences(f'bench-{i}', liked)
+
+    results['users.update_preferences'] = measure(
+        update_preferences, repeats=args.repeats, number=args.queries
+    )
+    return results, engine
+
+
+def bench_api(df, engine, user_manager, args):
+    """Benchmark the Flask endpoints through the test client"""
+    from urllib.parse import quote
+
+    from src.app import create_app, routes
+
+    routes.rec_engine = engine
+    routes.user_manager = user_manager
+    engine.user_manager = user_manager
+    app = create_app({'TESTING': True, 'DEBUG': False})
+    client = app.test_client()
+
+    rng = np.random.default_rng(args.seed)
+    titles = df['title'].values[rng.integers(0, len(df), args.queries)].tolist()
+    results = {}
+
+    def check(response):
+        if response.status_code >= 500:
+            raise RuntimeError(f'API benchmark request failed: {response.status_code}')
+
+    next_typo = _cycle(misspell(titles, seed=args.seed))
+    results['api.search'] = measure(
+        lambda: check(client.get('/api/search', query_string={'q': next_typo()})),
+        repeats=args.repeats, number=args.queries
+    )
+
+    results['api.survey'] = measure(
+        lambda: check(client.get('/api/survey')), repeats=args.repeats
+    )
+
+    next_title = _cycle(titles)
+    results['api.title'] = measure(
+        lambda: check(client.get(f'/api/title/{quote(next_title(), safe="")}?n=10')),
+        repeats=args.repeats, number=args.queries
+    )
+
+    results['api.title_filtered'] = measure(
+        lambda: check(client.get(
+            f'/api/title/{quote(next_title(), safe="")}?n=10&type=TV Show&rating=TV-MA,TV-14&year_min=2015'
+        )),
+        repeats=args.repeats, number=args.queries
+    )
+
+    liked_lists = [
+        df['title'].values[rng.integers(0, len(df), args.profile_size)].tolist()
+        for _ in range(args.queries)
+    ]
+    next_liked = _cycle(list(enumerate(liked_lists)))
+
+    def post_recommendations():
+        i, liked = next_liked()
+        check(client.post('/api/recommendations', json={'user_id': f'api-{i}', 'liked_titles': liked}))
+
+    results['api.recommendations'] = measure(
+        post_recommendations, repeats=args.repeats, number=args.queries
+    )
+
+    next_rating = _cycle(list(enumerate(titles)))
+
+    def post_rating():
+        i, title = next_rating()
+        check(client.post(f'/api/user/api-{i}/rate', json={'title': title, 'rating': 4}))
+
+    results['api.rate'] = measure(post_rating, repeats=args.repeats, number=args.queries)
+
+    # The same kind of writes, args.queries ratings per NDJSON batch
+    import json
+    batch = '\n'.join(
+        json.dumps({'type': 'rating', 'user_id': f'api-{i % 10}', 'title': title, 'rating': 4})
+        for i, title in enumerate(titles)
+    )
+    results['api.events_bulk'] = measure(
+        lambda: check(client.post('/api/events/bulk', data=batch, content_type='application/x-ndjson')),
+        repeats=args.repeats
+    )
+    return results
+
+
+def bench_events(df, ratings_df, args):
+    """Benchmark the append-only event log, compaction and snapshot loading"""
+    import os
+
+    from src.app.user_manager import UserManager
+    from src.data.event_log import EventLog, EventLogCompactor, load_ratings_snapshot
+
+    results = {}
+    log_dir = tempfile.mkdtemp(prefix='bench-events-')
+    try:
+        event_log = EventLog(os.path.join(log_dir, 'events'))
+        user_manager = UserManager(os.path.join(log_dir, 'users'), event_log=event_log)
+        compactor = EventLogCompactor(event_log, user_manager)
+
+        events = ratings_df[['user_id', 'title', 'rating']].values.tolist()
+        next_event = _cycle(events)
+        results['events.add_rating'] = measure(
+            lambda: user_manager.add_rating(*next_event()),
+            repeats=args.repeats, number=min(len(events), 1000)
+        )
+
+        def append_and_compact():
+            for user_id, title, rating in events:
+                event_log.append({'type': 'rating', 'user_id': user_id, 'title': title, 'rating': rating})
+            compactor.run_once()
+
+        # Appending and compacting the whole rating log
+        results['events.compact'] = measure(append_and_compact, repeats=args.fit_repeats, warmup=0)
+        results['events.compact']['events'] = len(events)
+        results['events.snapshot_load'] = measure(
+            lambda: load_ratings_snapshot(compactor.snapshot_path), repeats=args.repeats
+        )
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+    return results
+
+
+# Modules the API must not load at startup
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'wordcloud')
+
+STARTUP_IMPORTS = {
+    'import_engine': 'import src.app.recommendation_engine',
+    'import_app': 'import src.app.routes',
+    'import_utils': 'import src.utils'
+}
+
+
+def bench_startup(args):
+    """
+    Time cold imports of the serving modules in fresh interpreters.
+
+    Only the import itself is timed, not interpreter start-up. Any plotting
+    library loaded as a side effect fails the run.
+    """
+    import json
+    import os
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def timed_run(code):
+        probe = (
+            'import sys, time; _t = time.perf_counter(); ' + code + '; '
+            '_elapsed = time.perf_counter() - _t; import json; '
+            f'print(json.dumps([_elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))'
+        )
+        out = subprocess.run(
+            [sys.executable, '-c', probe], cwd=root, check=True, capture_output=True, text=True
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    results = {}
+    for name, code in STARTUP_IMPORTS.items():
+        samples = []
+        heavy = []
+        for _ in range(args.repeats):
+            elapsed, heavy = timed_run(code)
+            samples.append(elapsed * 1000)
+        if heavy:
+            raise RuntimeError(f'{code!r} imported plotting libraries: {", ".join(heavy)}')
+        samples.sort()
+        results[f'startup/{name}'] = {
+            'min_ms': samples[0],
+            'median_ms': samples[len(samples) // 2],
+            'mean_ms': sum(samples) / len(samples),
+            'p95_ms': samples[-1],
+            'max_ms': samples[-1],
+            'repeats': args.repeats,
+            'number': 1
+        }
+    return results
+
+
+# Worker process for bench_shared: build or attach an engine, serve some
+# queries, then report proportional set size (shared pages split between
+# the processes mapping them) once every worker is up
+_WORKER_CODE = """
+import sys
+import pandas as pd
+from src.app.recommendation_engine import RecommendationEngine
+from src.models.shared_model import SharedModelHandle
+mode, path, queries = sys.argv[1], sys.argv[2], int(sys.argv[3])
+if mode == 'fit':
+    engine = RecommendationEngine(pd.read_pickle(path))
+elif mode == 'shared':
+    engine = RecommendationEngine.from_shared(SharedModelHandle(path))
+if mode != 'imports':
+    for title in engine.df['title'].values[:queries]:
+        engine.recommend_similar(title, n=10)
+print('ready', flush=True)
+sys.stdin.readline()
+with open('/proc/self/smaps_rollup') as f:
+    print(sum(int(line.split()[1]) for line in f if line.startswith('Pss:')), flush=True)
+"""
+
+
+def _workers_pss_mb(mode, path, args):
+    """Mean PSS in MB of args.workers concurrent worker processes"""
+    import os
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-c', _WORKER_CODE, mode, path, str(args.queries)],
+            cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.stdout.readline()
+    pss = []
+    for worker in workers:
+        worker.stdin.write('\n')
+        worker.stdin.flush()
+        pss.append(int(worker.stdout.readline()))
+        worker.wait()
+    return sum(pss) / len(pss) / 1024
+
+
+def bench_shared(df, args):
+    """
+    Export/attach times for the shared model bundle, plus per-worker memory
+    (PSS) with each worker fitting its own model vs attaching to the bundle.
+    Memory needs /proc (Linux) and is reported on stderr.
+    """
+    import os
+    from src.app.recommendation_engine import RecommendationEngine
+    from src.models.shared_model import SharedModelHandle, export_shared_model
+
+    results = {}
+    engine = RecommendationEngine(df)
+    work_dir = tempfile.mkdtemp(prefix='bench-shared-')
+    try:
+        bundles = _cycle([os.path.join(work_dir, f'bundle-{i}') for i in range(1000)])
+        results['shared.export'] = measure(
+            lambda: export_shared_model(engine.content_model, engine.catalogue_filter, bundles()),
+            repeats=args.fit_repeats, warmup=0
+        )
+        bundle = export_shared_model(engine.content_model, engine.catalogue_filter,
+                                     os.path.join(work_dir, 'bundle'))
+        results['shared.attach'] = measure(
+            lambda: RecommendationEngine.from_shared(SharedModelHandle(bundle)),
+            repeats=args.fit_repeats, warmup=0
+        )
+
+        if os.path.exists('/proc/self/smaps_rollup') and args.workers:
+            catalogue_path = os.path.join(work_dir, 'catalogue.pkl')
+            df.to_pickle(catalogue_path)
+            imports = _workers_pss_mb('imports', '', args)
+            fitted = _workers_pss_mb('fit', catalogue_path, args)
+            attached = _workers_pss_mb('shared', bundle, args)
+            print(f'{len(df)} titles, {args.workers} workers: PSS per worker '
+                  f'{fitted:.1f} MB fitted vs {attached:.1f} MB attached '
+                  f'({imports:.1f} MB of it is the interpreter and imports)', file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def bench_sharded(df, args):
+    """
+    Content recommendations from the TF-IDF matrix split across shard
+    processes (scatter-gather) next to the single-process model. Shards
+    only pay off with free cores: each query pays two pipe round-trips.
+    """
+    from src.models.sharded_content import ShardedContentRecommender
+
+    rng = np.random.default_rng(args.seed)
+    titles = df['title'].values[rng.integers(0, len(df), args.queries)].tolist()
+    results = {}
+
+    results['sharded.fit'] = measure(
+        lambda: ShardedContentRecommender(args.shards).fit(df).close(),
+        repeats=args.fit_repeats, warmup=0
+    )
+    content_model = ShardedContentRecommender(args.shards).fit(df)
+    try:
+        next_title = _cycle(titles)
+        results['sharded.recommend'] = measure(
+            lambda: content_model.recommend(next_title(), n=10),
+            repeats=args.repeats, number=args.queries
+        )
+        liked = [df['title'].values[rng.integers(0, len(df), args.profile_size)].tolist()
+                 for _ in range(args.queries)]
+        next_liked = _cycle(liked)
+        results['sharded.score_candidates'] = measure(
+            lambda: content_model.score_candidates(next_liked(), k=100),
+            repeats=args.repeats, number=args.queries
+        )
+    finally:
+        content_model.close()
+    return results
+
+
+def bench_precision(df, args):
+    """
+    Content recommendations with the TF-IDF matrix stored as float32 and
+    int8, plus the quality check (top-k overlap with float64) and matrix
+    sizes, reported on stderr.
+    """
+    from src.models.content_based import ContentBasedRecommender
+
+    rng = np.random.default_rng(args.seed)
+    titles = df['title'].values[rng.integers(0, len(df), args.queries)].tolist()
+    liked = [rng.integers(0, len(df), args.profile_size).tolist() for _ in range(args.queries)]
+    reference = ContentBasedRecommender().fit(df)
+    results = {}
+
+    for precision in ('float32', 'int8'):
+        content_model = ContentBasedRecommender(precision).fit(df)
+        next_title = _cycle(titles)
+        results[f'precision.{precision}.recommend'] = measure(
+            lambda: content_model.recommend(next_title(), n=10),
+            repeats=args.repeats, number=args.queries
+        )
+        results[f'precision.{precision}.score_batch'] = measure(
+            lambda: content_model.score_positions_batch(liked, k=100),
+            repeats=args.repeats
+        )
+        report = content_model.precision_report(reference, k=10)
+        print(f"{len(df)} titles, {precision}: top-10 overlap with float64 {report['overlap']:.3f} "
+              f"(min {report['min_overlap']:.2f}), matrix {report['bytes'] / 2 ** 20:.1f} MB "
+              f"vs {report['reference_bytes'] / 2 ** 20:.1f} MB", file=sys.stderr)
+    return results
+
+
+def run_size(n_titles, args):
+    """Run every benchmark group for one catalogue size"""
+    from src.app.user_manager import UserManager
+
+    print(f'Generating catalogue with {n_titles} titles...', file=sys.stderr)
+    df = make_catalogue(n_titles, seed=args.seed)
+    ratings_df = make_ratings(df, args.users, args.ratings, seed=args.seed)
+
+    data_dir = tempfile.mkdtemp(prefix='bench-users-')
+    try:
+        user_manager = UserManager(data_dir)
+        results = {}
+        if 'models' in args.groups:
+            results.update(bench_models(df, ratings_df, args))
+        if 'events' in args.groups:
+            results.update(bench_events(df, ratings_df, args))
+        if 'shared' in args.groups:
+            results.update(bench_shared(df, args))
+        if 'sharded' in args.groups:
+            results.update(bench_sharded(df, args))
+        if 'precision' in args.groups:
+            results.update(bench_precision(df, args))
+        if 'engine' in args.groups or 'api' in args.groups:
+            engine_results, engine = bench_engine(df, ratings_df, user_manager, args)
+            if 'engine' in args.groups:
+                results.update(engine_results)
+            if 'api' in args.groups:
+                results.update(bench_api(df, engine, user_manager, args))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {f'{n_titles}/{name}': value for name, value in results.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='Comma-separated catalogue sizes (e.g. 1000,100000,1000000)')
+    parser.add_argument('--groups', default='startup,models,events,engine,api',
+                        help='Comma-separated benchmark groups to run (also: shared, sharded, precision)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Worker processes for the shared-model memory comparison')
+    parser.add_argument('--shards', type=int, default=4,
+                        help='Shard processes for the sharded content model benchmarks')
+    parser.add_argument('--users', type=int, default=500, help='Number of synthetic users')
+    parser.add_argument('--ratings', type=int, default=20000, help='Number of synthetic rating events')
+    parser.add_argument('--queries', type=int, default=20, help='Distinct queries per benchmark')
+    parser.add_argument('--profile-size', type=int, default=5, help='Liked titles per synthetic user')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed samples per benchmark')
+    parser.add_argument('--fit-repeats', type=int, default=1, help='Timed samples for fit/init benchmarks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--baseline', help='JSON results from a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown before a benchmark counts as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='Ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(',') if s]
+    args.groups = set(args.groups.split(','))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    results = {}
+    if 'startup' in args.groups:
+        results.update(bench_startup(args))
+    for n_titles in args.sizes:
+        results.update(run_size(n_titles, args))
+
+    write_results(args.output, results, meta={
+        'sizes': args.sizes,
+        'users': args.users,
+        'ratings': args.ratings,
+        'seed': args.seed
+    })
+
+    for name, value in sorted(results.items()):
+        print(f"{name:<45} median {value['median_ms']:>10.3f}ms  p95 {value['p95_ms']:>10.3f}ms")
+
+    if args.baseline:
+        rows = compare(results, load_results(args.baseline), args.tolerance, args.min_delta_ms)
+        print()
+        print(format_comparison(rows))
+        if any(row['regressed'] for row in rows):
+            print('\nPerformance regression detected', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+# Genre lists mirror the 'listed_in' values of the Netflix dataset
+MOVIE_GENRES = [
+    'Dramas', 'Comedies', 'International Movies', 'Documentaries', 'Action & Adventure',
+    'Independent Movies', 'Children & Family Movies', 'Romantic Movies', 'Thrillers',
+    'Horror Movies', 'Stand-Up Comedy', 'Music & Musicals', 'Sci-Fi & Fantasy',
+    'Sports Movies', 'Classic Movies', 'Anime Features', 'LGBTQ Movies', 'Cult Movies'
+]
+TV_GENRES = [
+    'International TV Shows', 'TV Dramas', 'TV Comedies', 'Crime TV Shows', 'Kids\' TV',
+    'Docuseries', 'Romantic TV Shows', 'Reality TV', 'British TV Shows', 'Anime Series',
+    'Spanish-Language TV Shows', 'TV Action & Adventure', 'Korean TV Shows', 'TV Mysteries',
+    'TV Sci-Fi & Fantasy', 'TV Horror', 'Teen TV Shows', 'TV Thrillers'
+]
+RATINGS = ['TV-MA', 'TV-14', 'TV-PG', 'R', 'PG-13', 'TV-Y7', 'TV-Y', 'PG', 'TV-G', 'NR', 'G']
+RATING_PROBS = [0.364, 0.245, 0.098, 0.091, 0.056, 0.038, 0.035, 0.033, 0.025, 0.01, 0.005]
+COUNTRIES = [
+    'United States', 'India', 'United Kingdom', 'Japan', 'South Korea', 'Canada',
+    'Spain', 'France', 'Mexico', 'Egypt', 'Turkey', 'Nigeria', 'Australia', 'Brazil'
+]
+MONTHS = [
+    'January', 'February', 'March', 'April', 'May', 'June', 'July',
+    'August', 'September', 'October', 'November', 'December'
+]
+
+
+def _zipf_probs(n, a, rng):
+    """
+    Zipf-like probabilities over n items, assigned to items in random order.
+
+    Args:
+        n (int): Number of items
+        a (float): Skew exponent (larger means more skewed)
+        rng (Generator): Numpy random generator
+
+    Returns:
+        ndarray: Probabilities summing to 1
+    """
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    weights = weights[rng.permutation(n)]
+    return weights / weights.sum()
+
+
+def _make_vocabulary(size, rng):
+    """Build a vocabulary of pronounceable pseudo-words"""
+    consonants = list('bcdfghjklmnprstvwz')
+    vowels = list('aeiou')
+    words = set()
+    while len(words) < size:
+        length = rng.integers(2, 5)
+        word = ''.join(
+            rng.choice(consonants) + rng.choice(vowels) for _ in range(length)
+        )
+        words.add(word)
+    return np.array(sorted(words))
+
+
+def _join_choices(pool, counts, probs, rng, sep):
+    """Join a variable number of draws from pool for each row"""
+    draws = rng.choice(len(pool), size=int(counts.sum()), p=probs)
+    words = np.asarray(pool, dtype=object)[draws].tolist()
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    return [sep.join(words[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def make_catalogue(n_titles, seed=0):
+    """
+    Generate a synthetic catalogue with the same columns as the Netflix dataset.
+
+    Titles, directors and cast members are drawn with Zipf skew so that a few
+    names are very common, as in the real data.
+
+    Args:
+        n_titles (int): Number of titles to generate
+        seed (int, optional): Random seed
+
+    Returns:
+        DataFrame: Catalogue including a 'soup' column ready for fitting
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _make_vocabulary(4000, rng)
+    title_vocab = np.char.capitalize(vocab)
+    word_probs = _zipf_probs(len(vocab), 1.05, rng)
+
+    n_people = max(200, n_titles // 3)
+    first = np.char.capitalize(_make_vocabulary(600, rng))
+    last = np.char.capitalize(_make_vocabulary(1500, rng))
+    people = np.unique(np.char.add(np.char.add(
+        first[rng.integers(0, len(first), n_people)], ' '),
+        last[rng.integers(0, len(last), n_people)]
+    ))
+    people_probs = _zipf_probs(len(people), 0.9, rng)
+
+    is_movie = rng.random(n_titles) < 0.7
+    types = np.where(is_movie, 'Movie', 'TV Show')
+
+    # Titles: 1-4 words, deduplicated with a sequel suffix
+    titles = pd.Series(_join_choices(
+        title_vocab, rng.integers(1, 5, n_titles), word_probs, rng, ' '
+    ))
+    dup_rank = titles.groupby(titles).cumcount()
+    titles = titles.where(dup_rank == 0, titles + ' ' + (dup_rank + 1).astype(str))
+
+    directors = np.array(_join_choices(
+        people, rng.integers(1, 2, n_titles), people_probs, rng, ', '
+    ), dtype=object)
+    directors[~is_movie & (rng.random(n_titles) < 0.9)] = np.nan
+    cast = _join_choices(people, rng.integers(2, 8, n_titles), people_probs, rng, ', ')
+    countries = rng.choice(COUNTRIES, size=n_titles, p=_zipf_probs(len(COUNTRIES), 1.2, rng))
+
+    # Up to three distinct genres per title, sampled without replacement
+    # for all rows at once via the Gumbel top-k trick
+    genre_counts = rng.integers(1, 4, n_titles)
+    listed_in = np.empty(n_titles, dtype=object)
+    for mask, genres in ((is_movie, MOVIE_GENRES), (~is_movie, TV_GENRES)):
+        genres = np.array(genres, dtype=object)
+        rows = np.flatnonzero(mask)
+        keys = np.log(_zipf_probs(len(genres), 0.8, rng)) + rng.gumbel(size=(len(rows), len(genres)))
+        top = np.argsort(-keys, axis=1)[:, :3]
+        listed_in[rows] = [
+            ', '.join(genres[picks[:c]]) for picks, c in zip(top, genre_counts[rows])
+        ]
+
+    release_year = np.clip(2021 - rng.gamma(1.5, 5.0, n_titles).astype(int), 1925, 2021)
+    added_year = np.maximum(release_year, rng.integers(2008, 2022, n_titles))
+    date_added = [
+        f"{MONTHS[m]} {d}, {y}"
+        for m, d, y in zip(rng.integers(0, 12, n_titles), rng.integers(1, 29, n_titles), added_year)
+    ]
+    duration = np.where(
+        is_movie,
+        np.char.add(np.clip(rng.normal(100, 25, n_titles), 10, 300).astype(int).astype(str), ' min'),
+        np.char.add(
+            np.clip(rng.geometric(0.55, n_titles), 1, 17).astype(str), ' Seasons'
+        )
+    )
+    duration = np.char.replace(duration, '1 Seasons', '1 Season')
+    descriptions = _join_choices(vocab, rng.integers(15, 30, n_titles), word_probs, rng, ' ')
+
+    df = pd.DataFrame({
+        'show_id': [f's{i + 1}' for i in range(n_titles)],
+        'type': types,
+        'title': titles.values,
+        'director': directors,
+        'cast': cast,
+        'country': countries,
+        'date_added': date_added,
+        'release_year': release_year,
+        'rating': rng.choice(RATINGS, size=n_titles, p=RATING_PROBS),
+        'duration': duration,
+        'listed_in': listed_in,
+        'description': [d.capitalize() + '.' for d in descriptions],
+    })
+    df['soup'] = (
+        df['title'].fillna('') + ' ' +
+        df['director'].fillna('') + ' ' +
+        df['cast'].fillna('') + ' ' +
+        df['listed_in'].fillna('') + ' ' +
+        df['description'].fillna('')
+    ).str.replace(',', ' ')
+    return df
+
+
+def make_ratings(catalogue, n_users, n_ratings, seed=0):
+    """
+    Generate a skewed rating log for a catalogue.
+
+    Item popularity follows a Zipf distribution and user activity a log-normal
+    one, so a few titles and a few heavy users dominate the log.
+
+    Args:
+        catalogue (DataFrame): Catalogue with a 'show_id' column
+        n_users (int): Number of distinct users
+        n_ratings (int): Number of rating events to draw before deduplication
+        seed (int, optional): Random seed
+
+    Returns:
+        DataFrame: Columns user_id, show_id, title, rating, timestamp
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_items = len(catalogue)
+    item_probs = _zipf_probs(n_items, 1.1, rng)
+    activity = rng.lognormal(0.0, 1.2, n_users)
+    user_probs = activity / activity.sum()
+
+    users = rng.choice(n_users, size=n_ratings, p=user_probs)
+    items = rng.choice(n_items, size=n_ratings, p=item_probs)
+    # Well-liked titles get higher ratings on average
+    item_bias = rng.normal(0.0, 0.6, n_items)
+    raw = rng.normal(3.6, 1.0, n_ratings) + item_bias[items]
+    ratings = np.clip(np.rint(raw), 1, 5).astype(int)
+    timestamps = 1_600_000_000 + np.sort(rng.integers(0, 90 * 86400, n_ratings))
+
+    ratings_df = pd.DataFrame({
+        'user_id': np.char.add('u', users.astype(str)),
+        'show_id': catalogue['show_id'].values[items],
+        'title': catalogue['title'].values[items],
+        'rating': ratings,
+        'timestamp': timestamps,
+    })
+    return ratings_df.drop_duplicates(subset=['user_id', 'show_id'], keep='last').reset_index(drop=True)
+
+
+def misspell(titles, seed=0):
+    """
+    Apply one random typo (drop, swap, replace or insert a character) to each title.
+
+    Args:
+        titles (list): Titles to corrupt
+        seed (int, optional): Random seed
+
+    Returns:
+        list: Misspelled titles, same order
+    """
+    rng = np.random.default_rng(seed + 2)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    typos = []
+    for title in titles:
+        if len(title) < 4:
+            typos.append(title)
+            continue
+        i = int(rng.integers(1, len(title) - 1))
+        kind = rng.integers(0, 4)
+        if kind == 0:
+            title = title[:i] + title[i + 1:]
+        elif kind == 1:
+            title = title[:i - 1] + title[i] + title[i - 1] + title[i + 1:]
+        elif kind == 2:
+            title = title[:i] + letters[rng.integers(0, 26)] + title[i + 1:]
+        else:
+            title = title[:i] + letters[rng.integers(0, 26)] + title[i:]
+        typos.append(title)
+    return typos
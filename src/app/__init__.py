@@ -9,17 +9,40 @@ def create_app(config=None):
     CORS(app)
     
     # Load default configuration
+    from .instrumentation import REGISTRY, metrics_enabled_from_env
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE_URI='sqlite:///netflix_recommendations.db',
         CACHE_TYPE='simple',
-        DEBUG=True
+        NETFLIX_DATA_PATH='processed/netflix_processed.csv',
+        USER_DATA_DIR='data/users',
+        RATINGS_PATH='processed/ratings.csv',
+        # Background work is opt-in (see config/production.cfg)
+        EVENT_LOG_DIR=None,  # append interactions to a log here instead of rewriting profiles
+        COMPACTION_INTERVAL=30,
+        PRECOMPUTE_INTERVAL=0,  # seconds between precomputed list refreshes; 0 disables them
+        PRECOMPUTED_STORE_PATH=None,  # dbm file for precomputed lists (in memory if None)
+        MODEL_RELOAD_INTERVAL=0,  # seconds between checks for changed data files; 0 disables
+        CONTENT_PRECISION='float64',  # TF-IDF storage: float64, float32 or int8 (quantised)
+        CONTENT_SHARDS=0,  # >0 splits the content model across that many shard processes
+        SHARED_MODEL_DIR=None,  # memory-mapped model bundles shared by all workers on a host
+        BULK_MAX_EVENTS=10000,  # largest NDJSON batch accepted by /api/events/bulk
+        MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # bytes; larger request bodies get a 413
+        ADMIN_TOKEN=None,  # enables /api/admin/* when set (sent as X-Admin-Token)
+        DEBUG=True,
+        METRICS_ENABLED=metrics_enabled_from_env()  # METRICS_ENABLED=0 in the environment disables
     )
     
+    # Deployment settings file (e.g. config/production.cfg), if one is named
+    app.config.from_envvar('RECOMMENDER_SETTINGS', silent=True)
+    
     # Override with custom config if provided
     if config:
         app.config.update(config)
     
+    # Toggle instrumentation (near-zero overhead when disabled)
+    REGISTRY.enabled = app.config['METRICS_ENABLED']
+    
     # Register blueprints
     from .routes import main_bp
     app.register_blueprint(main_bp)
@@ -0,0 +1,264 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+# Latency buckets in seconds (Prometheus convention)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _NullTimer:
+    """No-op context manager returned while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Context manager that records its elapsed time into a histogram"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    In-process registry of histograms, counters and gauges.
+
+    Every call checks `enabled` first, so when disabled the cost of an
+    instrumented block is a single attribute lookup. Metrics are per process;
+    with several workers each one exposes its own values.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}  # name -> {labels -> Histogram}
+        self._counters = {}  # name -> {labels -> float}
+        self._gauges = {}  # name -> {labels -> float or callable}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        """Attach a HELP line to a metric"""
+        self._help[name] = help_text
+
+    def _histogram(self, name, labels):
+        series = self._histograms.get(name)
+        if series is None:
+            with self._lock:
+                series = self._histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = series.setdefault(labels, Histogram())
+        return histogram
+
+    def timer(self, name, **labels):
+        """Context manager timing a block into histogram `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self._histogram(name, tuple(sorted(labels.items()))))
+
+    def timed(self, name, **labels):
+        """Decorator timing every call of the wrapped function"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, value, **labels):
+        """Record a value (in seconds) into histogram `name`"""
+        if self.enabled:
+            self._histogram(name, tuple(sorted(labels.items()))).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """Increment counter `name`"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Set gauge `name`; value may be a callable evaluated at scrape time"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def record_cache(self, cache, hit):
+        """Count a hit or miss for the named cache"""
+        self.inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+    def counter_value(self, name, **labels):
+        """Current value of a counter (0 if never incremented)"""
+        return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def reset(self):
+        """Drop all recorded values (gauges are kept)"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text
+        """
+        lines = []
+
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+
+        # Derived hit ratios so dashboards don't need to compute them
+        ratios = {}
+        for labels, value in counters.get('cache_requests_total', {}).items():
+            label_dict = dict(labels)
+            hits, total = ratios.get(label_dict['cache'], (0, 0))
+            if label_dict['result'] == 'hit':
+                hits += value
+            ratios[label_dict['cache']] = (hits, total + value)
+        if ratios:
+            gauges['cache_hit_ratio'] = {
+                (('cache', cache),): hits / total if total else 0.0
+                for cache, (hits, total) in ratios.items()
+            }
+
+        for name in sorted(counters):
+            self._render_header(lines, name, 'counter')
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for name in sorted(gauges):
+            self._render_header(lines, name, 'gauge')
+            for labels, value in sorted(gauges[name].items(), key=lambda item: item[0]):
+                if callable(value):
+                    try:
+                        value = value()
+                    except Exception:
+                        continue
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for name in sorted(histograms):
+            self._render_header(lines, name, 'histogram')
+            for labels, histogram in sorted(histograms[name].items()):
+                with histogram._lock:
+                    counts = list(histogram.counts)
+                    total, count = histogram.sum, histogram.count
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _render_header(self, lines, name, metric_type):
+        if name in self._help:
+            lines.append(f'# HELP {name} {self._help[name]}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        # Not Linux: fall back to the peak RSS reported by the kernel
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def metrics_enabled_from_env():
+    """METRICS_ENABLED environment variable as a bool (enabled unless 0/false/no)"""
+    return os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+
+# Process-wide registry used by the app; toggled via METRICS_ENABLED
+REGISTRY = MetricsRegistry(enabled=metrics_enabled_from_env())
+REGISTRY.describe('recommendation_stage_seconds', 'Time spent in each stage of recommendation requests')
+REGISTRY.describe('http_request_duration_seconds', 'Latency of API requests by endpoint')
+REGISTRY.describe('user_manager_seconds', 'Time spent loading and saving user profiles')
+REGISTRY.describe('user_manager_operations_total', 'UserManager profile loads and saves')
+REGISTRY.describe('cache_requests_total', 'Cache lookups by cache and result')
+REGISTRY.describe('cache_hit_ratio', 'Fraction of cache lookups that were hits')
+REGISTRY.describe('model_size', 'Size of fitted models by dimension')
+REGISTRY.describe('model_version', 'Model version serving new requests')
+REGISTRY.describe('model_reloads_total', 'Model reloads by result (swapped, rejected, drain_timeout, refit, refit_failed)')
+REGISTRY.describe('model_build_seconds', 'Time to build and validate a new model version')
+REGISTRY.describe('model_refit_seconds', 'Time to refit the collaborative models of the serving version')
+REGISTRY.describe('precompute_batch_seconds', 'Time spent recomputing a batch of precomputed recommendation lists')
+REGISTRY.describe('precompute_dirty_users', 'Users waiting for their precomputed recommendations to be refreshed')
+REGISTRY.describe('bulk_events_total', 'Events received by the bulk ingestion endpoint by result')
+REGISTRY.describe('process_resident_memory_bytes', 'Resident memory of this worker process')
+REGISTRY.set_gauge('process_resident_memory_bytes', resident_memory_bytes)
+
+timer = REGISTRY.timer
+timed = REGISTRY.timed
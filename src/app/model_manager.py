@@ -0,0 +1,296 @@
+import logging
+import os
+import threading
+import time
+
+from .instrumentation import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLease:
+    """A request's hold on one model version; release() when the request ends"""
+
+    def __init__(self, manager, slot):
+        self._manager = manager
+        self._slot = slot
+        self.engine = slot['engine']
+        self.version = slot['version']
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._manager._release(self._slot)
+
+    def __enter__(self):
+        return self.engine
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class ModelManager:
+    """
+    Owns the serving RecommendationEngine and replaces it without downtime.
+
+    New engines are built by `build_engine(version)` (retraining or loading
+    new artifacts) in a background thread, checked by `validate(engine)`, and
+    swapped in by flipping a double-buffered reference: the active slot and
+    the previous slot. Requests pin a version with acquire(); the old engine
+    keeps serving requests that started before the swap and is closed once
+    its last lease is released.
+
+    Cheaper updates that leave the catalogue alone (such as refitting the
+    collaborative models from new ratings) go through
+    `refit_engine(engine, version)`, which updates the serving engine in
+    place under a new version instead of rebuilding it. Requests that
+    already hold a lease keep reporting the version they pinned.
+    """
+
+    def __init__(self, build_engine, validate=None, drain_timeout=30.0, refit_engine=None):
+        self.build_engine = build_engine
+        self.validate = validate or validate_engine
+        self.drain_timeout = drain_timeout
+        self.refit_engine = refit_engine
+        self._slots = [None, None]  # [active, previous]
+        self._next_version = 1
+        self._lock = threading.Condition()
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._watch_thread = None
+        self._stop = threading.Event()
+        self.last_error = None
+
+        REGISTRY.set_gauge('model_version', lambda: self.version or 0)
+
+    @property
+    def engine(self):
+        """The engine new requests are served by"""
+        active = self._slots[0]
+        return active['engine'] if active else None
+
+    @property
+    def version(self):
+        active = self._slots[0]
+        return active['version'] if active else None
+
+    def acquire(self):
+        """Pin the active model version for the duration of a request"""
+        with self._lock:
+            slot = self._slots[0]
+            if slot is None:
+                raise RuntimeError('No model loaded')
+            slot['in_flight'] += 1
+        return ModelLease(self, slot)
+
+    def _release(self, slot):
+        with self._lock:
+            slot['in_flight'] -= 1
+            self._lock.notify_all()
+
+    def load(self):
+        """
+        Build, validate and swap in a new model version (blocking).
+
+        Returns:
+            int: The new version; raises if building or validation fails,
+            in which case the active version keeps serving
+        """
+        with self._reload_lock:
+            version = self._next_version
+            self._next_version += 1
+            started = time.perf_counter()
+            engine = None
+            try:
+                engine = self.build_engine(version)
+                engine.model_version = version
+                self.validate(engine)
+            except Exception as e:
+                if engine is not None:
+                    engine.close()
+                self.last_error = e
+                REGISTRY.inc('model_reloads_total', result='rejected')
+                raise
+            REGISTRY.observe('model_build_seconds', time.perf_counter() - started)
+            self.swap(engine, version)
+            REGISTRY.inc('model_reloads_total', result='swapped')
+            self.last_error = None
+            return version
+
+    def reload_async(self):
+        """
+        Start load() in a background thread unless one is already running.
+
+        Returns:
+            bool: Whether a reload was started
+        """
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+
+            def run():
+                try:
+                    self.load()
+                except Exception:
+                    # Counted by load() and kept in last_error; the previous
+                    # model keeps serving
+                    logger.exception('Model reload failed')
+
+            self._reload_thread = threading.Thread(target=run, name='model-reload', daemon=True)
+            self._reload_thread.start()
+            return True
+
+    def refit(self):
+        """
+        Apply refit_engine to the serving engine under the next version
+        (blocking; waits for a reload in progress, which already picks up
+        the same changes).
+
+        Returns:
+            bool: Whether the engine was refitted (refit_engine moved it to
+            the new version); raises if refit_engine fails, in which case
+            the engine keeps serving its current models
+        """
+        if self.refit_engine is None:
+            return False
+        with self._reload_lock:
+            slot = self._slots[0]
+            if slot is None:
+                return False
+            engine = slot['engine']
+            version = self._next_version
+            started = time.perf_counter()
+            try:
+                self.refit_engine(engine, version)
+            except Exception as e:
+                self.last_error = e
+                REGISTRY.inc('model_reloads_total', result='refit_failed')
+                raise
+            if engine.model_version != version:
+                return False
+            self._next_version += 1
+            with self._lock:
+                # New leases (and X-Model-Version) get the new version; the
+                # slot itself stays, so in-flight requests are still counted
+                slot['version'] = version
+            REGISTRY.observe('model_refit_seconds', time.perf_counter() - started)
+            REGISTRY.inc('model_reloads_total', result='refit')
+            self.last_error = None
+            return True
+
+    def swap(self, engine, version):
+        """Atomically make `engine` the active model; retire the old one once drained"""
+        with self._lock:
+            # The previous-but-one version (if still here) already has its drain thread
+            self._slots = [{'engine': engine, 'version': version, 'in_flight': 0}, self._slots[0]]
+            previous = self._slots[1]
+        if previous is not None:
+            threading.Thread(
+                target=self._retire, args=(previous,), name=f'model-drain-{previous["version"]}', daemon=True
+            ).start()
+
+    def _retire(self, slot):
+        """
+        Wait for a slot's in-flight requests, then close its engine. An engine
+        is never closed under a live request: past `drain_timeout` the wait
+        is only reported (model_reloads_total{result="drain_timeout"}).
+        """
+        with self._lock:
+            drained = self._lock.wait_for(lambda: slot['in_flight'] == 0, timeout=self.drain_timeout)
+        if not drained:
+            REGISTRY.inc('model_reloads_total', result='drain_timeout')
+            with self._lock:
+                self._lock.wait_for(lambda: slot['in_flight'] == 0)
+        with self._lock:
+            if self._slots[1] is slot:
+                self._slots[1] = None
+        slot['engine'].close()
+
+    def wait_drained(self, timeout=None):
+        """Block until the previous version has no requests in flight"""
+        with self._lock:
+            return self._lock.wait_for(
+                lambda: self._slots[1] is None or self._slots[1]['in_flight'] == 0, timeout=timeout
+            )
+
+    def status(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'in_flight': {
+                    slot['version']: slot['in_flight'] for slot in self._slots if slot is not None
+                },
+                'reloading': self._reload_thread is not None and self._reload_thread.is_alive(),
+                'last_error': str(self.last_error) if self.last_error else None
+            }
+
+    def start(self, interval=300.0, should_reload=None, should_refit=None):
+        """
+        Check every `interval` seconds and reload in the background when
+        `should_reload()` returns True (default: always); otherwise refit
+        the serving engine when `should_refit()` returns True.
+        """
+        if self._watch_thread is not None:
+            return self
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    # Ask both, so each watcher tracks the latest state
+                    reload = should_reload is None or should_reload()
+                    refit = should_refit is not None and should_refit()
+                except Exception:
+                    logger.exception('Checking for changed model artifacts failed')
+                    REGISTRY.inc('model_reloads_total', result='rejected')
+                    continue
+                if reload:
+                    self.reload_async()
+                elif refit:
+                    try:
+                        self.refit()
+                    except Exception:
+                        # Counted by refit(); the current models keep serving
+                        logger.exception('Model refit failed')
+
+        self._watch_thread = threading.Thread(target=loop, name='model-watch', daemon=True)
+        self._watch_thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+            self._watch_thread = None
+
+
+def validate_engine(engine, n=5):
+    """
+    Sanity checks before a new engine is swapped in: the catalogue is not
+    empty, a title gets similar titles and a new user gets n recommendations.
+    Raises ValueError otherwise.
+    """
+    if len(engine.df) <= n:
+        raise ValueError(f'Catalogue too small: {len(engine.df)} titles')
+    title = engine.df['title'].iloc[0]
+    if not engine.recommend_similar(title, n=n):
+        raise ValueError(f'No similar titles for {title!r}')
+    if len(engine.recommend_for_user('__model_validation__', n=n)) != n:
+        raise ValueError('Cold start returned fewer than n recommendations')
+
+
+def artifact_watcher(paths):
+    """should_reload callable for ModelManager.start: True when any file's mtime changed"""
+    def mtimes():
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+    seen = [mtimes()]
+
+    def changed():
+        current = mtimes()
+        if current != seen[0]:
+            seen[0] = current
+            return True
+        return False
+
+    return changed
@@ -0,0 +1,160 @@
+import logging
+import threading
+
+from src.data.recommendation_store import RecommendationStore
+from .instrumentation import REGISTRY, timer
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationPrecomputer:
+    """
+    Keeps precomputed top-N recommendation lists for every known user,
+    tagged in the store with the engine's model_version.
+
+    Lists are computed in batches through HybridRecommender.score_batch and
+    kept in a RecommendationStore. Interaction events only mark their user
+    dirty; refresh() (run on demand or from a background thread) recomputes
+    just the dirty users, so writes never pay for recommendation scoring.
+    """
+
+    def __init__(self, engine, store=None, list_size=100, batch_size=256):
+        self.engine = engine
+        self.store = store if store is not None else RecommendationStore()
+        self.list_size = list_size
+        self.batch_size = batch_size
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        REGISTRY.set_gauge('model_size', lambda: len(self.store), model='precomputed', dimension='users')
+        REGISTRY.set_gauge('model_size', self.store.nbytes, model='precomputed', dimension='bytes')
+        REGISTRY.set_gauge('precompute_dirty_users', lambda: len(self._dirty))
+
+    def mark_dirty(self, event):
+        """UserManager listener: the event's user needs a fresh list"""
+        with self._lock:
+            self._dirty.add(event['user_id'])
+
+    def mark_users_dirty(self, user_ids):
+        """The given users need fresh lists (e.g. their ratings were refitted)"""
+        with self._lock:
+            self._dirty.update(user_ids)
+
+    def mark_all_dirty(self):
+        """Every known user needs a fresh list (e.g. after retraining)"""
+        self.mark_users_dirty(self.known_users())
+
+    def is_dirty(self, user_id):
+        return user_id in self._dirty
+
+    def known_users(self):
+        """Users with a profile or collaborative ratings"""
+        users = []
+        if self.engine.user_manager is not None:
+            users.extend(self.engine.user_manager.user_ids())
+        collab_model = self.engine.collab_model
+        if collab_model is not None:
+            users.extend(collab_model.user_item_matrix.index)
+        return list(dict.fromkeys(users))
+
+    def _liked_titles(self, user_id):
+        if self.engine.user_manager is None:
+            return []
+        return self.engine.user_manager.get_profile(user_id).get('liked_titles', [])
+
+    def refresh(self, user_ids=None):
+        """
+        Recompute lists for the given users (default: the dirty ones).
+
+        Returns:
+            int: Number of users recomputed
+        """
+        with self._run_lock:
+            with self._lock:
+                user_ids = list(self._dirty if user_ids is None else user_ids)
+                # Events arriving while we compute mark the user dirty again
+                self._dirty.difference_update(user_ids)
+
+            for start in range(0, len(user_ids), self.batch_size):
+                batch = user_ids[start:start + self.batch_size]
+                try:
+                    self._refresh_batch(batch)
+                except Exception:
+                    logger.exception('Precomputing lists for %d user(s) failed; they stay dirty',
+                                     len(user_ids) - start)
+                    with self._lock:
+                        self._dirty.update(user_ids[start:])
+                    raise
+            return len(user_ids)
+
+    def _refresh_batch(self, batch):
+        # Read before scoring: a refit swaps the models before the version,
+        # so lists are never stored under a newer version than their models
+        version = self.engine.model_version
+        with timer('precompute_batch_seconds'):
+            title_lists = [self._liked_titles(user_id) for user_id in batch]
+            results = self.engine.hybrid_model.score_batch(batch, title_lists, n=self.list_size)
+            for user_id, (positions, scores) in zip(batch, results):
+                if len(positions):
+                    self.store.put(user_id, positions, scores, version=version)
+                else:
+                    # Nothing to personalise on: requests fall back to cold start
+                    self.store.delete(user_id, version=version)
+
+    def refresh_all(self):
+        """Recompute lists for every known user"""
+        return self.refresh(self.known_users())
+
+    def lookup(self, user_id, allow_stale=False):
+        """
+        Stored (positions, scores) for a user, best first, or None on a miss.
+        A dirty user's list is only returned with allow_stale=True.
+        """
+        if not allow_stale and self.is_dirty(user_id):
+            return None
+        return self.store.get(user_id, version=self.engine.model_version)
+
+    def drop_version(self, version):
+        """
+        Drop the lists of a replaced model version, after waiting for a
+        refresh in progress that may still be storing them
+        """
+        with self._run_lock:
+            return self.store.drop_version(version)
+
+    def start(self, interval=10.0):
+        """
+        Refresh dirty users in a daemon thread right away, then every
+        `interval` seconds
+        """
+        if self._thread is not None:
+            return self
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception:
+                    # Users stay dirty and are retried on the next tick
+                    logger.exception('Refreshing precomputed lists for model version %s failed',
+                                     self.engine.model_version)
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=loop, name='recommendation-precompute', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop refreshing and drop this model version's lists from the store"""
+        self.stop()
+        self.store.drop_version(self.engine.model_version)
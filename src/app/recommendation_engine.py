@@ -1,26 +1,170 @@
+from collections.abc import Mapping
 import pandas as pd
 import numpy as np
 from src.models.content_based import ContentBasedRecommender
 from src.models.collaborative_filtering import CollaborativeFilteringRecommender
-from src.utils.helpers import split_genres, create_user_profile
+from src.models.filters import CatalogueFilter
+from src.models.hybrid_model import HybridRecommender
+from src.models.popularity import PopularityRecommender
+from src.models.sharded_content import ShardedContentRecommender
+from src.models.trending import TrendingIndex
+from src.utils.core import split_genres, create_user_profile
+from .instrumentation import REGISTRY, timer
+from .precompute import RecommendationPrecomputer
+
+STAGE_METRIC = 'recommendation_stage_seconds'
 
 class RecommendationEngine:
     """Central recommendation engine that combines different recommendation strategies"""
     
-    def __init__(self, df):
-        """Initialize with preprocessed Netflix data"""
-        self.df = df
-        self.content_model = ContentBasedRecommender().fit(df)
+    def __init__(self, df, user_manager=None, model_version=0, shared=None, content_shards=0,
+                 content_precision='float64'):
+        """
+        Initialize with preprocessed Netflix data, or attach to the arrays
+        of a shared model bundle (`shared`, a SharedModelHandle; see from_shared).
+        With content_shards > 0 the TF-IDF matrix is split across that many
+        shard processes (see ShardedContentRecommender). content_precision
+        sets the TF-IDF storage precision ('float64', 'float32' or 'int8').
+        """
+        self.user_manager = user_manager
+        self.model_version = model_version  # tags caches derived from these models
+        self.shared = shared
+        if shared is not None:
+            self.content_model = ContentBasedRecommender(shared.tfidf_precision).attach(
+                shared.catalogue(), shared.tfidf_matrix(), shared.title_index()
+            )
+            self.catalogue_filter = shared.catalogue_filter()
+            # Long text columns stay in the bundle and are decoded per result
+            self.text_columns = shared.text_columns()
+        elif content_shards:
+            self.content_model = ShardedContentRecommender(content_shards, content_precision).fit(df)
+            self.catalogue_filter = CatalogueFilter().fit(self.content_model.df)
+            self.text_columns = {}
+        else:
+            self.content_model = ContentBasedRecommender(content_precision).fit(df)
+            self.catalogue_filter = CatalogueFilter().fit(self.content_model.df)
+            self.text_columns = {}
+        self.df = self.content_model.df  # positional index shared with the models
         self.collab_model = None  # Will be initialized when we have user ratings
+        self.popularity_model = None
+        self.hybrid_model = HybridRecommender(self.content_model)
+        self.trending = TrendingIndex(self.df)
+        self.precomputed = None  # see enable_precomputed
+        
+        # Feed likes, ratings and watches into the trending index
+        if user_manager is not None:
+            user_manager.subscribe(self.record_event)
+        
+        # Title -> index / genres lookups, as views over the title index
+        # rather than per-worker dicts
+        title_index = self.content_model.title_index
+        listed_in = self.df['listed_in'].values
+        self.title_to_idx = _TitleMapping(title_index, lambda pos: pos)
+        self.title_to_genres = _TitleMapping(title_index, lambda pos: split_genres(listed_in[pos]))
+        
+        self._register_model_metrics()
+    
+    @classmethod
+    def from_shared(cls, handle, user_manager=None, model_version=0):
+        """Engine over a SharedModelHandle (src.models.shared_model) instead of fitting"""
+        return cls(None, user_manager=user_manager, model_version=model_version, shared=handle)
+    
+    # Trending weight per interaction type; ratings scale with the rating value
+    EVENT_WEIGHTS = {'watch': 1.0, 'like': 1.0, 'rating': 0.4}
+    
+    def record_event(self, event):
+        """Update the trending index from a UserManager event"""
+        pos = self.content_model.title_index.lookup(event['title'])
+        if pos is None:
+            return
+        weight = self.EVENT_WEIGHTS.get(event['type'], 1.0)
+        if event['type'] == 'rating':
+            weight *= float(event.get('rating') or 0)
+        if weight > 0:
+            self.trending.record(pos, weight, event.get('timestamp'))
+    
+    def warm_up_trending(self, events):
+        """Replay historical events (e.g. UserManager.iter_events()) into the trending index"""
+        for event in events:
+            self.record_event(event)
+        return self
+    
+    def fit_collaborative(self, ratings_df, model_version=None):
+        """
+        Fit the collaborative and popularity models from a ratings DataFrame
+        (user_id, show_id, rating) and enable them in the hybrid blend.
+        Frames keyed by 'title' instead of 'show_id' (such as the event log
+        snapshot) are mapped onto the catalogue first.
         
-        # Map titles to indices for quick lookup
-        self.title_to_idx = {title.lower(): i for i, title in enumerate(df['title'])}
+        Also used to refit a serving engine in place when only the ratings
+        changed (ModelManager.refit), under a new `model_version`: the new
+        models change every user's blended scores, so the lists precomputed
+        by the previous version are dropped and every user is recomputed.
+        Without ratings nothing changes, including the version.
+        """
+        if ratings_df is not None and 'show_id' not in ratings_df.columns:
+            ratings_df = self.ratings_by_show_id(ratings_df)
+        if ratings_df is None or len(ratings_df) == 0:
+            return self
+        collab_model = CollaborativeFilteringRecommender().fit(ratings_df)
+        popularity_model = PopularityRecommender().fit(ratings_df)
+        self.collab_model = self.hybrid_model.collab_model = collab_model
+        self.popularity_model = self.hybrid_model.popularity_model = popularity_model
         
-        # Extract genre info for later use
-        self.title_to_genres = {
-            row['title']: split_genres(row['listed_in']) 
-            for _, row in df.iterrows()
-        }
+        previous_version = self.model_version
+        if model_version is not None:
+            self.model_version = model_version
+        if self.precomputed is not None:
+            if self.model_version != previous_version:
+                self.precomputed.drop_version(previous_version)
+            self.precomputed.mark_all_dirty()
+        
+        user_item_matrix = self.collab_model.user_item_matrix
+        REGISTRY.set_gauge('model_size', user_item_matrix.shape[0], model='collaborative', dimension='users')
+        REGISTRY.set_gauge('model_size', user_item_matrix.shape[1], model='collaborative', dimension='items')
+        return self
+    
+    def enable_precomputed(self, store=None, list_size=100):
+        """
+        Serve personalised requests from precomputed per-user lists.
+        Returns the RecommendationPrecomputer; the caller decides when to
+        refresh (refresh_all, or mark_all_dirty and start() to compute
+        everything in the background, then only dirty users).
+        """
+        self.precomputed = RecommendationPrecomputer(self, store=store, list_size=list_size)
+        if self.user_manager is not None:
+            self.user_manager.subscribe(self.precomputed.mark_dirty)
+        return self.precomputed
+    
+    def close(self):
+        """Detach from the user manager and stop background work (when retired by a model swap)"""
+        if self.user_manager is not None:
+            self.user_manager.unsubscribe(self.record_event)
+            if self.precomputed is not None:
+                self.user_manager.unsubscribe(self.precomputed.mark_dirty)
+        if self.precomputed is not None:
+            self.precomputed.close()
+        self.content_model.close()
+    
+    def ratings_by_show_id(self, ratings_df):
+        """Map a (user_id, title, rating) frame to (user_id, show_id, rating), dropping unknown titles"""
+        lookup = self.content_model.title_index.lookup
+        positions = ratings_df['title'].map(lookup)
+        known = positions.notna()
+        return pd.DataFrame({
+            'user_id': ratings_df.loc[known, 'user_id'].values,
+            'show_id': self.df['show_id'].values[positions[known].astype(int).values],
+            'rating': ratings_df.loc[known, 'rating'].values
+        })
+    
+    def _register_model_metrics(self):
+        """Publish model size gauges for the /metrics endpoint"""
+        stats = self.content_model.matrix_stats()
+        REGISTRY.set_gauge('model_size', len(self.df), model='catalogue', dimension='titles')
+        for dimension in ('features', 'nnz', 'bytes'):
+            REGISTRY.set_gauge('model_size', stats[dimension], model='content', dimension=dimension)
+        if self.shared is not None:
+            REGISTRY.set_gauge('model_size', self.shared.nbytes, model='shared', dimension='bytes')
     
     def get_diverse_titles(self, n=50):
         """Get a diverse sample of titles for the initial survey"""
@@ -44,7 +188,7 @@ class RecommendationEngine:
                                 'title': row['title'],
                                 'type': row['type'],
                                 'genre': genre,
-                                'description': row['description'][:100] + '...' if len(row['description']) > 100 else row['description']
+                                'description': self._short_description(row)
                             })
         
         # If we don't have enough titles, add random ones
@@ -60,70 +204,180 @@ class RecommendationEngine:
                         'title': row['title'],
                         'type': row['type'],
                         'genre': genre,
-                        'description': row['description'][:100] + '...' if len(row['description']) > 100 else row['description']
+                        'description': self._short_description(row)
                     })
         
         return sample_titles[:n]
     
-    def recommend_similar(self, title, n=5):
-        """Recommend content similar to the given title"""
+    def recommend_similar(self, title, n=5, filters=None):
+        """
+        Recommend content similar to the given title.
+        `filters` (see CatalogueFilter.mask) are applied inside the top-k.
+        """
         try:
-            recommendations = self.content_model.recommend(title, n=n)
-            return self._format_recommendations(recommendations)
+            with timer(STAGE_METRIC, stage='filter'):
+                mask = self.catalogue_filter.mask(filters)
+            with timer(STAGE_METRIC, stage='similarity'):
+                recommendations = self.content_model.recommend(title, n=n, mask=mask)
+            with timer(STAGE_METRIC, stage='format'):
+                return self._format_recommendations(recommendations)
         except KeyError:
             # Title not found, return empty list
             return []
     
-    def recommend_for_user(self, user_id, liked_titles=None, n=10):
-        """Get personalized recommendations for a user"""
+    def resolve_title(self, title):
+        """
+        The catalogue title recommend_similar uses for `title` (exact, or the
+        closest fuzzy match), or None when nothing matches
+        """
+        pos = self.content_model.title_index.resolve(title)
+        return None if pos is None else self.content_model.df['title'].iloc[pos]
+    
+    def search_titles(self, query, limit=10):
+        """Autocomplete and fuzzy-match titles for a search box"""
+        with timer(STAGE_METRIC, stage='search'):
+            matches = self.content_model.title_index.search(query, limit=limit)
+        rows = self.content_model.df
+        return [
+            {
+                'id': rows.at[match['id'], 'show_id'],
+                'title': match['title'],
+                'type': rows.at[match['id'], 'type'],
+                'score': round(match['score'], 4),
+                'match': match['match']
+            }
+            for match in matches
+        ]
+    
+    def recommend_for_user(self, user_id, liked_titles=None, n=10, filters=None, allow_stale=False):
+        """
+        Get personalized recommendations for a user.
+        `filters` (see CatalogueFilter.mask) are applied inside the top-k of
+        every candidate source, so n matching titles come back whenever n exist.
+        
+        With precomputed lists enabled, the user's stored list is used when it
+        is up to date (or `allow_stale` is set) and still has n titles after
+        filtering; otherwise the list is computed live. Either way, titles
+        the user already liked or rated are never recommended.
+        """
         from .user_manager import UserManager
-        user_manager = UserManager()
+        user_manager = self.user_manager or UserManager()
+        
+        with timer(STAGE_METRIC, stage='filter'):
+            mask = self.catalogue_filter.mask(filters)
+        with timer(STAGE_METRIC, stage='profile_load'):
+            profile = user_manager.get_profile(user_id)
+        seen = set(profile.get('liked_titles', [])) | set(profile.get('ratings', {})) | set(liked_titles or [])
+        lookup = self.content_model.title_index.lookup
+        seen_positions = {pos for pos in map(lookup, seen) if pos is not None}
+        
+        combined_df = self._precomputed_candidates(user_id, seen, n, mask, allow_stale)
+        if combined_df is not None:
+            return self._rerank_and_format(combined_df, n, profile)
         
         # If no liked titles provided, get from user history
         if not liked_titles:
-            profile = user_manager.get_profile(user_id)
             liked_titles = profile.get('liked_titles', [])
         
-        if not liked_titles:
-            # Cold start: return diverse recommendations
-            return self._format_recommendations(self.df.sample(n))
-        
-        # Content-based recommendations for each liked title
-        all_recommendations = []
-        for title in liked_titles:
-            try:
-                similar_titles = self.content_model.recommend(title, n=3)
-                all_recommendations.append(similar_titles)
-            except KeyError:
-                # Title not found, skip
-                continue
-        
-        if not all_recommendations:
-            return self._format_recommendations(self.df.sample(n))
-        
-        # Combine all recommendations
-        combined_df = pd.concat(all_recommendations)
-        
-        # Remove duplicates and already liked titles
-        combined_df = combined_df.drop_duplicates(subset=['show_id'])
-        combined_df = combined_df[~combined_df['title'].isin(liked_titles)]
-        
-        # Sort by relevance (if we have multiple recommendations)
+        if not liked_titles and not (self.collab_model and self.collab_model.knows_user(user_id)):
+            return self._cold_start(n, filters, mask=mask, exclude=seen_positions)
+        
+        with timer(STAGE_METRIC, stage='similarity'):
+            # Blend content (liked titles), collaborative and popularity scores
+            positions, scores = self.hybrid_model.score(
+                user_id=user_id,
+                titles=liked_titles,
+                n=max(3 * n, 30),
+                exclude=list(seen_positions),
+                mask=mask
+            )
+        
+        if len(positions) == 0:
+            # Cold start: what's trending right now
+            return self._cold_start(n, filters, mask=mask, exclude=seen_positions)
+        
+        with timer(STAGE_METRIC, stage='combine'):
+            combined_df = self.df.iloc[positions].assign(score=scores)
+            
+            # Remove titles the user already liked or rated (by exact name)
+            combined_df = combined_df[~combined_df['title'].isin(seen)]
+        
+        return self._rerank_and_format(combined_df, n, profile)
+    
+    def _precomputed_candidates(self, user_id, seen, n, mask, allow_stale):
+        """
+        The user's precomputed list as a scored DataFrame, minus filtered-out
+        and `seen` (already liked or rated) titles; None when it cannot
+        serve n titles.
+        """
+        if self.precomputed is None:
+            return None
+        with timer(STAGE_METRIC, stage='precomputed_lookup'):
+            cached = self.precomputed.lookup(user_id, allow_stale=allow_stale)
+        if cached is None:
+            REGISTRY.record_cache('precomputed', hit=False)
+            return None
+        
+        with timer(STAGE_METRIC, stage='combine'):
+            positions, scores = cached
+            if mask is not None:
+                keep = mask[positions]
+                positions, scores = positions[keep], scores[keep]
+            combined_df = self.df.iloc[positions].assign(score=scores.astype(np.float64))
+            combined_df = combined_df[~combined_df['title'].isin(seen)]
+        
+        REGISTRY.record_cache('precomputed', hit=len(combined_df) >= n)
+        return combined_df if len(combined_df) >= n else None
+    
+    def _rerank_and_format(self, combined_df, n, profile):
+        """Boost candidates by the user's genre preferences and format the top n"""
+        # Re-rank by genre preferences (if we have more candidates than needed)
         if len(combined_df) > n:
-            # Get user genre preferences
-            profile = user_manager.get_profile(user_id)
             genre_preferences = profile.get('genre_preferences', {})
             
             if genre_preferences:
-                # Score recommendations by genre match
-                combined_df['score'] = combined_df.apply(
-                    lambda x: self._calculate_genre_score(x['listed_in'], genre_preferences),
-                    axis=1
-                )
-                combined_df = combined_df.sort_values('score', ascending=False)
+                with timer(STAGE_METRIC, stage='rerank'):
+                    # Boost blended scores by genre match
+                    genre_scores = combined_df['listed_in'].map(
+                        lambda x: self._calculate_genre_score(x, genre_preferences)
+                    )
+                    combined_df = combined_df.assign(score=combined_df['score'] * (1 + genre_scores))
+                    combined_df = combined_df.sort_values('score', ascending=False, kind='stable')
         
         # Return top N
-        return self._format_recommendations(combined_df.head(n))
+        with timer(STAGE_METRIC, stage='format'):
+            return self._format_recommendations(combined_df.head(n))
+    
+    def _cold_start(self, n, filters=None, mask=None, exclude=None):
+        """
+        Trending titles (a cached lookup), topped up with random ones while
+        activity is sparse. Only titles where `mask` is True and whose
+        position is not in `exclude` (the user's liked and rated titles) are
+        returned; a single type and/or genre filter is served from that
+        key's list.
+        """
+        with timer(STAGE_METRIC, stage='cold_start'):
+            trending = self.trending.top(
+                n,
+                item_type=self.catalogue_filter.single_value(filters, 'type'),
+                genre=self.catalogue_filter.single_value(filters, 'genre'),
+                exclude=exclude,
+                mask=mask
+            )
+            REGISTRY.record_cache('trending', hit=len(trending) == n)
+            recommendations = self.df.iloc[[pos for pos, _ in trending]]
+            if len(trending) < n:
+                # Not enough activity yet: top up with random titles
+                candidates = self.df if mask is None else self.df[mask]
+                remaining = candidates.drop(index=recommendations.index)
+                if exclude:
+                    remaining = remaining[~remaining.index.isin(list(exclude))]
+                recommendations = pd.concat([
+                    recommendations,
+                    remaining.sample(min(n - len(trending), len(remaining)))
+                ])
+        with timer(STAGE_METRIC, stage='format'):
+            return self._format_recommendations(recommendations)
     
     def _calculate_genre_score(self, genres_str, preferences):
         """Calculate a score based on how well genres match user preferences"""
@@ -140,6 +394,18 @@ class RecommendationEngine:
             
         return score / len(genres) if genres else 0
     
+    def _text(self, pos, row, column):
+        """A catalogue text column for one row, from the DataFrame or the shared bundle"""
+        if column in row:
+            return row[column]
+        text_column = self.text_columns.get(column)
+        return text_column[int(pos)] if text_column is not None else None
+    
+    def _short_description(self, row):
+        """Description truncated to 100 characters for the survey (row from iterrows)"""
+        description = self._text(row.name, row, 'description') or ''
+        return description[:100] + '...' if len(description) > 100 else description
+    
     def _format_recommendations(self, recommendations_df):
         """Format recommendation DataFrame into a list of dictionaries"""
         return [
@@ -147,11 +413,31 @@ class RecommendationEngine:
                 'id': row['show_id'],
                 'title': row['title'],
                 'type': row['type'],
-                'description': row['description'],
+                'description': self._text(pos, row, 'description'),
                 'genres': split_genres(row['listed_in']) if not pd.isna(row['listed_in']) else [],
                 'year': int(row['release_year']) if not pd.isna(row['release_year']) else None,
                 'duration': row['duration'],
                 'rating': row['rating']
             }
-            for _, row in recommendations_df.iterrows()
+            for pos, row in zip(recommendations_df.index, recommendations_df.to_dict('records'))
         ]
+
+
+class _TitleMapping(Mapping):
+    """Read-only title -> value mapping resolved through a TitleSearchIndex"""
+    
+    def __init__(self, title_index, value):
+        self.title_index = title_index
+        self.value = value
+    
+    def __getitem__(self, title):
+        pos = self.title_index.lookup(title)
+        if pos is None:
+            raise KeyError(title)
+        return self.value(pos)
+    
+    def __iter__(self):
+        return iter(self.title_index.titles)
+    
+    def __len__(self):
+        return len(self.title_index)
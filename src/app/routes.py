@@ -1,33 +1,313 @@
-from flask import Blueprint, request, jsonify, current_app
+import json
+import os
+import threading
+import time
+from flask import Blueprint, Response, request, jsonify, current_app, g
 import pandas as pd
+from src.data.event_log import EVENT_TYPES, EventLog, EventLogCompactor, FileLock, is_valid_rating, load_ratings_snapshot
+from src.data.recommendation_store import RecommendationStore
+from src.models.filters import FILTER_KEYS
+from src.models.shared_model import EXPORT_LOCK, SharedModelHandle, export_shared_model, read_manifest, remove_stale_bundles
+from .instrumentation import REGISTRY
+from .model_manager import ModelManager, artifact_watcher
 from .recommendation_engine import RecommendationEngine
-from .user_manager import UserManager
+from .user_manager import UserManager, is_valid_user_id
 
 # Create blueprint
 main_bp = Blueprint('main', __name__)
 
 # Initialize components (these would be properly initialized in a real app)
-rec_engine = None
+rec_engine = None  # set directly only when injected (e.g. by the benchmark suite)
 user_manager = None
+compactor = None
+model_manager = None
+recommendation_store = None
+# Serialises first-request initialisation across request threads
+_init_lock = threading.Lock()
 
-@main_bp.before_app_first_request
+def build_engine(config, version):
+    """
+    Build a fully trained and warmed-up RecommendationEngine from the
+    configured artifacts (ModelManager calls this at startup and on reload)
+    """
+    engine = _content_engine(config, version)
+    
+    # Enable collaborative/popularity blending when ratings are available
+    engine.fit_collaborative(training_ratings(engine, config))
+    
+    # Seed the trending index with interactions recorded so far
+    engine.warm_up_trending(user_manager.iter_events())
+    
+    # Precompute personalised lists for known users in the background (their
+    # requests are computed live until then); afterwards only users touched
+    # by new events are recomputed
+    if config.get('PRECOMPUTE_INTERVAL'):
+        precomputed = engine.enable_precomputed(recommendation_store)
+        precomputed.mark_all_dirty()
+        precomputed.start(interval=config['PRECOMPUTE_INTERVAL'])
+    return engine
+
+def training_ratings(engine, config):
+    """
+    Ratings (user_id, show_id, rating) from RATINGS_PATH and the event log
+    snapshot for fitting `engine`'s collaborative models, or None if there
+    are none (ModelManager also calls this to refit when only ratings changed).
+    
+    User ids are strings, as in requests and the snapshot. A user who rated
+    the same title in both sources keeps only the newer rating, from the
+    snapshot.
+    """
+    ratings_frames = []
+    ratings_path = config.get('RATINGS_PATH')
+    if ratings_path and os.path.exists(ratings_path):
+        ratings_frames.append(pd.read_csv(ratings_path)[['user_id', 'show_id', 'rating']])
+    if compactor is not None:
+        ratings_frames.append(engine.ratings_by_show_id(load_ratings_snapshot(compactor.snapshot_path)))
+    if not ratings_frames:
+        return None
+    ratings = pd.concat(
+        [frame.assign(user_id=frame['user_id'].astype(str)) for frame in ratings_frames],
+        ignore_index=True
+    )
+    return ratings.drop_duplicates(['user_id', 'show_id'], keep='last', ignore_index=True)
+
+def _content_engine(config, version):
+    """
+    Engine with the content model fitted (sharded across CONTENT_SHARDS
+    processes when set), or attached to the shared model bundle for the
+    current catalogue file when SHARED_MODEL_DIR is set (the first worker
+    to need a bundle exports it while the rest wait, then map it)
+    """
+    from src.data.loader import load_netflix_data
+    shared_dir = config.get('SHARED_MODEL_DIR')
+    precision = config.get('CONTENT_PRECISION') or 'float64'
+    if config.get('CONTENT_SHARDS') or not shared_dir:
+        df = load_netflix_data(config['NETFLIX_DATA_PATH'])
+        return RecommendationEngine(df, user_manager=user_manager, model_version=version,
+                                    content_shards=config.get('CONTENT_SHARDS') or 0,
+                                    content_precision=precision)
+    
+    data_path = config['NETFLIX_DATA_PATH']
+    stat = os.stat(data_path)
+    bundle_path = os.path.join(shared_dir, f'catalogue-{precision}-{stat.st_size}-{stat.st_mtime_ns}')
+    os.makedirs(shared_dir, exist_ok=True)
+    # Only one worker on the host fits and exports; attaching under the same
+    # lock means a bundle is never removed while a worker is about to map it
+    with FileLock(os.path.join(shared_dir, EXPORT_LOCK)):
+        if read_manifest(bundle_path) is None:
+            fitted = RecommendationEngine(load_netflix_data(data_path), model_version=version,
+                                          content_precision=precision)
+            export_shared_model(fitted.content_model, fitted.catalogue_filter, bundle_path,
+                                source={'path': data_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+            remove_stale_bundles(shared_dir, keep=bundle_path)
+        handle = SharedModelHandle(bundle_path)
+    return RecommendationEngine.from_shared(handle, user_manager=user_manager, model_version=version)
+
+@main_bp.before_app_request
 def initialize_components():
     """Initialize recommendation engine and user manager on first request"""
-    global rec_engine, user_manager
+    # Already initialized (or injected, e.g. by the benchmark suite)
+    if rec_engine is not None or model_manager is not None:
+        return
     
-    # Load processed data
-    from src.data.loader import load_netflix_data
-    df = load_netflix_data('processed/netflix_processed.csv')
+    with _init_lock:
+        # Another request thread may have finished initialising meanwhile
+        if rec_engine is not None or model_manager is not None:
+            return
+        _initialize(dict(current_app.config))
+
+def _initialize(config):
+    """Open the event log and user store, then build and start serving the first model"""
+    global user_manager, compactor, model_manager, recommendation_store
     
     # Initialize components
-    rec_engine = RecommendationEngine(df)
-    user_manager = UserManager()
+    event_log = None
+    if config.get('EVENT_LOG_DIR'):
+        event_log = EventLog(config['EVENT_LOG_DIR'])
+    try:
+        user_manager = UserManager(config['USER_DATA_DIR'], event_log=event_log)
+        recommendation_store = RecommendationStore(config.get('PRECOMPUTED_STORE_PATH'))
+        
+        # Fold events left by previous runs into profiles and the ratings snapshot,
+        # then keep compacting in the background
+        if event_log is not None:
+            compactor = EventLogCompactor(event_log, user_manager)
+            try:
+                compactor.run_once()
+            except Exception:
+                # Segments stay on disk and are retried by the background compactor;
+                # serving must not depend on one bad segment
+                current_app.logger.exception('Startup compaction of %s failed', config['EVENT_LOG_DIR'])
+            compactor.start(interval=config['COMPACTION_INTERVAL'])
+        
+        # Models are (re)built by the manager and swapped in without downtime
+        manager = ModelManager(
+            lambda version: build_engine(config, version),
+            refit_engine=lambda engine, version: engine.fit_collaborative(
+                training_ratings(engine, config), model_version=version
+            )
+        )
+        manager.load()
+    except Exception:
+        # Leave nothing running so the next request retries from scratch
+        if compactor is not None:
+            compactor.stop()
+            compactor = None
+        if event_log is not None:
+            event_log.close()
+        if recommendation_store is not None:
+            # Releases the store's file slot
+            recommendation_store.close()
+            recommendation_store = None
+        user_manager = None
+        raise
+    if config.get('MODEL_RELOAD_INTERVAL'):
+        # Rebuild everything when the catalogue changes; new ratings (including
+        # ones the compactor folds into the snapshot) only refit the
+        # collaborative and popularity models of the serving engine
+        ratings_files = [config.get('RATINGS_PATH') or '']
+        if compactor is not None:
+            ratings_files.append(compactor.snapshot_path)
+        manager.start(
+            interval=config['MODEL_RELOAD_INTERVAL'],
+            should_reload=artifact_watcher([config['NETFLIX_DATA_PATH']]),
+            should_refit=artifact_watcher(ratings_files)
+        )
+    model_manager = manager
+
+@main_bp.before_app_request
+def pin_model_version():
+    """Serve the whole request from one model version, even if a swap happens meanwhile"""
+    if model_manager is not None:
+        g.model_lease = model_manager.acquire()
+
+@main_bp.teardown_app_request
+def release_model_version(exc=None):
+    """Let a retired model version drain once its last request finishes"""
+    lease = g.pop('model_lease', None)
+    if lease is not None:
+        lease.release()
+
+def current_engine():
+    """The RecommendationEngine serving this request"""
+    lease = g.get('model_lease')
+    return lease.engine if lease is not None else rec_engine
+
+@main_bp.before_app_request
+def start_request_timer():
+    """Remember when the request started for the latency histogram"""
+    if REGISTRY.enabled:
+        g.request_start = time.perf_counter()
+
+@main_bp.after_app_request
+def record_request_latency(response):
+    """Record per-endpoint latency once the response is ready"""
+    start = g.get('request_start')
+    if start is not None:
+        REGISTRY.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - start,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    lease = g.get('model_lease')
+    if lease is not None:
+        response.headers['X-Model-Version'] = str(lease.version)
+    return response
+
+def parse_filters(source):
+    """
+    Recommendation filters from query args (repeated or comma-separated
+    values) or a JSON object. Raises ValueError on a malformed year.
+    """
+    filters = {}
+    for key in FILTER_KEYS:
+        if hasattr(source, 'getlist'):
+            values = [v for v in source.getlist(key) if v != '']
+            value = ','.join(values) if values else None
+        else:
+            value = source.get(key)
+        if value is None:
+            continue
+        if key in ('year_min', 'year_max'):
+            value = int(value)
+        filters[key] = value
+    return filters
+
+MAX_CLOCK_SKEW = 300  # seconds a client clock may run ahead of ours
+
+def parse_event(line):
+    """
+    One interaction event from an NDJSON line. Raises ValueError with a
+    message for the item status when the line is not a valid event.
+    """
+    try:
+        event = json.loads(line)
+    except json.JSONDecodeError:
+        raise ValueError('Invalid JSON')
+    if not isinstance(event, dict):
+        raise ValueError('Event must be a JSON object')
+    if event.get('type') not in EVENT_TYPES:
+        raise ValueError(f"type must be one of {', '.join(EVENT_TYPES)}")
+    user_id = event.get('user_id')
+    title = event.get('title')
+    if user_id is None or user_id == '':
+        raise ValueError('Missing user_id')
+    if not is_valid_user_id(user_id):
+        raise ValueError('user_id must be up to 128 letters, digits and _ . @ - (not starting with .)')
+    if not isinstance(title, str) or not title:
+        raise ValueError('Missing title')
+    parsed = {'type': event['type'], 'user_id': str(user_id), 'title': title}
+    if event['type'] == 'rating':
+        rating = event.get('rating')
+        if not is_valid_rating(rating):
+            raise ValueError('rating must be a number from 1 to 5')
+        parsed['rating'] = rating
+    timestamp = event.get('timestamp')
+    if timestamp is not None:
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            raise ValueError('timestamp must be epoch seconds')
+        # Also rejects NaN/Infinity (accepted by json.loads)
+        if not 0 <= timestamp <= time.time() + MAX_CLOCK_SKEW:
+            raise ValueError('timestamp must be between 0 and now')
+        parsed['timestamp'] = timestamp
+    return parsed
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose instrumentation in the Prometheus text format"""
+    return Response(REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def admin_authorized():
+    """Admin endpoints require the configured ADMIN_TOKEN in X-Admin-Token"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+@main_bp.route('/api/admin/model', methods=['GET'])
+def model_status():
+    """Model version being served and requests in flight per version"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    if model_manager is None:
+        return jsonify({'success': False, 'error': 'Model manager not enabled'}), 404
+    return jsonify({'success': True, 'model': model_manager.status()})
+
+@main_bp.route('/api/admin/reload', methods=['POST'])
+def reload_model():
+    """Retrain/reload models in the background and swap them in when valid"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    if model_manager is None:
+        return jsonify({'success': False, 'error': 'Model manager not enabled'}), 404
+    started = model_manager.reload_async()
+    return jsonify({'success': True, 'started': started, 'model': model_manager.status()}), 202
 
 @main_bp.route('/api/survey', methods=['GET'])
 def get_survey_titles():
     """Get a list of popular titles for the initial survey"""
     # Return a sample of diverse and popular content
-    sample_titles = rec_engine.get_diverse_titles(n=50)
+    sample_titles = current_engine().get_diverse_titles(n=50)
     return jsonify({
         'success': True,
         'titles': sample_titles
@@ -40,15 +320,30 @@ def get_recommendations():
     user_id = data.get('user_id', 'anonymous')
     liked_titles = data.get('liked_titles', [])
     
+    if not is_valid_user_id(user_id):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid user_id'
+        }), 400
+    
+    try:
+        filters = parse_filters(data.get('filters') or {})
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid filters'
+        }), 400
+    
     # Store user preferences
     if liked_titles:
         user_manager.update_preferences(user_id, liked_titles)
     
     # Get personalized recommendations
-    recommendations = rec_engine.recommend_for_user(
+    recommendations = current_engine().recommend_for_user(
         user_id=user_id,
         liked_titles=liked_titles,
-        n=10
+        n=10,
+        filters=filters
     )
     
     return jsonify({
@@ -59,13 +354,35 @@ def get_recommendations():
 @main_bp.route('/api/title/<title>', methods=['GET'])
 def get_title_recommendations(title):
     """Get similar content to a specific title"""
+    try:
+        filters = parse_filters(request.args)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid filters'
+        }), 400
+    
     try:
         n = int(request.args.get('n', 5))
-        similar_titles = rec_engine.recommend_similar(title, n=n)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'n must be an integer'
+        }), 400
+    
+    try:
+        engine = current_engine()
+        # A misspelled title is matched to the closest catalogue title once;
+        # the engine is then given the exact catalogue title
+        resolved_title = engine.resolve_title(title)
+        similar_titles = [] if resolved_title is None else engine.recommend_similar(
+            resolved_title, n=n, filters=filters
+        )
         
         return jsonify({
             'success': True,
             'title': title,
+            'resolved_title': resolved_title,
             'similar': similar_titles
         })
     except Exception as e:
@@ -74,9 +391,40 @@ def get_title_recommendations(title):
             'error': str(e)
         }), 404
 
+@main_bp.route('/api/search', methods=['GET'])
+def search_titles():
+    """Autocomplete / fuzzy title search"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': 'Missing query parameter q'
+        }), 400
+    
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = None
+    if limit is None or limit < 1:
+        return jsonify({
+            'success': False,
+            'error': 'limit must be a positive integer'
+        }), 400
+    limit = min(limit, 50)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': current_engine().search_titles(query, limit=limit)
+    })
+
 @main_bp.route('/api/user/<user_id>/profile', methods=['GET'])
 def get_user_profile(user_id):
     """Get a user's preference profile"""
+    if not is_valid_user_id(user_id):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid user_id'
+        }), 400
     profile = user_manager.get_profile(user_id)
     return jsonify({
         'success': True,
@@ -95,13 +443,94 @@ def rate_title(user_id):
             'success': False,
             'error': 'Missing required data'
         }), 400
+    if not is_valid_user_id(user_id):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid user_id'
+        }), 400
+    if not is_valid_rating(rating):
+        return jsonify({
+            'success': False,
+            'error': 'rating must be a number from 1 to 5'
+        }), 400
     
     user_manager.add_rating(user_id, title, rating)
     
-    # Get new recommendations based on updated preferences
-    recommendations = rec_engine.recommend_for_user(user_id, n=5)
+    # Serve the stored list (minus the rated title); the background job
+    # refreshes it with the new rating instead of recomputing on every write
+    recommendations = current_engine().recommend_for_user(user_id, n=5, allow_stale=True)
     
     return jsonify({
         'success': True,
         'recommendations': recommendations
     })
+
+@main_bp.route('/api/events/bulk', methods=['POST'])
+def ingest_events():
+    """
+    Store a batch of rating/watch/like events sent as newline-delimited
+    JSON, one event per line. Valid events are persisted together (one
+    write per affected profile, or one log append); recommendations are
+    refreshed in the background rather than per event. Every non-blank
+    line gets a status in `results`.
+    """
+    # Refuse oversized batches before reading them
+    max_bytes = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_bytes and (request.content_length or 0) > max_bytes:
+        return jsonify({
+            'success': False,
+            'error': f'Body larger than {max_bytes} bytes'
+        }), 413
+    
+    try:
+        lines = request.get_data().decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        return jsonify({
+            'success': False,
+            'error': 'Body must be UTF-8 NDJSON'
+        }), 400
+    
+    items = [(number, line) for number, line in enumerate(lines, start=1) if line.strip()]
+    if not items:
+        return jsonify({
+            'success': False,
+            'error': 'No events'
+        }), 400
+    max_events = current_app.config.get('BULK_MAX_EVENTS')
+    if max_events and len(items) > max_events:
+        return jsonify({
+            'success': False,
+            'error': f'At most {max_events} events per batch'
+        }), 413
+    
+    results = []
+    events = []
+    for number, line in items:
+        try:
+            events.append(parse_event(line))
+            results.append({'line': number, 'status': 'accepted'})
+        except ValueError as e:
+            results.append({'line': number, 'status': 'rejected', 'error': str(e)})
+    accepted = [result for result in results if result['status'] == 'accepted']
+    
+    if events:
+        try:
+            user_manager.record_events(events)
+        except Exception as e:
+            for result in accepted:
+                result.update(status='failed', error=str(e))
+            REGISTRY.inc('bulk_events_total', len(accepted), result='failed')
+            return jsonify({
+                'success': False,
+                'error': 'Could not store events',
+                'results': results
+            }), 500
+    
+    REGISTRY.inc('bulk_events_total', len(accepted), result='accepted')
+    REGISTRY.inc('bulk_events_total', len(results) - len(accepted), result='rejected')
+    return jsonify({
+        'success': True,
+        'accepted': len(accepted),
+        'rejected': len(results) - len(accepted),
+        'results': results
+    })
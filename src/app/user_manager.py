@@ -1,34 +1,141 @@
 import json
 import os
+import re
+import threading
 import time
 from datetime import datetime
 import pandas as pd
+from src.data.event_log import EVENT_ORDER
+from .instrumentation import REGISTRY, timer
+
+# User ids name profile files: no path separators, no leading dot
+USER_ID_PATTERN = re.compile(r'[A-Za-z0-9_@-][A-Za-z0-9_.@-]{0,127}')
+
+
+def is_valid_user_id(user_id):
+    """Whether a user id (a string, or an int from a ratings file) is safe to store"""
+    if isinstance(user_id, bool) or not isinstance(user_id, (str, int)):
+        return False
+    return USER_ID_PATTERN.fullmatch(str(user_id)) is not None
 
 class UserManager:
     """Manages user preferences, ratings, and viewing history"""
     
-    def __init__(self, data_dir='data/users'):
-        """Initialize with a directory to store user data"""
+    def __init__(self, data_dir='data/users', event_log=None):
+        """
+        Initialize with a directory to store user data.
+        
+        With an event_log (src.data.event_log.EventLog), interactions are
+        appended to the log instead of rewriting the profile on every event;
+        profiles are brought up to date by EventLogCompactor, and reads merge
+        in events that have not been compacted yet.
+        """
         self.data_dir = data_dir
+        self.event_log = event_log
+        self._listeners = []
+        self._pending = {}  # user_id -> logged events not yet compacted
+        self._lock = threading.RLock()
         os.makedirs(data_dir, exist_ok=True)
     
+    def subscribe(self, callback):
+        """Register a callback called with an event dict for every like, rating and watch"""
+        # Copy on write, so _emit never iterates a list being modified
+        self._listeners = self._listeners + [callback]
+    
+    def unsubscribe(self, callback):
+        """Remove a callback registered with subscribe"""
+        self._listeners = [listener for listener in self._listeners if listener != callback]
+    
+    def _emit(self, event):
+        """Notify listeners of a user interaction"""
+        for callback in self._listeners:
+            callback(event)
+    
+    def iter_events(self):
+        """
+        Replay interactions stored in all user profiles, then logged events
+        not compacted yet, as event dicts (used to warm up listeners when a
+        model is built).
+        """
+        with self._lock:
+            pending = {user_id: list(events) for user_id, events in self._pending.items()}
+        for file_name in os.listdir(self.data_dir):
+            if not file_name.endswith('.json'):
+                continue
+            user_id = file_name[:-len('.json')]
+            with open(os.path.join(self.data_dir, file_name), 'r') as f:
+                user_data = json.load(f)
+            if user_id in pending:
+                # Skip events a compaction folded into this file meanwhile
+                applied = user_data.get('last_seq', {})
+                pending[user_id] = [e for e in pending[user_id] if not _is_applied(e, applied)]
+            last_updated = _to_timestamp(user_data.get('last_updated'))
+            for entry in user_data.get('watch_history', []):
+                yield {'type': 'watch', 'user_id': user_id, 'title': entry['title'],
+                       'timestamp': _to_timestamp(entry.get('timestamp')) or last_updated}
+            for title in user_data.get('liked_titles', []):
+                yield {'type': 'like', 'user_id': user_id, 'title': title, 'timestamp': last_updated}
+            for title, rating in user_data.get('ratings', {}).items():
+                yield {'type': 'rating', 'user_id': user_id, 'title': title,
+                       'rating': rating, 'timestamp': last_updated}
+        for events in pending.values():
+            yield from events
+    
+    def user_ids(self):
+        """Ids of all users with a stored profile or logged events"""
+        stored = {
+            file_name[:-len('.json')] for file_name in os.listdir(self.data_dir)
+            if file_name.endswith('.json')
+        }
+        with self._lock:
+            return sorted(stored | set(self._pending))
+    
     def _get_user_file(self, user_id):
         """Get the file path for a user's data"""
+        if not is_valid_user_id(user_id):
+            raise ValueError(f'Invalid user id {user_id!r}')
         return os.path.join(self.data_dir, f"{user_id}.json")
     
-    def _load_user_data(self, user_id):
+    def _load_stored_data(self, user_id):
         """Load a user's data from file"""
         file_path = self._get_user_file(user_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                return json.load(f)
+        with timer('user_manager_seconds', operation='load'):
+            if os.path.exists(file_path):
+                REGISTRY.inc('user_manager_operations_total', operation='load', result='found')
+                with open(file_path, 'r') as f:
+                    return json.load(f)
+        REGISTRY.inc('user_manager_operations_total', operation='load', result='default')
         return self._create_default_profile()
     
+    def _load_user_data(self, user_id):
+        """
+        Load a user's data, including logged events not yet compacted
+        (applied in the same order a compaction applies them)
+        """
+        # Copy the pending events before reading the file: a compaction only
+        # drops them from memory after writing them to the file
+        with self._lock:
+            pending = list(self._pending.get(user_id, ()))
+        user_data = self._load_stored_data(user_id)
+        if pending:
+            applied = user_data.get('last_seq', {})
+            pending = sorted((e for e in pending if not _is_applied(e, applied)), key=_event_order)
+        if pending:
+            for event in pending:
+                self._apply_event(user_data, event)
+            self._update_genre_preferences(user_id, user_data)
+            user_data['last_updated'] = datetime.fromtimestamp(pending[-1]['timestamp']).isoformat()
+        return user_data
+    
     def _save_user_data(self, user_id, data):
-        """Save a user's data to file"""
+        """Save a user's data to file (atomically, via a temporary file)"""
         file_path = self._get_user_file(user_id)
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        tmp_path = file_path + '.tmp'
+        with timer('user_manager_seconds', operation='save'):
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, file_path)
+        REGISTRY.inc('user_manager_operations_total', operation='save', result='ok')
     
     def _create_default_profile(self):
         """Create a default user profile"""
@@ -48,58 +155,153 @@ class UserManager:
         """Update a user's liked titles and genre preferences"""
         user_data = self._load_user_data(user_id)
         
-        # Update liked titles (add new ones without duplicates)
+        # Only titles that are not liked yet (without duplicates)
         current_liked = set(user_data['liked_titles'])
-        current_liked.update(liked_titles)
-        user_data['liked_titles'] = list(current_liked)
-        
-        # Update genre preferences based on liked titles
-        self._update_genre_preferences(user_id, user_data)
+        new_titles = [title for title in dict.fromkeys(liked_titles) if title not in current_liked]
         
-        # Save updated data
-        user_data['last_updated'] = datetime.now().isoformat()
-        self._save_user_data(user_id, user_data)
-        
-        return user_data
+        return self._record(user_id, [{'type': 'like', 'title': title} for title in new_titles], user_data)
     
     def add_rating(self, user_id, title, rating):
         """Add or update a user's rating for a title"""
-        user_data = self._load_user_data(user_id)
-        
-        # Update rating
-        user_data['ratings'][title] = rating
+        return self._record(user_id, [{'type': 'rating', 'title': title, 'rating': rating}])
+    
+    def add_to_watch_history(self, user_id, title):
+        """Add a title to the user's watch history"""
+        return self._record(user_id, [{'type': 'watch', 'title': title}])
+    
+    def _record(self, user_id, events, user_data=None):
+        """
+        Persist new interaction events for a user and return the updated profile.
         
-        # Add to watch history if not already there
-        if title not in [entry['title'] for entry in user_data['watch_history']]:
-            user_data['watch_history'].append({
-                'title': title,
-                'timestamp': datetime.now().isoformat()
-            })
+        Without an event log the profile is loaded, updated and rewritten;
+        with one the events are appended to the log and kept in memory until
+        compaction folds them into the stored profile.
+        """
+        now = time.time()
+        events = [dict(event, user_id=user_id, timestamp=now) for event in events]
         
-        # Update genre preferences
-        self._update_genre_preferences(user_id, user_data)
+        if self.event_log is not None:
+            events = [self.event_log.append(event) for event in events]
+            with self._lock:
+                self._pending.setdefault(user_id, []).extend(events)
+            user_data = self._load_user_data(user_id)
+        else:
+            if user_data is None:
+                user_data = self._load_user_data(user_id)
+            for event in events:
+                self._apply_event(user_data, event)
+            
+            # Update genre preferences
+            self._update_genre_preferences(user_id, user_data)
+            
+            # Save updated data
+            user_data['last_updated'] = datetime.now().isoformat()
+            self._save_user_data(user_id, user_data)
         
-        # Save updated data
-        user_data['last_updated'] = datetime.now().isoformat()
-        self._save_user_data(user_id, user_data)
+        for event in events:
+            self._emit(event)
         
         return user_data
     
-    def add_to_watch_history(self, user_id, title):
-        """Add a title to the user's watch history"""
-        user_data = self._load_user_data(user_id)
+    def record_events(self, events):
+        """
+        Persist a batch of interaction events for any number of users.
         
-        # Add to watch history with timestamp
-        user_data['watch_history'].append({
-            'title': title,
-            'timestamp': datetime.now().isoformat()
-        })
+        Events are dicts with 'user_id', 'type' ('like', 'rating' or 'watch'),
+        'title', 'rating' for ratings and an optional epoch 'timestamp'
+        (default: now). With an event log the whole batch is appended with a
+        single fsync; without one, each affected profile is loaded and
+        rewritten once. Listeners are notified afterwards, so derived state
+        (trending, precomputed lists) is refreshed lazily.
         
-        # Save updated data
-        user_data['last_updated'] = datetime.now().isoformat()
-        self._save_user_data(user_id, user_data)
+        Returns:
+            list: The stored events (with 'seq' when logged)
+        """
+        now = time.time()
+        events = [dict(event, timestamp=event.get('timestamp') or now) for event in events]
         
-        return user_data
+        if self.event_log is not None:
+            events = self.event_log.append_batch(events)
+            with self._lock:
+                for event in events:
+                    self._pending.setdefault(event['user_id'], []).append(event)
+        else:
+            by_user = {}
+            for event in events:
+                by_user.setdefault(event['user_id'], []).append(event)
+            for user_id, user_events in by_user.items():
+                user_data = self._load_user_data(user_id)
+                for event in user_events:
+                    self._apply_event(user_data, event)
+                self._update_genre_preferences(user_id, user_data)
+                user_data['last_updated'] = datetime.now().isoformat()
+                self._save_user_data(user_id, user_data)
+        
+        for event in events:
+            self._emit(event)
+        return events
+    
+    @staticmethod
+    def _apply_event(user_data, event):
+        """Fold one interaction event into a profile dict"""
+        title = event['title']
+        timestamp = datetime.fromtimestamp(event['timestamp']).isoformat()
+        if event['type'] == 'like':
+            if title not in user_data['liked_titles']:
+                user_data['liked_titles'].append(title)
+        elif event['type'] == 'rating':
+            user_data['ratings'][title] = event['rating']
+            # Add to watch history if not already there
+            if title not in [entry['title'] for entry in user_data['watch_history']]:
+                user_data['watch_history'].append({'title': title, 'timestamp': timestamp})
+        elif event['type'] == 'watch':
+            user_data['watch_history'].append({'title': title, 'timestamp': timestamp})
+    
+    def apply_compacted_events(self, user_id, events):
+        """
+        Fold logged events into the stored profile with a single write
+        (called by EventLogCompactor). The profile's 'last_seq' records the
+        highest applied seq per log writer; events at or below it were
+        already applied and are skipped, so re-running a compaction after a
+        crash is safe.
+        
+        Compactions are serialised, so the file is read and written without
+        holding the lock that profile reads take.
+        """
+        user_data = self._load_stored_data(user_id)
+        applied = dict(user_data.get('last_seq', {}))
+        new_events = sorted((e for e in events if not _is_applied(e, applied)), key=_event_order)
+        if new_events:
+            for event in new_events:
+                self._apply_event(user_data, event)
+                writer = str(event.get('writer', 0))
+                applied[writer] = max(applied.get(writer, 0), event['seq'])
+            self._update_genre_preferences(user_id, user_data)
+            user_data['last_seq'] = applied
+            user_data['last_updated'] = datetime.fromtimestamp(new_events[-1]['timestamp']).isoformat()
+            self._save_user_data(user_id, user_data)
+        with self._lock:
+            self._drop_applied_pending(user_id, applied)
+    
+    def _drop_applied_pending(self, user_id, applied):
+        """Forget in-memory events now covered by the stored profile (caller holds the lock)"""
+        remaining = [e for e in self._pending.get(user_id, ()) if not _is_applied(e, applied)]
+        if remaining:
+            self._pending[user_id] = remaining
+        else:
+            self._pending.pop(user_id, None)
+    
+    def prune_pending(self):
+        """
+        Drop in-memory events that a compaction (possibly in another
+        process) has folded into the stored profiles
+        """
+        with self._lock:
+            user_ids = list(self._pending)
+        for user_id in user_ids:
+            applied = self._load_stored_data(user_id).get('last_seq', {})
+            with self._lock:
+                self._drop_applied_pending(user_id, applied)
     
     def _update_genre_preferences(self, user_id, user_data=None):
         """Update genre preferences based on liked titles and ratings"""
@@ -145,3 +347,21 @@ class UserManager:
         from .recommendation_engine import RecommendationEngine
         rec_engine = RecommendationEngine.instance()
         return rec_engine.recommend_for_user(user_id, n=n)
+
+
+def _is_applied(event, applied):
+    """Whether a logged event is covered by a profile's 'last_seq' ({writer: highest applied seq})"""
+    return event['seq'] <= applied.get(str(event.get('writer', 0)), 0)
+
+
+def _event_order(event):
+    """Sort key applying events of several writers in one order (see EVENT_ORDER)"""
+    return tuple(event.get(key, 0) for key in EVENT_ORDER)
+
+
+def _to_timestamp(iso_string):
+    """Convert an ISO timestamp string to epoch seconds (None if missing/invalid)"""
+    try:
+        return datetime.fromisoformat(iso_string).timestamp()
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,438 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+WRITER_LOCK_PREFIX = 'writer-'
+COMPACTION_LOCK = 'compaction.lock'
+STATE_FILE = 'compaction_state.json'
+SNAPSHOT_FILE = 'ratings_snapshot.npz'
+QUARANTINE_FILE = 'quarantine.log'
+
+EVENT_TYPES = ('rating', 'watch', 'like')
+
+# Order in which events of several writers are applied (seq only orders within a writer)
+EVENT_ORDER = ('timestamp', 'writer', 'seq')
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_rating(rating):
+    """Whether `rating` is a number from 1 to 5 (booleans and NaN are not)"""
+    return not isinstance(rating, bool) and isinstance(rating, (int, float)) and 1 <= rating <= 5
+
+
+def _is_number(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def is_valid_event(event):
+    """Whether a logged event can be folded into profiles and the ratings snapshot"""
+    return (
+        isinstance(event, dict)
+        and event.get('type') in EVENT_TYPES
+        and isinstance(event.get('user_id'), (str, int)) and not isinstance(event.get('user_id'), bool)
+        and isinstance(event.get('title'), str) and event['title'] != ''
+        and _is_number(event.get('timestamp'))
+        and all(isinstance(event.get(key), int) and not isinstance(event.get(key), bool)
+                for key in ('writer', 'seq'))
+        and (event['type'] != 'rating' or is_valid_rating(event.get('rating')))
+    )
+
+
+def _segment_name(writer, number):
+    return f'{SEGMENT_PREFIX}{writer:04d}-{number:08d}{SEGMENT_SUFFIX}'
+
+
+def _segment_key(file_name):
+    """(writer, number) of a segment file name"""
+    writer, number = file_name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)].split('-')
+    return int(writer), int(number)
+
+
+def try_lock(path):
+    """Exclusive non-blocking flock on `path`: the open file, or None if another holder has it"""
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+class EventLog:
+    """
+    Append-only log of user interaction events stored as newline-delimited
+    JSON segment files.
+
+    Several processes (server workers) may share one log directory. Each
+    EventLog claims a writer slot, held with an flock for its lifetime, and
+    writes only its own segments (segment-<writer>-<number>.log). Every event
+    carries 'writer' and a 'seq' that increases per writer, so (writer, seq)
+    identifies an event across processes and restarts; a process taking over
+    a free slot resumes that writer's sequence.
+
+    Appends are buffered and fsync'ed in batches: every `fsync_every` events,
+    and at most `fsync_interval` seconds after an append (a background thread
+    flushes idle writers). The active segment is rolled once it exceeds
+    `segment_max_bytes`; only sealed segments are compacted.
+    """
+
+    def __init__(self, log_dir='data/events', segment_max_bytes=64 * 1024 * 1024,
+                 fsync_every=100, fsync_interval=1.0):
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+        self.writer, self._writer_lock = self._claim_writer()
+        # A compaction may be folding this slot's segments from a previous
+        # owner; resume its sequence only once that has finished
+        with self.compaction_lock():
+            existing = [number for writer, number in self._segments() if writer == self.writer]
+            compacted = self.read_state().get('compacted_seq', {}).get(str(self.writer), 0)
+            self.last_seq = max([compacted] + [self._last_seq_in(number) for number in existing])
+            # Never append to a segment left over from a previous process; the
+            # new active segment exists right away, so to other processes
+            # everything older is sealed
+            self._active_number = (existing[-1] + 1) if existing else 1
+            self._file = open(self._segment_path(self.writer, self._active_number), 'a')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='event-log-fsync', daemon=True)
+        self._flusher.start()
+
+    def _claim_writer(self):
+        """Lowest writer slot not held by another EventLog (in any process)"""
+        slot = 0
+        while True:
+            lock = try_lock(os.path.join(self.log_dir, f'{WRITER_LOCK_PREFIX}{slot}.lock'))
+            if lock is not None:
+                return slot, lock
+            slot += 1
+
+    def _writer_alive(self, writer):
+        """Whether another EventLog currently holds `writer`'s slot"""
+        if writer == self.writer:
+            return True
+        lock = try_lock(os.path.join(self.log_dir, f'{WRITER_LOCK_PREFIX}{writer}.lock'))
+        if lock is None:
+            return True
+        lock.close()
+        return False
+
+    def _segments(self):
+        """(writer, number) of every segment on disk, sorted"""
+        return sorted(
+            _segment_key(name) for name in os.listdir(self.log_dir)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _segment_path(self, writer, number):
+        return os.path.join(self.log_dir, _segment_name(writer, number))
+
+    def read_state(self):
+        path = os.path.join(self.log_dir, STATE_FILE)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def write_state(self, state):
+        """Atomically persist compaction progress"""
+        path = os.path.join(self.log_dir, STATE_FILE)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _last_seq_in(self, number):
+        return max((event.get('seq', 0) for event in self.read_segment(self.writer, number)), default=0)
+
+    def _stamp(self, event, now):
+        self.last_seq += 1
+        event = dict(event, writer=self.writer, seq=self.last_seq)
+        event.setdefault('timestamp', now)
+        return event
+
+    def _write(self, events):
+        if self._file is None:
+            self._file = open(self._segment_path(self.writer, self._active_number), 'a')
+        self._file.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events))
+        self._unsynced += len(events)
+
+    def append(self, event):
+        """
+        Append one event (a dict); returns it with 'writer', 'seq' (and 'timestamp') set.
+        """
+        with self._lock:
+            event = self._stamp(event, time.time())
+            self._write([event])
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            if self._file.tell() >= self.segment_max_bytes:
+                self._roll()
+            return event
+
+    def append_batch(self, events):
+        """
+        Append many events with one write and one fsync; they are durable
+        when this returns. Returns the events with 'writer', 'seq' (and
+        'timestamp') set.
+        """
+        with self._lock:
+            now = time.time()
+            stored = [self._stamp(event, now) for event in events]
+            self._write(stored)
+            self._sync()
+            if self._file.tell() >= self.segment_max_bytes:
+                self._roll()
+            return stored
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _flush_loop(self):
+        """Sync events left in the buffer by the last append of a burst"""
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+
+    def _roll(self):
+        self._sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._active_number += 1
+
+    def flush(self):
+        """Force buffered events to disk"""
+        with self._lock:
+            self._sync()
+
+    def seal(self):
+        """Close the active segment (if it has events) so it can be compacted"""
+        with self._lock:
+            self._roll()
+
+    def sealed_segments(self):
+        """
+        (writer, number) of segments no longer written to: this writer's
+        segments before the active one, all but the newest segment of other
+        live writers, and every segment of writers whose slot is free
+        """
+        with self._lock:
+            active = self._active_number
+        by_writer = {}
+        for writer, number in self._segments():
+            by_writer.setdefault(writer, []).append(number)
+        sealed = []
+        for writer, numbers in by_writer.items():
+            if writer == self.writer:
+                numbers = [number for number in numbers if number < active]
+            elif self._writer_alive(writer):
+                # A live writer only ever appends to its newest segment
+                numbers = numbers[:-1]
+            sealed.extend((writer, number) for number in numbers)
+        return sorted(sealed)
+
+    def read_segment(self, writer, number):
+        """Yield the events of one segment, skipping a torn final line"""
+        with open(self._segment_path(writer, number), 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def remove_segment(self, writer, number):
+        os.remove(self._segment_path(writer, number))
+
+    def compaction_lock(self):
+        """Cross-process lock serialising compactions of this directory (a context manager)"""
+        return FileLock(os.path.join(self.log_dir, COMPACTION_LOCK))
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        self.seal()
+        with self._lock:
+            if self._writer_lock is not None:
+                # Closing the file releases the slot
+                self._writer_lock.close()
+                self._writer_lock = None
+
+
+class FileLock:
+    """Blocking exclusive flock held for the duration of a with block"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        self._file = None
+
+
+class EventLogCompactor:
+    """
+    Folds sealed log segments into per-user profiles (via UserManager) and a
+    columnar ratings snapshot for training, then deletes the segments.
+
+    Every worker may run one: a run folds the sealed segments of all
+    writers, and runs are serialised across processes by a file lock.
+    Can run on demand (run_once) or in a background thread (start).
+    """
+
+    def __init__(self, event_log, user_manager, snapshot_path=None):
+        self.event_log = event_log
+        self.user_manager = user_manager
+        self.snapshot_path = snapshot_path or os.path.join(event_log.log_dir, SNAPSHOT_FILE)
+        self._thread = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def run_once(self):
+        """
+        Compact everything written so far.
+
+        Returns:
+            int: Number of events compacted
+        """
+        with self._run_lock, self.event_log.compaction_lock():
+            self.event_log.seal()
+            segments = self.event_log.sealed_segments()
+            events = []
+            malformed = []
+            for key in segments:
+                for event in self.event_log.read_segment(*key):
+                    (events if is_valid_event(event) else malformed).append(event)
+            if malformed:
+                # Kept for inspection instead of failing every compaction from now on
+                self._quarantine(malformed)
+            if events:
+                by_user = {}
+                for event in events:
+                    by_user.setdefault(event['user_id'], []).append(event)
+                for user_id, user_events in by_user.items():
+                    self.user_manager.apply_compacted_events(user_id, user_events)
+                self._update_snapshot([e for e in events if e['type'] == 'rating'])
+
+            if segments:
+                # Highest compacted seq per writer, so a restarted writer never reuses one
+                state = self.event_log.read_state()
+                compacted = state.setdefault('compacted_seq', {})
+                for event in events + malformed:
+                    if isinstance(event, dict) and isinstance(event.get('seq'), int):
+                        writer = str(event.get('writer', 0))
+                        compacted[writer] = max(compacted.get(writer, 0), event['seq'])
+                self.event_log.write_state(state)
+                for key in segments:
+                    self.event_log.remove_segment(*key)
+            # Events this process logged may have been compacted by another one
+            self.user_manager.prune_pending()
+            return len(events)
+
+    def _quarantine(self, events):
+        """Append events that cannot be compacted to the quarantine file"""
+        logger.warning('Quarantining %d malformed event(s) in %s', len(events), self.event_log.log_dir)
+        with open(os.path.join(self.event_log.log_dir, QUARANTINE_FILE), 'a') as f:
+            f.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _update_snapshot(self, rating_events):
+        """Merge new ratings into the snapshot, keeping the latest per (user, title)"""
+        if not rating_events:
+            return
+        new = pd.DataFrame({
+            'user_id': [str(e['user_id']) for e in rating_events],
+            'title': [e['title'] for e in rating_events],
+            'rating': [float(e['rating']) for e in rating_events],
+            'timestamp': [float(e['timestamp']) for e in rating_events],
+            'writer': [int(e['writer']) for e in rating_events],
+            'seq': [int(e['seq']) for e in rating_events]
+        })
+        existing = load_ratings_snapshot(self.snapshot_path)
+        merged = pd.concat([existing, new], ignore_index=True) if len(existing) else new
+        merged = merged.sort_values(list(EVENT_ORDER), kind='stable').drop_duplicates(['user_id', 'title'], keep='last')
+        write_ratings_snapshot(self.snapshot_path, merged)
+
+    def start(self, interval=30.0):
+        """Compact in a daemon thread every `interval` seconds"""
+        if self._thread is not None:
+            return self
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.run_once()
+                except Exception:
+                    # Keep compacting on the next tick; segments stay on disk
+                    logger.exception('Compaction of %s failed', self.event_log.log_dir)
+
+        self._thread = threading.Thread(target=loop, name='event-log-compactor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def write_ratings_snapshot(path, ratings_df):
+    """Atomically write ratings as a compressed columnar .npz file"""
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(
+        tmp_path,
+        user_id=np.array(ratings_df['user_id'].astype(str).tolist(), dtype=str),
+        title=np.array(ratings_df['title'].astype(str).tolist(), dtype=str),
+        rating=ratings_df['rating'].values.astype(np.float32),
+        timestamp=ratings_df['timestamp'].values.astype(np.float64),
+        writer=ratings_df['writer'].values.astype(np.int64),
+        seq=ratings_df['seq'].values.astype(np.int64)
+    )
+    os.replace(tmp_path, path)
+
+
+def load_ratings_snapshot(path):
+    """
+    Load the columnar ratings snapshot.
+
+    Returns:
+        DataFrame: Columns user_id, title, rating, timestamp, writer, seq (empty if missing)
+    """
+    columns = ['user_id', 'title', 'rating', 'timestamp', 'writer', 'seq']
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    with np.load(path) as data:
+        return pd.DataFrame({column: data[column] for column in columns})
@@ -0,0 +1,135 @@
+import dbm
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+
+from src.data.event_log import try_lock
+
+
+class RecommendationStore:
+    """
+    Compact key-value store of precomputed recommendation lists.
+
+    Each (model version, user) maps to a packed byte string: int32 catalogue
+    positions followed by float32 scores (8 bytes per entry, so a 100-item
+    list is 800 bytes). Tagging entries with the model version lets the lists
+    of an outgoing and an incoming model coexist during a hot swap; a reader
+    only ever sees lists computed by its own model.
+
+    Without a `path` lists live in memory. With one, they live only in a dbm
+    file, which keeps them out of the heap. dbm has no locking, so each
+    process claims its own file (`<path>.<slot>`, held with an flock like
+    event log writer slots). The file is emptied when claimed: model
+    versions are numbered per process, so lists left by a previous owner
+    could belong to a different model or catalogue.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lists = {}
+        self._counts = Counter()  # model version -> stored lists
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._slot_lock = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            slot = 0
+            while True:
+                self._slot_lock = try_lock(f'{path}.{slot}.lock')
+                if self._slot_lock is not None:
+                    break
+                slot += 1
+            self.path = f'{path}.{slot}'
+            self._db = dbm.open(self.path, 'n')
+
+    @staticmethod
+    def _db_key(version, user_id):
+        return f'{version}:{user_id}'
+
+    @staticmethod
+    def _pack(positions, scores):
+        return (np.asarray(positions, dtype=np.int32).tobytes()
+                + np.asarray(scores, dtype=np.float32).tobytes())
+
+    @staticmethod
+    def _unpack(value):
+        half = len(value) // 2
+        return (
+            np.frombuffer(value[:half], dtype=np.int32),
+            np.frombuffer(value[half:], dtype=np.float32)
+        )
+
+    def get(self, user_id, version=0):
+        """(positions, scores) for a user under a model version, or None if nothing is stored"""
+        if self._db is None:
+            value = self._lists.get((version, str(user_id)))
+        else:
+            with self._lock:
+                value = self._db.get(self._db_key(version, user_id)) if self._db is not None else None
+        return None if value is None else self._unpack(value)
+
+    def _replace(self, version, user_id, value):
+        """Store (or with value=None remove) one list and keep the counters; caller holds the lock"""
+        if self._db is None:
+            key = (version, str(user_id))
+            previous = self._lists.pop(key, None)
+            if value is not None:
+                self._lists[key] = value
+        else:
+            key = self._db_key(version, user_id)
+            previous = self._db.get(key)
+            if value is not None:
+                self._db[key] = value
+            elif previous is not None:
+                del self._db[key]
+        self._counts[version] += (value is not None) - (previous is not None)
+        self._bytes += len(value or b'') - len(previous or b'')
+
+    def put(self, user_id, positions, scores, version=0):
+        value = self._pack(positions, scores)
+        with self._lock:
+            self._replace(version, user_id, value)
+
+    def delete(self, user_id, version=0):
+        with self._lock:
+            self._replace(version, user_id, None)
+
+    def drop_version(self, version):
+        """Remove every list computed by a retired model version"""
+        with self._lock:
+            if self._db is None:
+                users = [user_id for v, user_id in self._lists if v == version]
+            else:
+                prefix = self._db_key(version, '').encode('utf-8')
+                users = [key[len(prefix):].decode('utf-8') for key in self._db.keys() if key.startswith(prefix)]
+            for user_id in users:
+                self._replace(version, user_id, None)
+            del self._counts[version]
+        return len(users)
+
+    def count(self, version=None):
+        """Number of stored lists (for one model version, or all)"""
+        if version is None:
+            return sum(self._counts.values())
+        return self._counts[version]
+
+    def __len__(self):
+        return self.count()
+
+    def nbytes(self):
+        """Bytes held by the stored lists"""
+        return self._bytes
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            if self._slot_lock is not None:
+                self._slot_lock.close()
+                self._slot_lock = None
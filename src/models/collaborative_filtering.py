@@ -1,5 +1,7 @@
+import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
+from src.models.ranking import top_k
 
 class CollaborativeFilteringRecommender:
     def __init__(self):
@@ -15,19 +17,84 @@ class CollaborativeFilteringRecommender:
         self.sim_matrix = cosine_similarity(self.user_item_matrix)
         return self
 
+    def knows_user(self, user_id):
+        """Whether the user appears in the training ratings"""
+        return self.user_item_matrix is not None and user_id in self.user_item_matrix.index
+
+    def score_candidates(self, user_id, k=100, mask=None):
+        """
+        Scored candidate pool for a user.
+
+        Returns (show_ids, scores) for the k unrated shows with the highest
+        similarity-weighted average rating among other users, best first.
+        An optional boolean `mask` aligned with user_item_matrix.columns
+        restricts the candidates.
+        """
+        if not self.knows_user(user_id):
+            return np.empty(0, dtype=object), np.empty(0)
+        user_idx = self.user_item_matrix.index.get_loc(user_id)
+        ratings = self.user_item_matrix.values
+        # Weight every other user by their similarity (excluding self)
+        weights = self.sim_matrix[user_idx].copy()
+        weights[user_idx] = 0
+        total = weights.sum()
+        if total <= 0:
+            return np.empty(0, dtype=object), np.empty(0)
+        scores = weights.dot(ratings) / total
+        # Remove shows already rated by the user
+        eligible = (ratings[user_idx] == 0) & (scores > 0)
+        if mask is not None:
+            eligible &= mask
+        best = top_k(scores, k, mask=eligible)
+        return self.user_item_matrix.columns.values[best], scores[best]
+
+    def score_candidates_batch(self, user_ids, k=100, mask=None):
+        """
+        Batched score_candidates: one dense mat-mat product for many users.
+
+        Returns a list of (show_ids, scores) pairs aligned with user_ids;
+        unknown users get empty pools.
+        """
+        empty = (np.empty(0, dtype=object), np.empty(0))
+        results = [empty] * len(user_ids)
+        rows = [i for i, user_id in enumerate(user_ids) if self.knows_user(user_id)]
+        if not rows:
+            return results
+        user_idx = self.user_item_matrix.index.get_indexer([user_ids[i] for i in rows])
+        ratings = self.user_item_matrix.values
+        weights = self.sim_matrix[user_idx].copy()
+        weights[np.arange(len(rows)), user_idx] = 0
+        totals = weights.sum(axis=1)
+        scores = weights.dot(ratings) / np.where(totals > 0, totals, 1)[:, None]
+        show_ids = self.user_item_matrix.columns.values
+
+        for row, i in enumerate(rows):
+            if totals[row] <= 0:
+                continue
+            eligible = (ratings[user_idx[row]] == 0) & (scores[row] > 0)
+            if mask is not None:
+                eligible &= mask
+            best = top_k(scores[row], k, mask=eligible)
+            results[i] = (show_ids[best], scores[row, best])
+        return results
+
     def recommend(self, user_id, n=5):
         """
         Returns top n recommended show_ids for the given user_id.
+
+        Shows are ranked by their mean rating over all other users (unrated
+        counting as 0), not by the similarity-weighted scores the hybrid
+        blends via score_candidates.
         """
-        if user_id not in self.user_item_matrix.index:
+        if not self.knows_user(user_id):
+            return []
+        n_users = len(self.user_item_matrix.index)
+        if n_users < 2:
             return []
         user_idx = self.user_item_matrix.index.get_loc(user_id)
-        sim_scores = self.sim_matrix[user_idx]
-        # Find most similar users (excluding self)
-        similar_users = sim_scores.argsort()[::-1][1:]
-        # Aggregate ratings from similar users
-        recs = self.user_item_matrix.iloc[similar_users].mean().sort_values(ascending=False)
+        ratings = self.user_item_matrix.values
+        # Aggregate ratings from the other users
+        scores = (ratings.sum(axis=0) - ratings[user_idx]) / (n_users - 1)
         # Remove shows already rated by the user
-        watched = self.user_item_matrix.loc[user_id]
-        recs = recs[watched == 0]
-        return recs.head(n).index.tolist()
+        best = top_k(scores, n, mask=ratings[user_idx] == 0)
+        return self.user_item_matrix.columns.values[best].tolist()
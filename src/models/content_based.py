@@ -1,13 +1,27 @@
-import pandas as pd
+import numpy as np
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from src.models.quantization import PRECISIONS, compact, csr_nbytes, topk_overlap
+from src.models.ranking import top_k
+from src.models.title_index import TitleSearchIndex
 
 class ContentBasedRecommender:
-    def __init__(self):
+    def __init__(self, precision='float64'):
+        """
+        Args:
+            precision (str): Storage precision of the TF-IDF matrix: 'float64'
+                (sklearn's default), 'float32', or 'int8' (per-row scaled
+                codes). Scores are computed directly on the stored form;
+                see precision_report for the accuracy cost.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}; expected one of {', '.join(PRECISIONS)}")
+        self.precision = precision
+        self.score_dtype = PRECISIONS[precision]
         self.tfidf = None
         self.tfidf_matrix = None
         self.df = None
-        self.indices = None
+        self.title_index = None
 
     def fit(self, df):
         """
@@ -15,18 +29,142 @@ class ContentBasedRecommender:
         """
         self.df = df.reset_index(drop=True)
         self.tfidf = TfidfVectorizer(stop_words='english')
-        self.tfidf_matrix = self.tfidf.fit_transform(self.df['soup'].fillna(''))
-        self.indices = pd.Series(self.df.index, index=self.df['title'].str.lower())
+        self.tfidf_matrix = compact(self.tfidf.fit_transform(self.df['soup'].fillna('')), self.precision)
+        self.title_index = TitleSearchIndex().fit(self.df['title'])
         return self
 
-    def recommend(self, title, n=5):
+    def attach(self, df, tfidf_matrix, title_index):
+        """
+        Use already fitted arrays (e.g. from a SharedModelHandle) instead of
+        fitting; `df` must be in the same row order as tfidf_matrix.
+        """
+        self.df = df.reset_index(drop=True)
+        self.tfidf_matrix = tfidf_matrix
+        self.title_index = title_index
+        return self
+
+    def resolve_positions(self, titles):
+        """
+        Row positions for the given titles, skipping ones that cannot be resolved.
+        """
+        positions = []
+        for title in titles:
+            idx = self.title_index.resolve(title)
+            if idx is not None and idx not in positions:
+                positions.append(idx)
+        return positions
+
+    def similarity_scores(self, positions):
+        """
+        Cosine similarity of every title to the combined profile of the given rows.
+        TF-IDF rows are L2-normalised, so one sparse mat-vec gives the cosines.
+        """
+        profile = np.asarray(self.tfidf_matrix[positions].sum(axis=0), dtype=self.score_dtype).ravel()
+        return self.tfidf_matrix.dot(profile) / len(positions)
+
+    def score_candidates(self, titles, k=100, mask=None):
+        """
+        Scored candidate pool for a set of seed titles.
+
+        Returns (positions, scores) for the k titles most similar to the seeds,
+        best first, excluding the seeds themselves. An optional boolean `mask`
+        over catalogue positions restricts the candidates (filter push-down).
+        """
+        return self.score_positions(self.resolve_positions(titles), k=k, mask=mask)
+
+    def score_positions(self, positions, k=100, mask=None):
+        """
+        Same as score_candidates, for seed rows given by position.
+        """
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        scores = self.similarity_scores(positions)
+        eligible = np.ones(len(scores), dtype=bool) if mask is None else mask.copy()
+        eligible[positions] = False
+        best = top_k(scores, k, mask=eligible)
+        return best, scores[best]
+
+    def score_positions_batch(self, position_lists, k=100, mask=None, chunk_cells=2 ** 24):
+        """
+        Batched score_positions: one sparse mat-mat product per chunk of seed
+        sets instead of one mat-vec per set. Chunks are sized so the dense
+        score block stays under `chunk_cells` entries.
+
+        Returns a list of (positions, scores) pairs aligned with position_lists.
+        """
+        results = [(np.empty(0, dtype=np.int64), np.empty(0))] * len(position_lists)
+        rows = [i for i, positions in enumerate(position_lists) if positions]
+        n_items = self.tfidf_matrix.shape[0]
+        chunk = max(1, chunk_cells // max(n_items, 1))
+
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            # Row j of `seeds` averages the seed rows of set block[j]
+            indptr = np.cumsum([0] + [len(position_lists[i]) for i in block])
+            indices = np.concatenate([position_lists[i] for i in block])
+            weights = np.concatenate([np.full(len(position_lists[i]), 1.0 / len(position_lists[i])) for i in block])
+            # Only the seed rows are read to build the profiles
+            seed_rows, local = np.unique(indices, return_inverse=True)
+            seeds = sp.csr_matrix((weights, local, indptr), shape=(len(block), len(seed_rows)))
+            profiles = (seeds @ self.tfidf_matrix[seed_rows]).T.toarray().astype(self.score_dtype)
+            scores = self.tfidf_matrix.dot(profiles).T
+
+            for row, i in enumerate(block):
+                eligible = np.ones(n_items, dtype=bool) if mask is None else mask.copy()
+                eligible[position_lists[i]] = False
+                best = top_k(scores[row], k, mask=eligible)
+                results[i] = (best, scores[row, best])
+        return results
+
+    def matrix_stats(self):
+        """Vocabulary size, non-zeros and bytes of the TF-IDF matrix"""
+        m = self.tfidf_matrix
+        return {'features': m.shape[1], 'nnz': m.nnz, 'bytes': csr_nbytes(m)}
+
+    def precision_report(self, reference=None, k=10, n_queries=200, max_seeds=5, seed=0):
+        """
+        Quality check for reduced precision: top-k overlap with a float64
+        model of the same catalogue over random 1..max_seeds seed sets.
+
+        Args:
+            reference (ContentBasedRecommender, optional): Fitted float64 model
+                (fitted from self.df when omitted; required for models without
+                the 'soup' column, such as attached or sharded ones)
+            k (int): List length compared
+            n_queries (int): Number of random seed sets
+
+        Returns:
+            dict: precision, k, queries, mean/min overlap and matrix bytes of both models
+        """
+        if reference is None:
+            if 'soup' not in self.df.columns:
+                raise ValueError("precision_report needs a reference model: this model's catalogue has no 'soup' column")
+            reference = ContentBasedRecommender('float64').fit(self.df)
+        rng = np.random.default_rng(seed)
+        seed_lists = [
+            rng.choice(len(self.df), size=rng.integers(1, max_seeds + 1), replace=False).tolist()
+            for _ in range(n_queries)
+        ]
+        expected = reference.score_positions_batch(seed_lists, k=k)
+        actual = self.score_positions_batch(seed_lists, k=k)
+        overlaps = [topk_overlap([e], [a]) for e, a in zip(expected, actual)]
+        return {
+            'precision': self.precision,
+            'k': k,
+            'queries': n_queries,
+            'overlap': float(np.mean(overlaps)),
+            'min_overlap': float(np.min(overlaps)),
+            'bytes': self.matrix_stats()['bytes'],
+            'reference_bytes': reference.matrix_stats()['bytes']
+        }
+
+    def close(self):
+        """Release resources held outside this process (no-op here)"""
+
+    def recommend(self, title, n=5, mask=None):
         """
         Returns top n similar titles to the given title.
+        Misspelled titles are resolved to the closest catalogue title.
         """
-        idx = self.indices.get(title.lower())
-        if idx is None:
-            return pd.DataFrame()  # Title not found
-        sim_scores = list(enumerate(cosine_similarity(self.tfidf_matrix[idx], self.tfidf_matrix)[0]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:n+1]
-        rec_indices = [i[0] for i in sim_scores]
-        return self.df.iloc[rec_indices][['title', 'type', 'listed_in', 'description']]
+        rec_indices, _ = self.score_candidates([title], k=n, mask=mask)
+        return self.df.iloc[rec_indices]
@@ -0,0 +1,135 @@
+import threading
+
+import numpy as np
+from src.utils.core import split_genres
+
+FILTER_KEYS = ('type', 'genre', 'rating', 'year_min', 'year_max')
+
+
+class CatalogueFilter:
+    """
+    Precomputed boolean masks over catalogue positions for filter push-down.
+
+    One mask is built per distinct type, rating and genre value when the
+    catalogue is loaded, plus an integer release-year column. A filter is
+    then a handful of vectorised ORs (values of one attribute) and ANDs
+    (across attributes) that ranking functions take as `mask=`, so top-k
+    only ever sees matching titles and always returns n of them when n exist.
+    """
+
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self.size = 0
+        self.type_masks = {}
+        self.rating_masks = {}
+        self.genre_masks = {}
+        self.release_years = None
+        self._cache = {}
+        # Request threads share the cache
+        self._cache_lock = threading.Lock()
+
+    def fit(self, df):
+        """
+        Expects the catalogue DataFrame (positional index) with 'type',
+        'rating', 'listed_in' and 'release_year' columns.
+        """
+        self.size = len(df)
+        self.type_masks = self._value_masks(df['type'].fillna('Unknown').values)
+        self.rating_masks = self._value_masks(df['rating'].fillna('Unknown').values)
+
+        self.genre_masks = {}
+        for pos, genres in enumerate(df['listed_in'].values):
+            for genre in split_genres(genres):
+                mask = self.genre_masks.get(genre.lower())
+                if mask is None:
+                    mask = self.genre_masks[genre.lower()] = np.zeros(self.size, dtype=bool)
+                mask[pos] = True
+
+        # Missing years never match a year range
+        years = df['release_year'].values.astype(np.float64)
+        self.release_years = np.where(np.isnan(years), -1, years).astype(np.int32)
+        with self._cache_lock:
+            self._cache = {}
+        return self
+
+    def _value_masks(self, values):
+        """One boolean mask per distinct (case-insensitive) value"""
+        keys = np.array([str(value).lower() for value in values])
+        uniques, codes = np.unique(keys, return_inverse=True)
+        return {value: codes == i for i, value in enumerate(uniques)}
+
+    @staticmethod
+    def _values(value):
+        """Normalise a filter value (string, comma-separated string or list) to a sorted tuple"""
+        if value is None:
+            return ()
+        if isinstance(value, str):
+            value = value.split(',')
+        return tuple(sorted({str(v).strip().lower() for v in value if str(v).strip()}))
+
+    @classmethod
+    def single_value(cls, filters, name):
+        """The one (lower-cased) value filtered on for `name`, or None"""
+        values = cls._values((filters or {}).get(name))
+        return values[0] if len(values) == 1 else None
+
+    @staticmethod
+    def _any_of(masks, values, size):
+        """OR of the masks for the given values; unknown values match nothing"""
+        combined = np.zeros(size, dtype=bool)
+        for value in values:
+            mask = masks.get(value)
+            if mask is not None:
+                combined |= mask
+        return combined
+
+    def mask(self, filters=None):
+        """
+        Boolean mask of catalogue positions matching all the given filters.
+
+        Args:
+            filters (dict): Any of 'type', 'genre', 'rating' (a value, a list
+                of values or a comma-separated string; matched
+                case-insensitively, any value may match) and 'year_min' /
+                'year_max' (inclusive release year bounds)
+
+        Returns:
+            ndarray or None: Boolean mask, or None when nothing is filtered
+        """
+        if not filters:
+            return None
+        key = (
+            self._values(filters.get('type')),
+            self._values(filters.get('genre')),
+            self._values(filters.get('rating')),
+            None if filters.get('year_min') is None else int(filters['year_min']),
+            None if filters.get('year_max') is None else int(filters['year_max'])
+        )
+        if not any(part or part == 0 for part in key):
+            return None
+
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        types, genres, ratings, year_min, year_max = key
+        mask = np.ones(self.size, dtype=bool)
+        if types:
+            mask &= self._any_of(self.type_masks, types, self.size)
+        if genres:
+            mask &= self._any_of(self.genre_masks, genres, self.size)
+        if ratings:
+            mask &= self._any_of(self.rating_masks, ratings, self.size)
+        if year_min is not None:
+            mask &= self.release_years >= year_min
+        if year_max is not None:
+            mask &= (self.release_years <= year_max) & (self.release_years >= 0)
+
+        # Masks are shared between requests; keep them read-only
+        mask.flags.writeable = False
+        with self._cache_lock:
+            if key not in self._cache and len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = mask
+        return mask
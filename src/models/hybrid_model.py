@@ -1,17 +1,152 @@
+import numpy as np
+import pandas as pd
+from src.models.ranking import min_max_normalize, top_k
+
+DEFAULT_WEIGHTS = {'content': 0.6, 'collaborative': 0.3, 'popularity': 0.1}
+
 class HybridRecommender:
-    def __init__(self, content_model, collab_model):
+    def __init__(self, content_model, collab_model=None, popularity_model=None, weights=None, pool_size=200):
         self.content_model = content_model
         self.collab_model = collab_model
+        self.popularity_model = popularity_model
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.pool_size = pool_size
+        # Catalogue positions are the shared candidate id space
+        self.show_index = pd.Index(content_model.df['show_id'])
+
+    def _positions(self, show_ids, scores):
+        """Map show_ids to catalogue positions, dropping shows not in the catalogue"""
+        positions = self.show_index.get_indexer(show_ids)
+        known = positions >= 0
+        return positions[known], scores[known]
+
+    def _item_mask(self, show_ids, mask):
+        """Translate a mask over catalogue positions to a model's own show_id order"""
+        if mask is None:
+            return None
+        positions = self.show_index.get_indexer(show_ids)
+        item_mask = np.zeros(len(positions), dtype=bool)
+        known = positions >= 0
+        item_mask[known] = mask[positions[known]]
+        return item_mask
+
+    def candidate_pools(self, user_id=None, titles=None, mask=None):
+        """
+        Scored candidate pools from each available source.
+
+        Returns a list of (source, positions, scores) plus the positions of the
+        seed titles, which must not be recommended back. An optional boolean
+        `mask` over catalogue positions is pushed down into every source's
+        top-k, so each pool only holds matching titles.
+        """
+        pools = []
+        seeds = self.content_model.resolve_positions(titles or [])
+
+        if seeds:
+            positions, scores = self.content_model.score_positions(seeds, k=self.pool_size, mask=mask)
+            pools.append(('content', positions, scores))
+
+        if self.collab_model is not None and user_id is not None:
+            show_ids, scores = self.collab_model.score_candidates(
+                user_id, k=self.pool_size,
+                mask=self._item_mask(self.collab_model.user_item_matrix.columns, mask)
+            )
+            if len(show_ids):
+                pools.append(('collaborative',) + self._positions(show_ids, scores))
+
+        if self.popularity_model is not None:
+            show_ids, scores = self.popularity_model.score_candidates(
+                k=self.pool_size,
+                mask=self._item_mask(self.popularity_model.show_ids, mask)
+            )
+            if len(show_ids):
+                pools.append(('popularity',) + self._positions(show_ids, scores))
+
+        return pools, seeds
+
+    def score(self, user_id=None, titles=None, n=10, exclude=None, mask=None):
+        """
+        Blend normalised scores from all sources over the candidate union.
+
+        Each pool is min-max normalised, weighted, and scattered into one
+        array over the union of candidates; the top n are selected with
+        top_k (ties go to the lower position, as everywhere else).
+
+        Returns:
+            tuple: (positions, scores) best first
+        """
+        pools, seeds = self.candidate_pools(user_id, titles, mask=mask)
+        return self._blend(pools, set(seeds) | set(exclude or ()), n)
+
+    def score_batch(self, user_ids, title_lists, n=10, mask=None):
+        """
+        Batched score for many users (e.g. an offline precompute job).
+
+        Content and collaborative pools are computed with one matrix product
+        per batch instead of one per user; the popularity pool is shared.
+
+        Returns:
+            list: (positions, scores) pairs aligned with user_ids
+        """
+        seed_lists = [self.content_model.resolve_positions(titles or []) for titles in title_lists]
+        content_pools = self.content_model.score_positions_batch(seed_lists, k=self.pool_size, mask=mask)
+
+        collab_pools = [None] * len(user_ids)
+        if self.collab_model is not None:
+            collab_pools = [
+                self._positions(show_ids, scores) if len(show_ids) else None
+                for show_ids, scores in self.collab_model.score_candidates_batch(
+                    user_ids, k=self.pool_size,
+                    mask=self._item_mask(self.collab_model.user_item_matrix.columns, mask)
+                )
+            ]
+
+        popularity_pool = None
+        if self.popularity_model is not None:
+            show_ids, scores = self.popularity_model.score_candidates(
+                k=self.pool_size,
+                mask=self._item_mask(self.popularity_model.show_ids, mask)
+            )
+            if len(show_ids):
+                popularity_pool = self._positions(show_ids, scores)
+
+        results = []
+        for seeds, content_pool, collab_pool in zip(seed_lists, content_pools, collab_pools):
+            pools = []
+            if seeds:
+                pools.append(('content',) + content_pool)
+            if collab_pool is not None:
+                pools.append(('collaborative',) + collab_pool)
+            if popularity_pool is not None:
+                pools.append(('popularity',) + popularity_pool)
+            results.append(self._blend(pools, set(seeds), n))
+        return results
+
+    def _blend(self, pools, excluded, n):
+        """Weighted sum of min-max normalised pools over their union, top n"""
+        pools = [pool for pool in pools if len(pool[1]) and self.weights.get(pool[0], 0) > 0]
+        if not pools:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        union = np.unique(np.concatenate([positions for _, positions, _ in pools]))
+        blended = np.zeros(len(union))
+        for source, positions, scores in pools:
+            slots = np.searchsorted(union, positions)
+            np.add.at(blended, slots, self.weights[source] * min_max_normalize(scores))
+
+        if excluded:
+            keep = ~np.isin(union, list(excluded))
+            union, blended = union[keep], blended[keep]
+
+        # union is sorted, so top_k's lower-index tie rule is the lower position
+        best = top_k(blended, n)
+        return union[best].astype(np.int64), blended[best]
 
     def recommend(self, user_id, title, n=5):
         """
-        Returns a hybrid recommendation list: half from collaborative, half from content-based.
+        Returns a hybrid recommendation list blending content, collaborative
+        and popularity scores. `title` may be a single title or a list.
         """
-        recs_content = self.content_model.recommend(title, n=n//2)
-        recs_collab = self.collab_model.recommend(user_id, n=n - n//2)
-        # Combine and deduplicate
-        recs_combined = pd.concat([
-            recs_content[['title']],
-            pd.DataFrame({'title': recs_collab})
-        ]).drop_duplicates().head(n)
-        return recs_combined
+        titles = [title] if isinstance(title, str) else list(title or [])
+        positions, scores = self.score(user_id, titles, n=n)
+        return self.content_model.df.iloc[positions].assign(score=scores)
@@ -0,0 +1,44 @@
+import numpy as np
+from src.models.ranking import top_k
+
+class PopularityRecommender:
+    def __init__(self, prior_weight=10):
+        self.prior_weight = prior_weight
+        self.show_ids = None
+        self.scores = None
+
+    def fit(self, ratings_df):
+        """
+        Expects a DataFrame with columns: show_id, rating.
+        Scores each show by a Bayesian-averaged rating times log rating count,
+        so a handful of 5-star ratings does not beat a widely liked title.
+        """
+        stats = ratings_df.groupby('show_id')['rating'].agg(['count', 'mean'])
+        global_mean = ratings_df['rating'].mean()
+        shrunk = (
+            (stats['count'] * stats['mean'] + self.prior_weight * global_mean)
+            / (stats['count'] + self.prior_weight)
+        )
+        self.show_ids = stats.index.values
+        self.scores = (shrunk * np.log1p(stats['count'])).values
+        return self
+
+    def score_candidates(self, k=100, exclude=None, mask=None):
+        """
+        Returns (show_ids, scores) of the k most popular shows, best first.
+        An optional boolean `mask` aligned with show_ids restricts the candidates.
+        """
+        if self.scores is None:
+            return np.empty(0, dtype=object), np.empty(0)
+        if exclude:
+            allowed = ~np.isin(self.show_ids, list(exclude))
+            mask = allowed if mask is None else mask & allowed
+        best = top_k(self.scores, k, mask=mask)
+        return self.show_ids[best], self.scores[best]
+
+    def recommend(self, n=5):
+        """
+        Returns the n most popular show_ids.
+        """
+        show_ids, _ = self.score_candidates(k=n)
+        return show_ids.tolist()
@@ -0,0 +1,111 @@
+import numpy as np
+import scipy.sparse as sp
+
+# Storage precisions for model matrices, with the float type used for scoring
+PRECISIONS = {'float64': np.float64, 'float32': np.float32, 'int8': np.float32}
+
+
+class QuantizedMatrix:
+    """
+    Row-wise int8 scalar quantisation of a CSR matrix.
+
+    Every row keeps its sparsity pattern; its values are stored as int8
+    codes with one float32 scale per row (the row's max magnitude / 127),
+    so the data array takes 1 byte per non-zero instead of 8. Products are
+    computed on the codes in row chunks and scaled afterwards; only one
+    chunk is ever widened to float32.
+    """
+
+    def __init__(self, codes, scales, chunk_rows=65536):
+        self.codes = codes
+        self.scales = scales
+        self.chunk_rows = chunk_rows
+
+    @classmethod
+    def from_csr(cls, matrix):
+        matrix = sp.csr_matrix(matrix)
+        row_max = np.zeros(matrix.shape[0], dtype=np.float32)
+        nonempty = np.diff(matrix.indptr) > 0
+        row_max[nonempty] = np.maximum.reduceat(np.abs(matrix.data), matrix.indptr[:-1][nonempty])
+        scales = np.where(row_max > 0, row_max / 127, 1).astype(np.float32)
+        row_of = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        data = np.rint(matrix.data / scales[row_of]).astype(np.int8)
+        return cls(sp.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape), scales)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nnz(self):
+        return self.codes.nnz
+
+    @property
+    def data(self):
+        return self.codes.data
+
+    @property
+    def indices(self):
+        return self.codes.indices
+
+    @property
+    def indptr(self):
+        return self.codes.indptr
+
+    @property
+    def nbytes(self):
+        return csr_nbytes(self.codes) + self.scales.nbytes
+
+    def __getitem__(self, positions):
+        """Dequantised float32 CSR of the given rows"""
+        rows = self.codes[positions]
+        return sp.diags(self.scales[positions]) @ rows.astype(np.float32)
+
+    def dot(self, other):
+        """Product with a dense vector (features,) or matrix (features x q)"""
+        other = np.asarray(other, dtype=np.float32)
+        result = np.empty((self.shape[0],) + other.shape[1:], dtype=np.float32)
+        codes = self.codes
+        for start in range(0, self.shape[0], self.chunk_rows):
+            end = min(start + self.chunk_rows, self.shape[0])
+            # View of the chunk's rows (slicing a CSR would copy the indices)
+            low, high = codes.indptr[start], codes.indptr[end]
+            chunk = sp.csr_matrix(
+                (codes.data[low:high], codes.indices[low:high], codes.indptr[start:end + 1] - low),
+                shape=(end - start, self.shape[1]), copy=False
+            )
+            result[start:end] = chunk.dot(other)
+        scales = self.scales if other.ndim == 1 else self.scales[:, None]
+        return result * scales
+
+
+def compact(matrix, precision='float64'):
+    """A CSR matrix stored in the given precision (QuantizedMatrix for int8)"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}; expected one of {', '.join(PRECISIONS)}")
+    if precision == 'int8':
+        return QuantizedMatrix.from_csr(matrix)
+    return sp.csr_matrix(matrix, dtype=PRECISIONS[precision])
+
+
+def csr_nbytes(matrix):
+    """Bytes held by a CSR matrix's data, indices and indptr arrays"""
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.nbytes
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def topk_overlap(reference, candidate):
+    """
+    Mean fraction of each reference top-k list that the candidate list
+    also contains (1.0 = the same items, in any order).
+
+    Args:
+        reference (list): (positions, scores) pairs from the float64 model
+        candidate (list): (positions, scores) pairs for the same queries
+    """
+    overlaps = [
+        len(np.intersect1d(ref, cand)) / len(ref)
+        for (ref, _), (cand, _) in zip(reference, candidate) if len(ref)
+    ]
+    return float(np.mean(overlaps)) if overlaps else 1.0
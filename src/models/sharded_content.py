@@ -0,0 +1,355 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.models.content_based import ContentBasedRecommender
+from src.models.quantization import QuantizedMatrix, compact, csr_nbytes
+from src.models.ranking import top_k
+from src.models.title_index import TitleSearchIndex
+
+
+def _save_block(block, path):
+    """Write a shard's row block to `path`.npz (plus `path`.scales.npy for int8 blocks)"""
+    if isinstance(block, QuantizedMatrix):
+        sp.save_npz(f'{path}.npz', block.codes, compressed=False)
+        np.save(f'{path}.scales.npy', block.scales)
+    else:
+        sp.save_npz(f'{path}.npz', block, compressed=False)
+
+
+def _load_block(path):
+    """Read a row block written by _save_block"""
+    matrix = sp.load_npz(f'{path}.npz')
+    if os.path.exists(f'{path}.scales.npy'):
+        return QuantizedMatrix(matrix, np.load(f'{path}.scales.npy'))
+    return matrix
+
+
+def _shard_main(conn):
+    """
+    Shard worker loop: owns one row block of the TF-IDF matrix and answers
+    profile and top-k requests from the coordinator over a pipe. Every
+    request carries an id that is sent back with its reply.
+    """
+    block = None
+    offset = 0
+    while True:
+        request_id, command, payload = conn.recv()
+        if command == 'load':
+            path, offset = payload
+            block = _load_block(path)
+            reply = None
+        elif command == 'profiles':
+            # Sum of the requested local rows for each query (sparse, 1 x features)
+            reply = [
+                sp.csr_matrix(block[positions].sum(axis=0)) if len(positions) else None
+                for positions in payload
+            ]
+        elif command == 'score':
+            profiles, k, mask, excluded = payload
+            # Dense profiles: one sparse mat-mat with a dense right-hand side
+            scores = np.asarray(block.dot(profiles.toarray().T)).T
+            reply = []
+            for row in range(scores.shape[0]):
+                eligible = np.ones(block.shape[0], dtype=bool) if mask is None else mask.copy()
+                eligible[excluded[row]] = False
+                best = top_k(scores[row], k, mask=eligible)
+                reply.append((best + offset, scores[row, best]))
+        elif command == 'stats':
+            reply = (block.nnz, csr_nbytes(block))
+        elif command == 'close':
+            conn.send((request_id, None))
+            conn.close()
+            return
+        conn.send((request_id, reply))
+
+
+class _Shard:
+    """
+    Coordinator end of one shard process.
+
+    Requests from any number of threads share the pipe: each is tagged with
+    an id, and a reader thread hands every reply to the Future of the
+    request it answers. Once the pipe fails (e.g. the process died) every
+    waiting and later request fails with the same error.
+    """
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self._ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._waiting_lock = threading.Lock()
+        self._waiting = {}  # request id -> Future
+        self._error = None
+        self._reader = threading.Thread(target=self._read_replies, name=f'{process.name}-replies', daemon=True)
+        self._reader.start()
+
+    def request(self, command, payload=None):
+        """Send one request; returns a Future for its reply"""
+        future = Future()
+        with self._waiting_lock:
+            if self._error is not None:
+                raise self._error
+            request_id = next(self._ids)
+            self._waiting[request_id] = future
+        try:
+            # A message must go out in one piece
+            with self._send_lock:
+                self.conn.send((request_id, command, payload))
+        except Exception:
+            with self._waiting_lock:
+                self._waiting.pop(request_id, None)
+            raise
+        return future
+
+    def _read_replies(self):
+        try:
+            while True:
+                request_id, reply = self.conn.recv()
+                with self._waiting_lock:
+                    future = self._waiting.pop(request_id, None)
+                if future is not None:
+                    future.set_result(reply)
+        except Exception as e:
+            with self._waiting_lock:
+                self._error = EOFError(f'Shard {self.process.name} stopped answering: {e!r}')
+                waiting, self._waiting = self._waiting, {}
+            for future in waiting.values():
+                future.set_exception(self._error)
+
+    def stop(self, graceful=True):
+        """Stop the process (asking it to exit first when graceful) and release the pipe"""
+        if graceful:
+            try:
+                self.request('close').result(timeout=5)
+            except Exception:
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        # The reader sees EOF once the process is gone
+        self._reader.join(timeout=5)
+        self.conn.close()
+
+
+class ShardedContentRecommender(ContentBasedRecommender):
+    """
+    ContentBasedRecommender whose TF-IDF matrix is partitioned by rows
+    across `n_shards` local worker processes.
+
+    A query is scattered to every shard, which scores its own rows against
+    the seed profile and returns its local top-k; the coordinator merges
+    the sorted shard results with a heap. Only the vectorizer, title index
+    and catalogue DataFrame (without the 'soup' text) live in the
+    coordinator, so the matrix can be larger than one process's memory
+    budget, and one query's scan runs on n_shards cores. Results match the
+    unsharded recommender.
+
+    Queries from several threads are in flight at once: requests carry ids
+    and replies are matched to them (see _Shard), so a live request only
+    queues behind the shard work already sent, not behind another thread's
+    whole exchange.
+
+    The row blocks are written to a temporary directory at fit time and
+    loaded from there by the shards. If a shard dies or an exchange fails
+    part-way, the shard set is no longer trusted: every shard is stopped, a
+    fresh set is spawned from the stored blocks, and the query is retried once.
+    """
+
+    def __init__(self, n_shards=None, precision='float64'):
+        super().__init__(precision)
+        self.n_shards = n_shards or multiprocessing.cpu_count()
+        self.boundaries = None
+        self.n_features = 0
+        self._shards = []
+        self._block_dir = None
+        self.healthy = False
+        self.restarts = 0
+        self._closed = True
+        # Guards starting and stopping the shard set, not the exchanges
+        self._lock = threading.Lock()
+
+    def fit(self, df):
+        """
+        Expects a DataFrame with a 'soup' column (combined text features).
+        Vocabulary and IDF are fitted globally; each shard receives only
+        its own transformed row block.
+        """
+        self.close()
+        df = df.reset_index(drop=True)
+        soup = df['soup'].fillna('')
+        self.tfidf = TfidfVectorizer(stop_words='english').fit(soup)
+        self.n_features = len(self.tfidf.vocabulary_)
+        self.title_index = TitleSearchIndex().fit(df['title'])
+
+        n_shards = max(1, min(self.n_shards, len(df)))
+        self.boundaries = np.linspace(0, len(df), n_shards + 1).astype(np.int64)
+        self._block_dir = tempfile.mkdtemp(prefix='content-shards-')
+        for s, (start, end) in enumerate(zip(self.boundaries[:-1], self.boundaries[1:])):
+            block = compact(self.tfidf.transform(soup[start:end]), self.precision)
+            _save_block(block, self._block_path(s))
+        # The blocks are all the shards need: the text stays out of this process
+        self.df = df.drop(columns='soup')
+
+        with self._lock:
+            self._closed = False
+            self._spawn()
+        return self
+
+    def _block_path(self, shard):
+        return os.path.join(self._block_dir, f'block-{shard}')
+
+    def _spawn(self):
+        """Start one shard process per row block and load its block (caller holds the lock)"""
+        # Spawned (not forked) workers: safe to start from threaded servers
+        context = multiprocessing.get_context('spawn')
+        for s, start in enumerate(self.boundaries[:-1]):
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_main, args=(child,), name=f'content-shard-{s}', daemon=True)
+            process.start()
+            child.close()
+            self._shards.append(_Shard(process, parent))
+        loads = [shard.request('load', (self._block_path(s), int(start)))
+                 for s, (shard, start) in enumerate(zip(self._shards, self.boundaries[:-1]))]
+        for load in loads:
+            load.result()
+        self.healthy = True
+
+    def _kill(self):
+        """Stop every shard without talking to it (caller holds the lock)"""
+        shards, self._shards = self._shards, []
+        self.healthy = False
+        for shard in shards:
+            shard.stop(graceful=False)
+
+    def _live_shards(self):
+        """The current shard set, respawned first if the last one failed"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Sharded content model is closed (or not fitted)')
+            if not self.healthy:
+                self._kill()
+                self.restarts += 1
+                self._spawn()
+            return self._shards
+
+    def _discard(self, shards):
+        """Stop a failed shard set, unless another thread already replaced it"""
+        with self._lock:
+            if self._shards is shards:
+                self._kill()
+
+    def _scatter(self, command, payloads):
+        """
+        Send one payload per shard, then collect the replies (shards work in
+        parallel). On a failure the shards are replaced and the exchange is
+        retried once; a second failure leaves the model unhealthy (the next
+        query respawns again) and raises RuntimeError.
+        """
+        error = None
+        for attempt in range(2):
+            shards = self._live_shards()
+            try:
+                futures = [shard.request(command, payload) for shard, payload in zip(shards, payloads)]
+                return [future.result() for future in futures]
+            except Exception as e:
+                # A partly sent request may have corrupted a pipe: never reuse this set
+                self._discard(shards)
+                error = e
+        raise RuntimeError(f'Content shards failed on {command!r}: {error!r}') from error
+
+    def _local(self, positions):
+        """Split global positions into per-shard local positions"""
+        positions = np.asarray(positions, dtype=np.int64)
+        shard_ids = np.searchsorted(self.boundaries, positions, side='right') - 1
+        return [positions[shard_ids == s] - self.boundaries[s] for s in range(len(self.boundaries) - 1)]
+
+    def _profiles(self, position_lists):
+        """Averaged seed profiles, one CSR row per seed set (rows fetched from their shards)"""
+        per_shard = [self._local(positions) for positions in position_lists]
+        replies = self._scatter('profiles', [
+            [local[s] for local in per_shard] for s in range(len(self.boundaries) - 1)
+        ])
+        empty = sp.csr_matrix((1, self.n_features))
+        rows = []
+        for row, positions in enumerate(position_lists):
+            partials = [reply[row] for reply in replies if reply[row] is not None]
+            rows.append(sum(partials, empty) / max(len(positions), 1))
+        return sp.vstack(rows, format='csr').astype(self.score_dtype)
+
+    def _gather(self, profiles, k, mask, position_lists):
+        """Scatter a batch of profiles; merge each query's shard top-k lists"""
+        bounds = list(zip(self.boundaries[:-1], self.boundaries[1:]))
+        excluded = [self._local(positions) for positions in position_lists]
+        replies = self._scatter('score', [
+            (profiles, k, None if mask is None else mask[start:end], [local[s] for local in excluded])
+            for s, (start, end) in enumerate(bounds)
+        ])
+        results = []
+        for row in range(len(position_lists)):
+            # Each shard list is sorted by (-score, position): merge keeps that order
+            merged = heapq.merge(
+                *(zip(reply[row][1].tolist(), reply[row][0].tolist()) for reply in replies),
+                key=lambda item: (-item[0], item[1])
+            )
+            best = list(itertools.islice(merged, k))
+            results.append((
+                np.array([pos for _, pos in best], dtype=np.int64),
+                np.array([score for score, _ in best])
+            ))
+        return results
+
+    def similarity_scores(self, positions):
+        """Scores for every title (gathers the full vector; prefer score_positions)"""
+        n = len(self.df)
+        positions_, scores = self._gather(self._profiles([positions]), n, None, [[]])[0]
+        result = np.zeros(n)
+        result[positions_] = scores
+        return result
+
+    def score_positions(self, positions, k=100, mask=None):
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return self._gather(self._profiles([positions]), k, mask, [positions])[0]
+
+    def score_positions_batch(self, position_lists, k=100, mask=None, chunk_cells=2 ** 24):
+        results = [(np.empty(0, dtype=np.int64), np.empty(0))] * len(position_lists)
+        rows = [i for i, positions in enumerate(position_lists) if positions]
+        chunk = max(1, chunk_cells // max(len(self.df), 1))
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            seed_lists = [position_lists[i] for i in block]
+            for i, result in zip(block, self._gather(self._profiles(seed_lists), k, mask, seed_lists)):
+                results[i] = result
+        return results
+
+    def matrix_stats(self):
+        stats = self._scatter('stats', [None] * (len(self.boundaries) - 1))
+        return {
+            'features': self.n_features,
+            'nnz': sum(nnz for nnz, _ in stats),
+            'bytes': sum(nbytes for _, nbytes in stats)
+        }
+
+    def close(self):
+        """Stop the shard processes and remove the stored blocks"""
+        with self._lock:
+            shards, self._shards = self._shards, []
+            self.healthy = False
+            self._closed = True
+            block_dir, self._block_dir = self._block_dir, None
+        for shard in shards:
+            shard.stop()
+        if block_dir is not None:
+            shutil.rmtree(block_dir, ignore_errors=True)
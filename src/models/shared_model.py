@@ -0,0 +1,319 @@
+import bisect
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.models.filters import CatalogueFilter
+from src.models.quantization import QuantizedMatrix
+from src.models.title_index import TitleSearchIndex
+
+MANIFEST_FILE = 'manifest.json'
+EXPORT_LOCK = 'export.lock'
+BUNDLE_FORMAT = 1
+
+# Catalogue columns materialised as a DataFrame in every worker (short values);
+# every other text column stays in the shared bundle and is decoded on demand
+SERVING_COLUMNS = ('show_id', 'type', 'title', 'listed_in', 'rating', 'release_year', 'duration')
+
+# Numeric arrays of TitleSearchIndex that are shared as-is
+_TITLE_INDEX_ARRAYS = ('sorted_ids', 'postings', 'offsets', 'title_grams', 'title_offsets', 'gram_counts')
+
+
+class StringColumn:
+    """
+    Read-only sequence of strings stored as one UTF-8 byte buffer plus
+    int64 offsets, so it can live in a memory-mapped file shared by every
+    worker. Strings are decoded on access; missing values (None/NaN) are
+    kept in an optional boolean `nulls` array and read back as None.
+    """
+
+    def __init__(self, blob, offsets, nulls=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def from_strings(cls, strings):
+        strings = list(strings)
+        nulls = np.array([s is None or (isinstance(s, float) and s != s) for s in strings], dtype=bool)
+        encoded = [b'' if null else str(s).encode('utf-8') for s, null in zip(strings, nulls)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, nulls if nulls.any() else None)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def take(self, positions):
+        return [self[int(i)] for i in positions]
+
+    @property
+    def nbytes(self):
+        return self.blob.nbytes + self.offsets.nbytes + (self.nulls.nbytes if self.nulls is not None else 0)
+
+
+class SortedStringMap:
+    """Read-only str -> int mapping over sorted StringColumn keys (binary search)"""
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+    def get(self, key, default=None):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.values[i])
+        return default
+
+
+def export_shared_model(content_model, catalogue_filter, path, source=None):
+    """
+    Write the immutable model arrays of a fitted ContentBasedRecommender
+    (TF-IDF CSR arrays, title index, columnar catalogue) and the filter
+    masks to a bundle directory of .npy files that workers memory-map.
+
+    The bundle is written to a temporary directory and renamed into place,
+    so attaching workers never see a partial bundle. Bundles are immutable:
+    if another process already published one at `path`, that one is kept.
+
+    Args:
+        content_model: Fitted ContentBasedRecommender
+        catalogue_filter: Fitted CatalogueFilter for the same catalogue
+        path (str): Bundle directory
+        source (dict, optional): Provenance stored in the manifest (e.g. file mtimes)
+    """
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    def save(name, array):
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(array))
+
+    def save_strings(name, strings):
+        column = StringColumn.from_strings(strings)
+        save(f'{name}.blob', column.blob)
+        save(f'{name}.offsets', column.offsets)
+        if column.nulls is not None:
+            save(f'{name}.nulls', column.nulls)
+
+    tfidf_matrix = content_model.tfidf_matrix
+    save('tfidf.data', tfidf_matrix.data)
+    save('tfidf.indices', tfidf_matrix.indices)
+    save('tfidf.indptr', tfidf_matrix.indptr)
+    if isinstance(tfidf_matrix, QuantizedMatrix):
+        save('tfidf.scales', tfidf_matrix.scales)
+
+    df = content_model.df
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype.kind in 'biuf':
+            save(f'col.{column}', values.values)
+            columns[column] = 'numeric'
+        elif values.nunique() <= len(values) // 2:
+            # Low-cardinality text (type, rating, genres...): codes + distinct values
+            codes, categories = pd.factorize(values)
+            save(f'col.{column}.codes', codes.astype(np.int32))
+            save_strings(f'col.{column}.categories', categories.tolist())
+            columns[column] = 'category'
+        else:
+            save_strings(f'col.{column}', values.tolist())
+            columns[column] = 'string'
+
+    title_index = content_model.title_index
+    for name in _TITLE_INDEX_ARRAYS:
+        save(f'title_index.{name}', getattr(title_index, name))
+    save_strings('title_index.sorted_keys', title_index.sorted_keys)
+    grams = sorted(title_index.trigram_codes, key=title_index.trigram_codes.get)
+    save_strings('title_index.grams', grams)
+    exact_keys = sorted(title_index.exact)
+    save_strings('title_index.exact_keys', exact_keys)
+    save('title_index.exact_ids', np.array([title_index.exact[k] for k in exact_keys], dtype=np.int64))
+
+    mask_keys = []
+    masks = []
+    for attribute, value_masks in (('type', catalogue_filter.type_masks),
+                                   ('rating', catalogue_filter.rating_masks),
+                                   ('genre', catalogue_filter.genre_masks)):
+        for value, mask in value_masks.items():
+            mask_keys.append([attribute, value])
+            masks.append(mask)
+    save('filter.masks', np.array(masks, dtype=bool).reshape(len(masks), len(df)))
+    save('filter.release_years', catalogue_filter.release_years)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'created': time.time(),
+        'n_titles': len(df),
+        'tfidf_shape': list(tfidf_matrix.shape),
+        'tfidf_precision': content_model.precision,
+        'columns': columns,
+        'filter_masks': mask_keys,
+        'source': source or {}
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Lost the race to another worker exporting the same bundle
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if read_manifest(path) is None:
+            raise
+    return path
+
+
+def read_manifest(path):
+    """The bundle's manifest, or None when there is no complete bundle at path"""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+class SharedModelHandle:
+    """
+    Attaches to a bundle written by export_shared_model.
+
+    Every array is memory-mapped read-only, so all worker processes on a
+    host share one copy of the pages through the OS page cache instead of
+    each holding its own. All files are mapped when attaching, so deleting
+    the bundle later does not affect an attached handle.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = read_manifest(path)
+        if self.manifest is None:
+            raise FileNotFoundError(f'No shared model bundle at {path}')
+        if self.manifest['format'] != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format {self.manifest['format']}")
+        self._arrays = {
+            name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+
+    def array(self, name):
+        return self._arrays[name]
+
+    def strings(self, name):
+        nulls = self._arrays.get(f'{name}.nulls')
+        return StringColumn(self.array(f'{name}.blob'), self.array(f'{name}.offsets'), nulls)
+
+    def column(self, name):
+        """
+        A catalogue column: ndarray for numeric columns, StringColumn for
+        text, and an object array for low-cardinality text (rows with the same
+        value share one string object)
+        """
+        kind = self.manifest['columns'][name]
+        if kind == 'numeric':
+            return self.array(f'col.{name}')
+        if kind == 'category':
+            categories = np.array(list(self.strings(f'col.{name}.categories')) + [None], dtype=object)
+            # Code -1 (missing) picks the trailing None
+            return categories[self.array(f'col.{name}.codes')]
+        return self.strings(f'col.{name}')
+
+    @property
+    def tfidf_precision(self):
+        return self.manifest.get('tfidf_precision', 'float64')
+
+    def tfidf_matrix(self):
+        """
+        CSR matrix (QuantizedMatrix for int8 bundles) whose
+        data/indices/indptr are the mapped arrays (no copy)
+        """
+        matrix = sp.csr_matrix(
+            (self.array('tfidf.data'), self.array('tfidf.indices'), self.array('tfidf.indptr')),
+            shape=tuple(self.manifest['tfidf_shape']), copy=False
+        )
+        if 'tfidf.scales' in self._arrays:
+            return QuantizedMatrix(matrix, self.array('tfidf.scales'))
+        return matrix
+
+    def catalogue(self, columns=SERVING_COLUMNS):
+        """DataFrame of the given (short) catalogue columns"""
+        data = {}
+        for name in columns:
+            if name not in self.manifest['columns']:
+                continue
+            column = self.column(name)
+            data[name] = pd.Series(
+                column if isinstance(column, np.ndarray) else np.array(list(column), dtype=object),
+                dtype=None if self.manifest['columns'][name] == 'numeric' else object
+            )
+        return pd.DataFrame(data)
+
+    def text_columns(self, exclude=SERVING_COLUMNS):
+        """Shared StringColumns for the catalogue columns not in the DataFrame"""
+        return {
+            name: self.column(name) for name, kind in self.manifest['columns'].items()
+            if kind != 'numeric' and name not in exclude
+        }
+
+    def title_index(self):
+        """TitleSearchIndex backed by the mapped arrays"""
+        index = TitleSearchIndex()
+        index.titles = self.column('title')
+        for name in _TITLE_INDEX_ARRAYS:
+            setattr(index, name, self.array(f'title_index.{name}'))
+        index.sorted_keys = self.strings('title_index.sorted_keys')
+        index.trigram_codes = {gram: code for code, gram in enumerate(self.strings('title_index.grams'))}
+        index.exact = SortedStringMap(self.strings('title_index.exact_keys'), self.array('title_index.exact_ids'))
+        return index
+
+    def catalogue_filter(self):
+        """CatalogueFilter whose masks are rows of the mapped mask matrix"""
+        catalogue_filter = CatalogueFilter()
+        catalogue_filter.size = self.manifest['n_titles']
+        masks = self.array('filter.masks')
+        by_attribute = {'type': catalogue_filter.type_masks,
+                        'rating': catalogue_filter.rating_masks,
+                        'genre': catalogue_filter.genre_masks}
+        for row, (attribute, value) in enumerate(self.manifest['filter_masks']):
+            by_attribute[attribute][value] = masks[row]
+        catalogue_filter.release_years = self.array('filter.release_years')
+        return catalogue_filter
+
+    @property
+    def nbytes(self):
+        """Size of the mapped arrays"""
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+def remove_stale_bundles(directory, keep):
+    """
+    Delete bundles in `directory` with the same TF-IDF precision as `keep`
+    that were created before it (attached handles are unaffected). Bundles
+    of other precisions may still serve workers configured differently.
+    """
+    manifest = read_manifest(keep)
+    if manifest is None:
+        return
+    precision = manifest.get('tfidf_precision', 'float64')
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path) or os.path.abspath(path) == os.path.abspath(keep) or '.tmp-' in name:
+            continue
+        other = read_manifest(path)
+        if (other is not None and other.get('tfidf_precision', 'float64') == precision
+                and other['created'] < manifest['created']):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,216 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_title(title):
+    """
+    Normalize a title for matching: strip accents, lowercase and collapse
+    punctuation and whitespace to single spaces.
+    """
+    if not isinstance(title, str):
+        return ''
+    title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM.sub(' ', title.lower()).strip()
+
+
+def title_trigrams(normalized):
+    """Set of character trigrams of a normalized title, padded at word edges"""
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleSearchIndex:
+    """
+    Title lookup index for exact, prefix (autocomplete) and fuzzy matching.
+
+    Prefix search uses binary search over the sorted normalized titles.
+    Fuzzy search uses a character-trigram inverted index: candidates come from
+    the posting lists of the rarest query trigrams, then each candidate's full
+    trigram list (a forward index) is compared with the query, so a lookup
+    touches a few thousand entries rather than the whole catalogue.
+    """
+
+    def __init__(self, candidate_budget=1000, scan_factor=8):
+        self.candidate_budget = candidate_budget
+        self.scan_factor = scan_factor
+        self.titles = None
+        self.exact = None
+        self.sorted_keys = None
+        self.sorted_ids = None
+        self.trigram_codes = None
+        self.postings = None
+        self.offsets = None
+        self.title_grams = None
+        self.title_offsets = None
+        self.gram_counts = None
+
+    def fit(self, titles):
+        """
+        Build the index from a sequence of titles (position = row id).
+        """
+        self.titles = [t if isinstance(t, str) else '' for t in titles]
+        normalized = [normalize_title(t) for t in self.titles]
+
+        # Exact lookups: lower-cased first, then normalized; first row wins
+        self.exact = {}
+        for i, (title, norm) in enumerate(zip(self.titles, normalized)):
+            self.exact.setdefault(title.lower(), i)
+            self.exact.setdefault(norm, i)
+
+        order = sorted(range(len(normalized)), key=normalized.__getitem__)
+        self.sorted_keys = [normalized[i] for i in order]
+        self.sorted_ids = np.asarray(order, dtype=np.int64)
+
+        # Forward index: trigram codes of row i are
+        # title_grams[title_offsets[i]:title_offsets[i + 1]].
+        # Inverted index, CSR-style: row ids for code c are
+        # postings[offsets[c]:offsets[c + 1]], sorted ascending
+        self.trigram_codes = {}
+        codes = []
+        ids = []
+        gram_counts = np.zeros(len(normalized), dtype=np.int32)
+        for i, norm in enumerate(normalized):
+            grams = title_trigrams(norm)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                codes.append(self.trigram_codes.setdefault(gram, len(self.trigram_codes)))
+            ids.extend([i] * len(grams))
+        codes = np.asarray(codes, dtype=np.int32)
+        ids = np.asarray(ids, dtype=np.int32)
+        order = np.argsort(codes, kind='stable')
+        self.postings = ids[order]
+        self.offsets = np.zeros(len(self.trigram_codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(self.trigram_codes)), out=self.offsets[1:])
+        self.title_grams = codes
+        self.title_offsets = np.zeros(len(normalized) + 1, dtype=np.int64)
+        np.cumsum(gram_counts, out=self.title_offsets[1:])
+        self.gram_counts = gram_counts
+        return self
+
+    def __len__(self):
+        return len(self.titles) if self.titles is not None else 0
+
+    def _posting(self, code):
+        return self.postings[self.offsets[code]:self.offsets[code + 1]]
+
+    def lookup(self, title):
+        """Row id of an exact (case- and punctuation-insensitive) match, or None"""
+        if not isinstance(title, str):
+            return None
+        idx = self.exact.get(title.lower())
+        if idx is None:
+            idx = self.exact.get(normalize_title(title))
+        return idx
+
+    def autocomplete(self, prefix, limit=10):
+        """
+        Titles starting with the given prefix, in alphabetical order.
+
+        Returns:
+            list: Row ids of up to `limit` matching titles
+        """
+        key = normalize_title(prefix)
+        if not key:
+            return []
+        start = bisect.bisect_left(self.sorted_keys, key)
+        matches = []
+        for pos in range(start, min(start + limit, len(self.sorted_keys))):
+            if not self.sorted_keys[pos].startswith(key):
+                break
+            matches.append(int(self.sorted_ids[pos]))
+        return matches
+
+    def fuzzy(self, query, limit=10, min_score=0.3):
+        """
+        Titles most similar to the query by trigram Dice coefficient.
+
+        Returns:
+            list: (row id, score) pairs sorted by descending score
+        """
+        if limit <= 0:
+            return []
+        query_grams = title_trigrams(normalize_title(query))
+        posting_codes = [
+            self.trigram_codes[g] for g in query_grams if g in self.trigram_codes
+        ]
+        if not posting_codes:
+            return []
+        posting_codes.sort(key=lambda c: self.offsets[c + 1] - self.offsets[c])
+
+        # Candidates come from the rarest trigrams' postings (at most
+        # scan_factor * candidate_budget entries); if there are too many, keep
+        # those sharing the most of these rare trigrams with the query
+        scan_budget = self.candidate_budget * self.scan_factor
+        rare = []
+        for code in posting_codes:
+            size = self.offsets[code + 1] - self.offsets[code]
+            if rare and size > scan_budget:
+                break
+            rare.append(code)
+            scan_budget -= size
+        scanned = np.concatenate([self._posting(c) for c in rare])
+        scanned = scanned[:self.candidate_budget * self.scan_factor]
+        candidates, rare_hits = np.unique(scanned, return_counts=True)
+        if len(candidates) > self.candidate_budget:
+            best = np.argpartition(-rare_hits, self.candidate_budget - 1)[:self.candidate_budget]
+            candidates = np.sort(candidates[best])
+
+        # Count each candidate's trigrams that also occur in the query
+        counts = self.gram_counts[candidates]
+        starts = np.repeat(self.title_offsets[candidates] - np.cumsum(counts) + counts, counts)
+        grams = self.title_grams[starts + np.arange(len(starts))]
+        hits = np.isin(grams, np.asarray(posting_codes, dtype=grams.dtype))
+        shared = np.add.reduceat(hits, np.cumsum(counts) - counts)
+
+        scores = 2.0 * shared / (len(query_grams) + self.gram_counts[candidates])
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+    def resolve(self, title, min_score=0.5):
+        """
+        Resolve a possibly misspelled title to a row id.
+
+        Exact matches win; otherwise the best fuzzy match scoring at least
+        `min_score` is returned, or None.
+        """
+        idx = self.lookup(title)
+        if idx is not None:
+            return idx
+        matches = self.fuzzy(title, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
+
+    def search(self, query, limit=10, min_score=0.3):
+        """
+        Combined search for autocomplete boxes: exact match first, then prefix
+        matches, then fuzzy matches.
+
+        Returns:
+            list: Dicts with 'id' (row id), 'title', 'score' and 'match'
+        """
+        results = []
+        seen = set()
+
+        def add(idx, score, match):
+            if idx not in seen and len(results) < limit:
+                seen.add(idx)
+                results.append({'id': idx, 'title': self.titles[idx], 'score': score, 'match': match})
+
+        exact = self.lookup(query)
+        if exact is not None:
+            add(exact, 1.0, 'exact')
+        for idx in self.autocomplete(query, limit=limit):
+            add(idx, 1.0, 'prefix')
+        if len(results) < limit:
+            for idx, score in self.fuzzy(query, limit=limit, min_score=min_score):
+                add(idx, score, 'fuzzy')
+        return results
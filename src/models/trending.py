@@ -0,0 +1,129 @@
+import math
+import threading
+import time
+
+import numpy as np
+from src.utils.core import split_genres
+
+ALL = 'all'
+
+class TrendingIndex:
+    """
+    Exponentially time-decayed popularity counters with cached top-N lists.
+
+    Uses forward decay: an event at time t adds weight * exp(rate * (t - t0))
+    to the item's stored score, where t0 is a fixed landmark. Decay then never
+    has to be applied to stored scores, so each event is O(1) and the ranking
+    of items only changes when they receive events. That lets the top-N list
+    for every (type, genre) key be maintained incrementally: each key also
+    keeps its weakest cached entry, so an event for an item outside a full
+    list is one comparison, and the O(top_n) rescan only happens when the
+    list's membership changes. Type and genre keys are lower-cased, as in
+    CatalogueFilter.
+    """
+
+    def __init__(self, df, half_life_hours=72, top_n=100):
+        self.rate = math.log(2) / (half_life_hours * 3600.0)
+        self.top_n = top_n
+        self.types = df['type'].fillna('Unknown').str.lower().values
+        self.listed_in = df['listed_in'].values
+        self.scores = np.zeros(len(df))
+        self.landmark = time.time()
+        self.event_count = 0
+        # (type, genre) -> {position: stored score}; ALL is a wildcard
+        self.top_cache = {}
+        # key -> (weakest position, its stored score) of a full cache
+        self._floor = {}
+        self._sorted = {}
+        self._lock = threading.Lock()
+
+    def _keys(self, pos):
+        """Every (type, genre) key an item belongs to"""
+        item_type = self.types[pos]
+        keys = [(ALL, ALL), (item_type, ALL)]
+        for genre in split_genres(self.listed_in[pos]):
+            genre = genre.lower()
+            keys.append((ALL, genre))
+            keys.append((item_type, genre))
+        return keys
+
+    def _rescale(self, new_landmark):
+        """Move the landmark forward so stored scores do not overflow"""
+        factor = math.exp(-self.rate * (new_landmark - self.landmark))
+        self.scores *= factor
+        for cache in self.top_cache.values():
+            for pos in cache:
+                cache[pos] *= factor
+        self._floor.clear()
+        self._sorted.clear()
+        self.landmark = new_landmark
+
+    def record(self, pos, weight=1.0, timestamp=None):
+        """
+        Record an interaction with the item at catalogue position `pos`.
+        Future timestamps are treated as now.
+        """
+        now = time.time()
+        timestamp = now if timestamp is None else min(timestamp, now)
+        with self._lock:
+            exponent = self.rate * (timestamp - self.landmark)
+            if exponent > 50:
+                self._rescale(timestamp)
+                exponent = 0.0
+            self.scores[pos] += weight * math.exp(exponent)
+            score = self.scores[pos]
+            self.event_count += 1
+
+            for key in self._keys(pos):
+                cache = self.top_cache.setdefault(key, {})
+                if pos in cache:
+                    cache[pos] = score
+                    floor = self._floor.get(key)
+                    if floor is not None and floor[0] == pos:
+                        del self._floor[key]
+                elif len(cache) < self.top_n:
+                    cache[pos] = score
+                else:
+                    floor = self._floor.get(key)
+                    if floor is None:
+                        weakest = min(cache, key=cache.get)
+                        floor = self._floor[key] = (weakest, cache[weakest])
+                    if floor[1] >= score:
+                        continue
+                    del cache[floor[0]]
+                    del self._floor[key]
+                    cache[pos] = score
+                self._sorted.pop(key, None)
+
+    def top(self, n=10, item_type=None, genre=None, exclude=None, mask=None):
+        """
+        Current top-n trending items for a (type, genre) key, optionally
+        restricted to positions where the boolean `mask` is True.
+
+        Returns:
+            list: (position, decayed score) pairs, best first
+        """
+        key = ((item_type or ALL).lower(), (genre or ALL).lower())
+        ranked = self._sorted.get(key)
+        if ranked is None:
+            with self._lock:
+                cache = self.top_cache.get(key, {})
+                ranked = sorted(cache.items(), key=lambda item: (-item[1], item[0]))
+                self._sorted[key] = ranked
+        decay = math.exp(-self.rate * (time.time() - self.landmark))
+        results = []
+        for pos, score in ranked:
+            if exclude and pos in exclude:
+                continue
+            if mask is not None and not mask[pos]:
+                continue
+            results.append((pos, score * decay))
+            if len(results) == n:
+                break
+        return results
+
+    def current_scores(self, positions=None):
+        """Decayed scores right now for all items (or the given positions)"""
+        decay = math.exp(-self.rate * (time.time() - self.landmark))
+        scores = self.scores if positions is None else self.scores[positions]
+        return scores * decay
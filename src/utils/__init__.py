@@ -1,11 +1,18 @@
 # Import key functions for easier access
-from .helpers import (
+from .core import (
     clean_text,
     extract_year_from_date,
     split_genres,
     extract_duration_info,
-    plot_distribution,
-    generate_wordcloud,
     get_top_genres,
     create_user_profile
 )
+
+
+def __getattr__(name):
+    # Plotting helpers (plot_distribution, generate_wordcloud) load
+    # matplotlib/seaborn/wordcloud, so only import them on first use
+    if name in ('plot_distribution', 'generate_wordcloud'):
+        from . import plotting
+        return getattr(plotting, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,71 @@
+"""
+Plotting helpers for notebooks and exploration.
+
+Kept separate from the core helpers so that serving code never imports
+matplotlib, seaborn or wordcloud.
+"""
+import matplotlib.pyplot as plt
+import seaborn as sns
+from wordcloud import WordCloud
+
+def plot_distribution(df, column, title=None, figsize=(10, 6)):
+    """
+    Plot distribution of values in a column.
+    
+    Args:
+        df (DataFrame): Pandas DataFrame
+        column (str): Column name
+        title (str, optional): Plot title
+        figsize (tuple, optional): Figure size
+        
+    Returns:
+        matplotlib.figure.Figure: Plot figure
+    """
+    plt.figure(figsize=figsize)
+    
+    if df[column].dtype == 'object':
+        # For categorical data
+        value_counts = df[column].value_counts().sort_values(ascending=False)
+        sns.barplot(x=value_counts.index[:15], y=value_counts.values[:15])
+        plt.xticks(rotation=45, ha='right')
+    else:
+        # For numerical data
+        sns.histplot(df[column].dropna())
+    
+    if title:
+        plt.title(title)
+    else:
+        plt.title(f'Distribution of {column}')
+    
+    plt.tight_layout()
+    return plt.gcf()
+
+def generate_wordcloud(text_series, stopwords=None, figsize=(12, 8)):
+    """
+    Generate word cloud from a series of text.
+    
+    Args:
+        text_series (Series): Pandas Series of text
+        stopwords (set, optional): Set of stopwords to exclude
+        figsize (tuple, optional): Figure size
+        
+    Returns:
+        matplotlib.figure.Figure: Word cloud figure
+    """
+    text = ' '.join(text_series.dropna().astype(str))
+    
+    wordcloud = WordCloud(
+        width=800, 
+        height=400,
+        background_color='white',
+        max_words=200,
+        stopwords=stopwords,
+        contour_width=3,
+        contour_color='steelblue'
+    ).generate(text)
+    
+    plt.figure(figsize=figsize)
+    plt.imshow(wordcloud, interpolation='bilinear')
+    plt.axis('off')
+    plt.tight_layout()
+    return plt.gcf()
@@ -0,0 +1,243 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from src.app.user_manager import UserManager
+from src.data.event_log import EventLog, EventLogCompactor, load_ratings_snapshot
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    return str(tmp_path / 'events'), str(tmp_path / 'users')
+
+
+def rating(user_id, title, value=4):
+    return {'type': 'rating', 'user_id': user_id, 'title': title, 'rating': value}
+
+
+def test_append_assigns_increasing_seq_and_resumes_after_restart(dirs):
+    log_dir, _ = dirs
+    log = EventLog(log_dir)
+    first = log.append(rating('alice', 'Dark'))
+    second = log.append(rating('alice', 'Ozark'))
+    assert (first['writer'], first['seq']) == (0, 1)
+    assert second['seq'] == 2
+    log.close()
+
+    reopened = EventLog(log_dir)
+    assert reopened.writer == 0
+    assert reopened.append(rating('bob', 'Dark'))['seq'] == 3
+    reopened.close()
+
+
+def test_concurrent_logs_use_separate_writers(dirs):
+    log_dir, _ = dirs
+    a, b = EventLog(log_dir), EventLog(log_dir)
+    assert a.writer != b.writer
+    a.append(rating('alice', 'Dark'))
+    b.append(rating('bob', 'Dark'))
+    a.flush()
+    b.flush()
+    names = [name for name in os.listdir(log_dir) if name.startswith('segment-')]
+    assert len(names) == 2
+    a.close()
+    b.close()
+
+
+def test_compaction_in_one_process_never_drops_another_writers_events(dirs):
+    log_dir, users_dir = dirs
+    log_a, log_b = EventLog(log_dir), EventLog(log_dir)
+    users_a = UserManager(users_dir, event_log=log_a)
+    users_b = UserManager(users_dir, event_log=log_b)
+    compactor_b = EventLogCompactor(log_b, users_b)
+
+    users_a.add_rating('alice', 'Dark', 5)
+    users_b.add_rating('bob', 'Dark', 3)
+    compactor_b.run_once()
+    # A's active segment was still open: B must not have removed it
+    users_a.add_rating('carol', 'Ozark', 4)
+
+    compactor_a = EventLogCompactor(log_a, users_a)
+    compactor_a.run_once()
+    compactor_b.run_once()
+    log_a.close()
+    log_b.close()
+
+    # After a restart only the stored profiles remain
+    fresh = UserManager(users_dir)
+    assert fresh.get_profile('alice')['ratings'] == {'Dark': 5}
+    assert fresh.get_profile('bob')['ratings'] == {'Dark': 3}
+    assert fresh.get_profile('carol')['ratings'] == {'Ozark': 4}
+    snapshot = load_ratings_snapshot(compactor_a.snapshot_path)
+    assert sorted(snapshot['user_id']) == ['alice', 'bob', 'carol']
+
+
+def test_segments_of_a_closed_writer_are_compacted_by_others(dirs):
+    log_dir, users_dir = dirs
+    gone = EventLog(log_dir)
+    UserManager(users_dir, event_log=gone).add_rating('alice', 'Dark', 2)
+    gone.flush()
+    # Crashed worker: never sealed, slot released
+    gone._writer_lock.close()
+    gone._writer_lock = None
+
+    survivor = EventLog(log_dir)
+    assert survivor.writer == 0  # takes over the free slot
+    other = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=other)
+    assert EventLogCompactor(other, users).run_once() == 1
+    assert UserManager(users_dir).get_profile('alice')['ratings'] == {'Dark': 2}
+
+
+def _worker_appends(log_dir, users_dir, worker, n):
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    compactor = EventLogCompactor(log, users)
+    for i in range(n):
+        users.add_rating(f'user-{worker}-{i % 5}', f'title-{i}', 1 + i % 5)
+        if i % 20 == 0:
+            compactor.run_once()
+    compactor.run_once()
+    log.close()
+
+
+def test_worker_processes_sharing_a_directory_lose_no_events(dirs):
+    log_dir, users_dir = dirs
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_appends, args=(log_dir, users_dir, w, 100)) for w in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    EventLogCompactor(log, users).run_once()
+    log.close()
+    snapshot = load_ratings_snapshot(os.path.join(log_dir, 'ratings_snapshot.npz'))
+    assert len(snapshot) == 300
+    stored = UserManager(users_dir)
+    assert sum(len(stored.get_profile(f'user-{w}-{u}')['ratings']) for w in range(3) for u in range(5)) == 300
+
+
+def test_reclaimed_writer_does_not_reuse_compacted_seqs(dirs):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    users.add_rating('alice', 'Dark', 5)
+    users.add_rating('alice', 'Ozark', 4)
+    EventLogCompactor(log, users).run_once()
+    log.close()
+
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    event = users.record_events([rating('alice', 'Lupin', 3)])[0]
+    assert event['seq'] == 3
+    EventLogCompactor(log, users).run_once()
+    assert UserManager(users_dir).get_profile('alice')['ratings'] == {'Dark': 5, 'Ozark': 4, 'Lupin': 3}
+    log.close()
+
+
+def test_replaying_a_compaction_after_a_crash_is_idempotent(dirs, monkeypatch):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    users.add_to_watch_history('alice', 'Dark')
+    users.add_rating('alice', 'Ozark', 4)
+    compactor = EventLogCompactor(log, users)
+
+    # Crash after the profiles were written, before progress was recorded
+    def crash(state):
+        raise RuntimeError('crash')
+    monkeypatch.setattr(log, 'write_state', crash)
+    with pytest.raises(RuntimeError):
+        compactor.run_once()
+    monkeypatch.undo()
+
+    assert compactor.run_once() == 2
+    profile = UserManager(users_dir).get_profile('alice')
+    assert [entry['title'] for entry in profile['watch_history']] == ['Dark', 'Ozark']
+    assert profile['ratings'] == {'Ozark': 4}
+    assert len(load_ratings_snapshot(compactor.snapshot_path)) == 1
+    assert [name for name in os.listdir(log_dir) if name.startswith('segment-')] == []
+    log.close()
+
+
+def test_idle_writer_is_synced_by_timer(dirs):
+    log_dir, _ = dirs
+    log = EventLog(log_dir, fsync_every=1000, fsync_interval=0.05)
+    log.append(rating('alice', 'Dark'))
+    (name,) = [name for name in os.listdir(log_dir) if name.startswith('segment-')]
+    deadline = time.monotonic() + 2
+    while os.path.getsize(os.path.join(log_dir, name)) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert os.path.getsize(os.path.join(log_dir, name)) > 0
+    log.close()
+
+
+def test_pending_events_are_visible_before_compaction(dirs):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    users.add_rating('alice', 'Dark', 5)
+    assert users.get_profile('alice')['ratings'] == {'Dark': 5}
+    EventLogCompactor(log, users).run_once()
+    assert users._pending == {}
+    assert users.get_profile('alice')['ratings'] == {'Dark': 5}
+    log.close()
+
+
+def test_malformed_events_are_quarantined_without_blocking_compaction(dirs):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    log.append(rating('alice', 'Dark', 'abc'))
+    users.add_rating('bob', 'Dark', 4)
+    compactor = EventLogCompactor(log, users)
+
+    assert compactor.run_once() == 1
+    assert [name for name in os.listdir(log_dir) if name.startswith('segment-')] == []
+    assert UserManager(users_dir).get_profile('bob')['ratings'] == {'Dark': 4}
+    assert list(load_ratings_snapshot(compactor.snapshot_path)['user_id']) == ['bob']
+    with open(os.path.join(log_dir, 'quarantine.log')) as f:
+        assert [json.loads(line)['rating'] for line in f] == ['abc']
+
+    users.add_rating('carol', 'Ozark', 5)
+    assert compactor.run_once() == 1
+    log.close()
+
+
+def test_replay_includes_events_not_compacted_yet(dirs):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    users.add_rating('alice', 'Dark', 5)
+    EventLogCompactor(log, users).run_once()
+    users.add_to_watch_history('alice', 'Ozark')
+    users.add_rating('bob', 'Lupin', 3)
+
+    replayed = sorted((e['user_id'], e['type'], e['title']) for e in users.iter_events())
+    assert replayed == [
+        ('alice', 'rating', 'Dark'), ('alice', 'watch', 'Dark'),
+        ('alice', 'watch', 'Ozark'), ('bob', 'rating', 'Lupin')
+    ]
+    log.close()
+
+
+def test_backfilled_events_read_the_same_before_and_after_compaction(dirs):
+    log_dir, users_dir = dirs
+    log = EventLog(log_dir)
+    users = UserManager(users_dir, event_log=log)
+    now = time.time()
+    users.record_events([dict(rating('alice', 'Dark', 5), timestamp=now)])
+    # Arrives later, happened earlier
+    users.record_events([dict(rating('alice', 'Dark', 2), timestamp=now - 3600)])
+
+    assert users.get_profile('alice')['ratings'] == {'Dark': 5}
+    EventLogCompactor(log, users).run_once()
+    assert users.get_profile('alice')['ratings'] == {'Dark': 5}
+    log.close()
@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_catalogue
+from src.app.recommendation_engine import RecommendationEngine
+from src.models.filters import CatalogueFilter
+
+CATALOGUE = pd.DataFrame({
+    'type': ['Movie', 'TV Show', 'Movie', 'Movie', None],
+    'rating': ['PG', 'TV-MA', 'pg', 'R', 'PG'],
+    'listed_in': ['Dramas, Comedies', 'Dramas', 'Documentaries', 'Comedies, Thrillers', None],
+    'release_year': [2001, 2015, np.nan, 2020, 1999],
+})
+
+
+@pytest.fixture
+def catalogue_filter():
+    return CatalogueFilter().fit(CATALOGUE)
+
+
+def positions(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_no_filters_is_no_mask(catalogue_filter):
+    assert catalogue_filter.mask(None) is None
+    assert catalogue_filter.mask({'type': '', 'genre': []}) is None
+
+
+def test_values_of_one_attribute_are_ored_and_attributes_anded(catalogue_filter):
+    assert positions(catalogue_filter.mask({'type': 'movie'})) == [0, 2, 3]
+    assert positions(catalogue_filter.mask({'genre': 'comedies,documentaries'})) == [0, 2, 3]
+    assert positions(catalogue_filter.mask({'genre': ['Dramas'], 'type': 'Movie'})) == [0]
+    assert positions(catalogue_filter.mask({'rating': 'PG'})) == [0, 2, 4]
+    assert positions(catalogue_filter.mask({'type': 'Unknown'})) == [4]
+    assert positions(catalogue_filter.mask({'genre': 'westerns'})) == []
+
+
+def test_year_bounds_are_inclusive_and_skip_missing_years(catalogue_filter):
+    assert positions(catalogue_filter.mask({'year_min': 2015})) == [1, 3]
+    assert positions(catalogue_filter.mask({'year_max': 2015})) == [0, 1, 4]
+    assert positions(catalogue_filter.mask({'year_min': 2000, 'year_max': 2015, 'rating': 'pg'})) == [0]
+
+
+def test_masks_are_cached_read_only_and_bounded():
+    catalogue_filter = CatalogueFilter(cache_size=2).fit(CATALOGUE)
+    mask = catalogue_filter.mask({'type': 'Movie'})
+    assert catalogue_filter.mask({'type': 'movie '}) is mask
+    assert not mask.flags.writeable
+    catalogue_filter.mask({'year_min': 2000})
+    catalogue_filter.mask({'year_min': 2001})
+    assert len(catalogue_filter._cache) == 2
+
+
+def test_concurrent_requests_share_the_cache_safely():
+    catalogue_filter = CatalogueFilter(cache_size=4).fit(CATALOGUE)
+    errors = []
+
+    def request(offset):
+        try:
+            for year in range(200):
+                catalogue_filter.mask({'year_min': 1990 + (year + offset) % 40})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(catalogue_filter._cache) <= 4
+
+
+def test_filters_are_pushed_down_into_top_k():
+    engine = RecommendationEngine(make_catalogue(300))
+    title = engine.df['title'].iloc[0]
+    genre = engine.catalogue_filter.single_value({'genre': engine.df['listed_in'].iloc[1].split(',')[0]}, 'genre')
+    filters = {'type': 'Movie', 'genre': genre}
+    assert engine.catalogue_filter.mask(filters).sum() >= 10
+    n = 10
+
+    similar = engine.recommend_similar(title, n=n, filters=filters)
+    assert len(similar) == n
+    assert all(r['type'] == 'Movie' and genre in [g.lower() for g in r['genres']] for r in similar)
+
+    for_user = engine.recommend_for_user('nobody', liked_titles=[title], n=n, filters=filters)
+    assert len(for_user) == n
+    assert all(r['type'] == 'Movie' for r in for_user)
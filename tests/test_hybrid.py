@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_catalogue, make_ratings
+from src.app.recommendation_engine import RecommendationEngine
+from src.app.user_manager import UserManager
+from src.models.hybrid_model import HybridRecommender
+
+
+class StubContentModel:
+    def __init__(self, n):
+        self.df = pd.DataFrame({'show_id': [f's{i}' for i in range(n)]})
+
+
+def blend(pools, excluded=(), n=10, weights=None):
+    hybrid = HybridRecommender(StubContentModel(10), weights=weights)
+    positions, scores = hybrid._blend(
+        [(source, np.array(positions), np.array(scores, dtype=float)) for source, positions, scores in pools],
+        set(excluded), n
+    )
+    return positions.tolist(), scores.round(6).tolist()
+
+
+def test_blend_weights_min_max_normalised_pools_over_their_union():
+    pools = [
+        ('content', [4, 2, 7], [0.9, 0.5, 0.1]),
+        ('popularity', [2, 9], [10.0, 0.0]),
+    ]
+    # content: 4 -> 1.0, 2 -> 0.5, 7 -> 0.0; popularity: 2 -> 1.0, 9 -> 0.0
+    assert blend(pools) == ([4, 2, 7, 9], [0.6, 0.4, 0.0, 0.0])
+    assert blend(pools, excluded={4}, n=1) == ([2], [0.4])
+
+
+def test_blend_breaks_ties_toward_the_lower_position():
+    pools = [('content', [8, 3, 5, 1], [1.0, 1.0, 0.0, 0.0])]
+    assert blend(pools)[0] == [3, 8, 1, 5]
+
+
+def test_blend_skips_empty_and_zero_weight_pools():
+    pools = [('content', [], []), ('collaborative', [1, 2], [1.0, 2.0])]
+    assert blend(pools, weights={'collaborative': 0})[0] == []
+    assert blend(pools)[0] == [2, 1]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    df = make_catalogue(200)
+    ratings = make_ratings(df, n_users=30, n_ratings=600)
+    engine = RecommendationEngine(df, user_manager=UserManager(str(tmp_path / 'users')))
+    return engine.fit_collaborative(ratings), ratings
+
+
+def test_live_and_precomputed_paths_exclude_liked_and_rated_titles(engine):
+    engine, ratings = engine
+    user_id = ratings['user_id'].iloc[0]
+    live = engine.recommend_for_user(user_id, n=10)
+    # Rate the top popular pick and like the next one
+    rated, liked = live[0]['title'], live[1]['title']
+    engine.user_manager.add_rating(user_id, rated, 5)
+    engine.user_manager.update_preferences(user_id, [liked])
+
+    live = [r['title'] for r in engine.recommend_for_user(user_id, n=10)]
+    assert rated not in live and liked not in live
+
+    engine.enable_precomputed().refresh_all()
+    precomputed = [r['title'] for r in engine.recommend_for_user(user_id, n=10)]
+    assert engine.precomputed.lookup(user_id) is not None
+    assert precomputed == live
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_catalogue, make_ratings
+from src.app.model_manager import ModelManager
+from src.app.recommendation_engine import RecommendationEngine
+
+
+class FakeEngine:
+    def __init__(self):
+        self.closed = False
+        self.model_version = None
+
+    def close(self):
+        self.closed = True
+
+
+def test_retired_engine_is_not_closed_while_requests_are_in_flight():
+    manager = ModelManager(lambda version: FakeEngine(), validate=lambda engine: None, drain_timeout=0.05)
+    manager.load()
+    lease = manager.acquire()
+    old = lease.engine
+
+    manager.load()
+    time.sleep(0.2)  # well past drain_timeout
+    assert not old.closed
+    assert manager.status()['in_flight'] == {2: 0, 1: 1}
+
+    lease.release()
+    assert manager.wait_drained(timeout=1)
+    deadline = time.time() + 1
+    while not old.closed and time.time() < deadline:
+        time.sleep(0.01)
+    assert old.closed
+
+
+def refit_to(version_log):
+    def refit_engine(engine, version):
+        version_log.append(version)
+        engine.model_version = version
+    return refit_engine
+
+
+def test_refit_moves_the_serving_engine_to_a_new_version():
+    refits = []
+    manager = ModelManager(lambda version: FakeEngine(), validate=lambda engine: None,
+                           refit_engine=refit_to(refits))
+    assert manager.refit() is False  # nothing loaded yet
+    manager.load()
+    engine = manager.engine
+    lease = manager.acquire()
+
+    assert manager.refit() is True
+    assert refits == [2]
+    assert (manager.engine, manager.version) == (engine, 2)
+    assert lease.version == 1  # in-flight requests keep the version they pinned
+    assert manager.status()['in_flight'] == {2: 1}
+    lease.release()
+    assert manager.acquire().version == 2
+    assert manager.load() == 3
+
+
+def test_refit_without_new_ratings_keeps_the_version():
+    manager = ModelManager(lambda version: FakeEngine(), validate=lambda engine: None,
+                           refit_engine=lambda engine, version: None)
+    manager.load()
+    assert manager.refit() is False
+    assert manager.version == 1
+
+
+def test_watcher_refits_when_only_ratings_changed():
+    builds = []
+    refitted = threading.Event()
+    manager = ModelManager(lambda version: builds.append(version) or FakeEngine(),
+                           validate=lambda engine: None, refit_engine=lambda engine, version: refitted.set())
+    manager.load()
+    manager.start(interval=0.01, should_reload=lambda: False, should_refit=lambda: True)
+    assert refitted.wait(2)
+    manager.stop()
+    assert builds == [1]
+
+
+def test_ratings_refit_replaces_every_precomputed_list():
+    df = make_catalogue(100)
+    ratings = make_ratings(df, n_users=20, n_ratings=300)
+    engine = RecommendationEngine(df, model_version=1).fit_collaborative(ratings)
+    precomputed = engine.enable_precomputed()
+    precomputed.refresh_all()
+    assert precomputed.store.count(1) == len(precomputed.known_users())
+
+    user_id = ratings['user_id'].iloc[0]
+    unrated = df.loc[~df['show_id'].isin(ratings.loc[ratings['user_id'] == user_id, 'show_id']), 'show_id']
+    extra = pd.DataFrame({'user_id': [user_id], 'show_id': [unrated.iloc[0]], 'rating': [5.0]})
+    engine.fit_collaborative(pd.concat([ratings, extra], ignore_index=True), model_version=2)
+    assert engine.model_version == 2
+    assert precomputed.store.count(1) == 0
+    assert all(precomputed.is_dirty(user) for user in precomputed.known_users())
+
+    precomputed.refresh()
+    assert precomputed.store.count(2) == len(precomputed.known_users())
+
+
+def test_failed_precompute_is_logged_and_retried(monkeypatch, caplog):
+    df = make_catalogue(100)
+    engine = RecommendationEngine(df).fit_collaborative(make_ratings(df, n_users=5, n_ratings=50))
+    precomputed = engine.enable_precomputed()
+    precomputed.mark_all_dirty()
+    attempts = []
+
+    def score_batch(*args, **kwargs):
+        attempts.append(1)
+        raise RuntimeError('scoring failed')
+
+    monkeypatch.setattr(engine.hybrid_model, 'score_batch', score_batch)
+    with caplog.at_level('ERROR', logger='src.app.precompute'):
+        precomputed.start(interval=0.01)
+        deadline = time.time() + 2
+        while len(attempts) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        precomputed.stop()
+    assert len(attempts) >= 2  # the loop survives a failed refresh
+    assert all(precomputed.is_dirty(user) for user in precomputed.known_users())
+    assert any(record.exc_info and 'scoring failed' in str(record.exc_info[1]) for record in caplog.records)
+
+
+def test_background_refit_failures_are_logged_and_counted(monkeypatch, caplog):
+    from src.app.instrumentation import REGISTRY
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+
+    def refit_engine(engine, version):
+        raise RuntimeError('bad ratings')
+
+    def failures():
+        return REGISTRY.counter_value('model_reloads_total', result='refit_failed')
+
+    manager = ModelManager(lambda version: FakeEngine(), validate=lambda engine: None, refit_engine=refit_engine)
+    manager.load()
+    before = failures()
+    with caplog.at_level('ERROR', logger='src.app.model_manager'):
+        manager.start(interval=0.01, should_reload=lambda: False, should_refit=lambda: True)
+        deadline = time.time() + 2
+        while failures() < before + 2 and time.time() < deadline:
+            time.sleep(0.01)
+        manager.stop()
+    assert failures() >= before + 2  # the watcher keeps running
+    assert manager.version == 1
+    assert any(record.exc_info and 'bad ratings' in str(record.exc_info[1]) for record in caplog.records)
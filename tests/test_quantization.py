@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from benchmarks.synthetic import make_catalogue
+from src.models.content_based import ContentBasedRecommender
+from src.models.filters import CatalogueFilter
+from src.models.quantization import QuantizedMatrix, compact, csr_nbytes, topk_overlap
+from src.models.shared_model import SharedModelHandle, export_shared_model
+
+
+@pytest.fixture(scope='module')
+def catalogue():
+    return make_catalogue(400)
+
+
+@pytest.fixture(scope='module')
+def matrix():
+    rng = np.random.default_rng(0)
+    matrix = sp.random(50, 30, density=0.2, format='csr', random_state=0)
+    matrix.data = rng.uniform(-1, 1, matrix.nnz)
+    matrix.data[matrix.indptr[7]:matrix.indptr[8]] = 0  # an empty row
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def test_codes_use_the_full_int8_range_per_row(matrix):
+    quantized = QuantizedMatrix.from_csr(matrix)
+    assert quantized.data.dtype == np.int8
+    assert quantized.nnz == matrix.nnz
+    for row in range(matrix.shape[0]):
+        codes = quantized.codes[row].data
+        if len(codes):
+            assert np.abs(codes).max() == 127
+    # Rounding error is at most half a step of the row's scale
+    error = np.abs(quantized[np.arange(50)].toarray() - matrix.toarray())
+    assert (error <= quantized.scales[:, None] / 2 + 1e-7).all()
+
+
+def test_products_match_the_dense_matrix_across_chunks(matrix):
+    quantized = QuantizedMatrix.from_csr(matrix)
+    quantized.chunk_rows = 7
+    dequantized = quantized[np.arange(50)].toarray()
+    vector = np.linspace(-1, 1, 30)
+    assert np.allclose(quantized.dot(vector), dequantized @ vector, atol=1e-5)
+    block = np.random.default_rng(1).normal(size=(30, 4))
+    assert quantized.dot(block).shape == (50, 4)
+    assert np.allclose(quantized.dot(block), dequantized @ block, atol=1e-5)
+
+
+def test_compact_precisions_and_sizes(matrix):
+    assert compact(matrix, 'float32').dtype == np.float32
+    assert compact(matrix, 'float64').dtype == np.float64
+    assert isinstance(compact(matrix, 'int8'), QuantizedMatrix)
+    assert csr_nbytes(compact(matrix, 'int8')) < csr_nbytes(compact(matrix, 'float32')) < csr_nbytes(matrix)
+    with pytest.raises(ValueError):
+        compact(matrix, 'float16')
+
+
+def test_int8_top_k_agrees_with_float32(catalogue):
+    float32 = ContentBasedRecommender('float32').fit(catalogue)
+    int8 = ContentBasedRecommender('int8').fit(catalogue)
+    rng = np.random.default_rng(0)
+    seed_lists = [rng.choice(len(catalogue), size=rng.integers(1, 4), replace=False).tolist() for _ in range(100)]
+    expected = float32.score_positions_batch(seed_lists, k=10)
+    actual = int8.score_positions_batch(seed_lists, k=10)
+    assert topk_overlap(expected, actual) >= 0.9
+    # Single and batched scoring agree on the quantised matrix
+    assert int8.score_positions(seed_lists[0], k=10)[0].tolist() == actual[0][0].tolist()
+
+
+def test_precision_report(catalogue):
+    reference = ContentBasedRecommender('float64').fit(catalogue)
+    report = ContentBasedRecommender('int8').fit(catalogue).precision_report(reference, n_queries=50)
+    assert report['precision'] == 'int8'
+    assert report['overlap'] >= 0.9
+    assert report['bytes'] < report['reference_bytes']
+
+
+def test_precision_report_of_an_attached_model_needs_a_reference(catalogue, tmp_path):
+    fitted = ContentBasedRecommender('int8').fit(catalogue)
+    path = export_shared_model(fitted, CatalogueFilter().fit(fitted.df), str(tmp_path / 'bundle'))
+    handle = SharedModelHandle(path)
+    attached = ContentBasedRecommender(handle.tfidf_precision).attach(
+        handle.catalogue(), handle.tfidf_matrix(), handle.title_index()
+    )
+    with pytest.raises(ValueError, match='reference'):
+        attached.precision_report()
+    reference = ContentBasedRecommender('float64').fit(catalogue)
+    assert attached.precision_report(reference, n_queries=20)['overlap'] >= 0.9
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.data.recommendation_store import RecommendationStore
+
+
+def test_processes_sharing_a_path_get_their_own_file(tmp_path):
+    path = str(tmp_path / 'lists')
+    first = RecommendationStore(path)
+    second = RecommendationStore(path)
+    assert (first.path, second.path) == (path + '.0', path + '.1')
+
+    first.put('alice', [3, 1], [0.9, 0.5], version=1)
+    assert second.get('alice', version=1) is None
+    second.close()
+    first.close()
+
+
+def test_lists_are_counted_and_not_kept_across_restarts(tmp_path):
+    path = str(tmp_path / 'lists')
+    store = RecommendationStore(path)
+    store.put('alice', [3, 1], [0.9, 0.5], version=1)
+    store.put('alice', [2], [0.7], version=1)
+    store.put('bob', [4, 5], [0.8, 0.1], version=2)
+    store.delete('carol', version=1)
+    assert (store.count(), store.count(1), store.nbytes()) == (2, 1, 8 + 16)
+    positions, scores = store.get('alice', version=1)
+    assert positions.tolist() == [2]
+    assert np.allclose(scores, [0.7])
+    assert store.drop_version(2) == 1
+    assert (store.count(), store.nbytes()) == (1, 8)
+    store.close()
+
+    # Versions restart at 1 in a new process: the old lists must not be served
+    reopened = RecommendationStore(path)
+    assert reopened.path == store.path
+    assert reopened.get('alice', version=1) is None
+    assert (reopened.count(), reopened.nbytes()) == (0, 0)
+    reopened.close()
+
+
+def test_in_memory_store():
+    store = RecommendationStore()
+    store.put('alice', [3, 1], [0.9, 0.5])
+    assert store.get('alice')[0].tolist() == [3, 1]
+    assert (len(store), store.nbytes()) == (1, 16)
+    store.delete('alice')
+    assert (len(store), store.nbytes()) == (0, 0)
@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_catalogue
+from src.app import create_app, routes
+from src.app.recommendation_engine import RecommendationEngine
+from src.app.user_manager import UserManager
+from src.data.event_log import write_ratings_snapshot
+from src.data.recommendation_store import RecommendationStore
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    for name in ('rec_engine', 'user_manager', 'compactor', 'model_manager', 'recommendation_store'):
+        monkeypatch.setattr(routes, name, None)
+    app = create_app({
+        'TESTING': True,
+        'USER_DATA_DIR': str(tmp_path / 'users'),
+        'EVENT_LOG_DIR': str(tmp_path / 'events'),
+        'RATINGS_PATH': None,
+        'PRECOMPUTE_INTERVAL': 0,
+        'MODEL_RELOAD_INTERVAL': 0,
+    })
+    yield app
+    if routes.model_manager is not None:
+        routes.model_manager.stop()
+    if routes.compactor is not None:
+        routes.compactor.stop()
+        routes.compactor.event_log.close()
+
+
+def test_concurrent_first_requests_initialise_once(app, monkeypatch):
+    df = make_catalogue(200)
+    builds = []
+
+    def build_engine(config, version):
+        builds.append(version)
+        time.sleep(0.2)  # keep the other first requests waiting on initialisation
+        return RecommendationEngine(df, user_manager=routes.user_manager, model_version=version)
+
+    monkeypatch.setattr(routes, 'build_engine', build_engine)
+    statuses = []
+
+    def first_request():
+        statuses.append(app.test_client().get('/api/survey').status_code)
+
+    threads = [threading.Thread(target=first_request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200] * 4
+    assert len(builds) == 1
+
+
+def test_metrics_enabled_defaults_to_environment(monkeypatch):
+    from src.app.instrumentation import REGISTRY
+    monkeypatch.setattr(REGISTRY, 'enabled', REGISTRY.enabled)
+
+    monkeypatch.setenv('METRICS_ENABLED', '0')
+    assert create_app({'TESTING': True}).config['METRICS_ENABLED'] is False
+    assert REGISTRY.enabled is False
+
+    monkeypatch.setenv('METRICS_ENABLED', '1')
+    assert create_app({'TESTING': True}).config['METRICS_ENABLED'] is True
+    assert create_app({'TESTING': True, 'METRICS_ENABLED': False}).config['METRICS_ENABLED'] is False
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    engine = RecommendationEngine(make_catalogue(200))
+    monkeypatch.setattr(routes, 'rec_engine', engine)
+    return app.test_client(), engine
+
+
+def test_title_endpoint_returns_the_resolved_title(client):
+    client, engine = client
+    title = engine.df['title'].iloc[5]
+    data = client.get(f'/api/title/{title}x').get_json()
+    assert data['title'] == title + 'x'
+    assert data['resolved_title'] == title
+
+    assert client.get('/api/title/zzzzqqqq').get_json()['resolved_title'] is None
+    assert client.get(f'/api/title/{title}?n=x').status_code == 400
+
+
+def test_search_rejects_non_integer_limit(client):
+    client, _ = client
+    assert client.get('/api/search?q=a&limit=x').status_code == 400
+    assert client.get('/api/search?q=a&limit=0').status_code == 400
+    assert client.get('/api/search?q=a&limit=-3').status_code == 400
+    assert client.get('/api/search?q=a&limit=3').status_code == 200
+
+
+def test_rate_rejects_ratings_outside_one_to_five(client):
+    client, _ = client
+    for rating in ('abc', True, 0, 6, None):
+        response = client.post('/api/user/alice/rate', json={'title': 'Dark', 'rating': rating})
+        assert response.status_code == 400
+
+
+def test_failed_initialisation_releases_the_store_and_user_manager(app, tmp_path, monkeypatch):
+    path = str(tmp_path / 'lists')
+    app.config['PRECOMPUTED_STORE_PATH'] = path
+
+    def build_engine(config, version):
+        raise RuntimeError('bad catalogue')
+
+    monkeypatch.setattr(routes, 'build_engine', build_engine)
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/api/survey')
+    assert routes.recommendation_store is None
+    assert routes.user_manager is None
+
+    store = RecommendationStore(path)
+    assert store.path == path + '.0'
+    store.close()
+
+
+def test_training_ratings_key_users_by_string_id(tmp_path, monkeypatch):
+    engine = RecommendationEngine(make_catalogue(200))
+    show_ids, titles = engine.df['show_id'].values, engine.df['title'].values
+    ratings_path = str(tmp_path / 'ratings.csv')
+    pd.DataFrame({
+        'user_id': [5, 5, 7, 7],
+        'show_id': [show_ids[0], show_ids[1], show_ids[0], show_ids[2]],
+        'rating': [1, 4, 5, 3]
+    }).to_csv(ratings_path, index=False)
+    snapshot_path = str(tmp_path / 'ratings_snapshot.npz')
+    write_ratings_snapshot(snapshot_path, pd.DataFrame({
+        'user_id': ['5'], 'title': [titles[0]], 'rating': [5.0], 'timestamp': [1.0], 'writer': [0], 'seq': [1]
+    }))
+    monkeypatch.setattr(routes, 'compactor', SimpleNamespace(snapshot_path=snapshot_path))
+
+    ratings = routes.training_ratings(engine, {'RATINGS_PATH': ratings_path})
+    engine.fit_collaborative(ratings)
+    assert engine.collab_model.knows_user('7')
+    # One row per user; the event's rating replaces the older CSV rating
+    assert list(engine.collab_model.user_item_matrix.index) == ['5', '7']
+    assert engine.collab_model.user_item_matrix.loc['5', show_ids[0]] == 5
+
+
+@pytest.mark.parametrize('line, error', [
+    ('{"type": "rating", "user_id": "../x", "title": "Dark", "rating": 4}', 'user_id'),
+    ('{"type": "rating", "user_id": true, "title": "Dark", "rating": 4}', 'user_id'),
+    ('{"type": "watch", "user_id": ".hidden", "title": "Dark"}', 'user_id'),
+    ('{"type": "watch", "title": "Dark"}', 'Missing user_id'),
+    ('{"type": "rating", "user_id": "alice", "title": "Dark", "rating": "abc"}', 'rating'),
+    ('{"type": "watch", "user_id": "alice", "title": "Dark", "timestamp": -1}', 'timestamp'),
+    ('{"type": "watch", "user_id": "alice", "title": "Dark", "timestamp": 4e9}', 'timestamp'),
+    ('{"type": "watch", "user_id": "alice", "title": "Dark", "timestamp": NaN}', 'timestamp'),
+    ('{"type": "watch", "user_id": "alice", "title": "Dark", "timestamp": true}', 'timestamp'),
+    ('{"type": "share", "user_id": "alice", "title": "Dark"}', 'type'),
+    ('[1, 2]', 'object'),
+    ('{', 'JSON'),
+])
+def test_parse_event_rejects_invalid_lines(line, error):
+    with pytest.raises(ValueError, match=error):
+        routes.parse_event(line)
+
+
+def test_parse_event_accepts_valid_events():
+    now = time.time()
+    assert routes.parse_event(f'{{"type": "rating", "user_id": 7, "title": "Dark", "rating": 4.5, "timestamp": {now}}}') == {
+        'type': 'rating', 'user_id': '7', 'title': 'Dark', 'rating': 4.5, 'timestamp': now
+    }
+    assert routes.parse_event('{"type": "like", "user_id": "a.b@c", "title": "Dark"}')['user_id'] == 'a.b@c'
+
+
+@pytest.fixture
+def bulk_client(client, tmp_path, monkeypatch):
+    client, engine = client
+    users = UserManager(str(tmp_path / 'bulk-users'))
+    monkeypatch.setattr(routes, 'user_manager', users)
+    return client, engine, users
+
+
+def test_bulk_ingestion_reports_a_status_per_line(bulk_client):
+    client, engine, users = bulk_client
+    title = engine.df['title'].iloc[0]
+    body = '\n'.join([
+        f'{{"type": "rating", "user_id": "alice", "title": "{title}", "rating": 5}}',
+        '',
+        '{"type": "rating", "user_id": "../etc", "title": "Dark", "rating": 5}',
+        f'{{"type": "watch", "user_id": "bob", "title": "{title}"}}',
+    ])
+    data = client.post('/api/events/bulk', data=body).get_json()
+    assert (data['accepted'], data['rejected']) == (2, 1)
+    assert [(r['line'], r['status']) for r in data['results']] == [(1, 'accepted'), (3, 'rejected'), (4, 'accepted')]
+    assert users.get_profile('alice')['ratings'] == {title: 5}
+    assert [entry['title'] for entry in users.get_profile('bob')['watch_history']] == [title]
+
+
+def test_bulk_ingestion_limits_batch_size(app, bulk_client):
+    client, _, _ = bulk_client
+    line = '{"type": "watch", "user_id": "alice", "title": "Dark"}\n'
+    app.config['BULK_MAX_EVENTS'] = 2
+    assert client.post('/api/events/bulk', data=line * 3).status_code == 413
+    assert client.post('/api/events/bulk', data='\n\n').status_code == 400
+
+    app.config['MAX_CONTENT_LENGTH'] = len(line) * 2
+    response = client.post('/api/events/bulk', data=line * 3)
+    assert response.status_code == 413
+    assert response.get_json()['success'] is False
+
+
+def test_rated_title_is_not_recommended_back(client, tmp_path, monkeypatch):
+    client, _ = client
+    users = UserManager(str(tmp_path / 'rating-users'))
+    engine = RecommendationEngine(make_catalogue(200), user_manager=users)
+    monkeypatch.setattr(routes, 'user_manager', users)
+    monkeypatch.setattr(routes, 'rec_engine', engine)
+    title = engine.df['title'].iloc[3]
+
+    # The rating puts the title at the top of trending
+    data = client.post('/api/user/newcomer/rate', json={'title': title, 'rating': 5}).get_json()
+    assert engine.trending.top(1)[0][0] == 3
+    assert len(data['recommendations']) == 5
+    assert title not in [r['title'] for r in data['recommendations']]
+
+    recommendations = engine.recommend_for_user('newcomer', n=len(engine.df))
+    assert len(recommendations) == len(engine.df) - 1
+    assert title not in [r['title'] for r in recommendations]
+
+
+def test_user_endpoints_reject_unsafe_ids(client):
+    client, _ = client
+    assert client.get('/api/user/..%2Fx/profile').status_code in (400, 404)
+    assert client.get('/api/user/.x/profile').status_code == 400
+    assert client.post('/api/user/.x/rate', json={'title': 'Dark', 'rating': 4}).status_code == 400
+    assert client.post('/api/recommendations', json={'user_id': '../x'}).status_code == 400
+
+
+def test_title_endpoint_resolves_a_misspelled_title_once(client, monkeypatch):
+    client, engine = client
+    title_index = engine.content_model.title_index
+    calls = []
+    fuzzy = title_index.fuzzy
+    monkeypatch.setattr(title_index, 'fuzzy', lambda *args, **kwargs: calls.append(args) or fuzzy(*args, **kwargs))
+
+    title = engine.df['title'].iloc[5]
+    data = client.get(f'/api/title/{title}x?n=3').get_json()
+    assert len(calls) == 1
+    assert len(data['similar']) == 3
+
+
+def test_background_work_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.delenv('RECOMMENDER_SETTINGS', raising=False)
+    config = create_app({'TESTING': True}).config
+    assert (config['EVENT_LOG_DIR'], config['PRECOMPUTE_INTERVAL'], config['MODEL_RELOAD_INTERVAL']) == (None, 0, 0)
+
+    monkeypatch.setenv('RECOMMENDER_SETTINGS', os.path.abspath('config/production.cfg'))
+    config = create_app({'TESTING': True, 'PRECOMPUTE_INTERVAL': 5}).config
+    assert (config['EVENT_LOG_DIR'], config['MODEL_RELOAD_INTERVAL']) == ('data/events', 300)
+    assert config['PRECOMPUTE_INTERVAL'] == 5  # explicit config still wins
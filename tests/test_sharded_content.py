@@ -0,0 +1,79 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.synthetic import make_catalogue
+from src.models.sharded_content import ShardedContentRecommender
+
+
+@pytest.fixture(scope='module')
+def catalogue():
+    return make_catalogue(300)
+
+
+@pytest.fixture
+def model(catalogue):
+    model = ShardedContentRecommender(n_shards=2).fit(catalogue)
+    yield model
+    model.close()
+
+
+def scores(model):
+    positions, values = model.score_positions([1, 2, 3], k=10)
+    return positions.tolist(), values.round(6).tolist()
+
+
+def test_dead_shard_is_respawned(model):
+    expected = scores(model)
+    model._shards[1].process.kill()
+    model._shards[1].process.join()
+
+    assert scores(model) == expected
+    assert model.healthy and model.restarts == 1
+
+
+def test_failure_part_way_through_a_scatter_never_reuses_the_pipes(model, monkeypatch):
+    expected = scores(model)
+    conn = model._shards[1].conn
+
+    def broken_send(message):
+        raise BrokenPipeError
+    # Shard 0 has already been sent its request when shard 1's send fails
+    monkeypatch.setattr(conn, 'send', broken_send, raising=False)
+
+    assert scores(model) == expected
+    assert model.restarts == 1
+    assert conn not in [shard.conn for shard in model._shards]
+    assert scores(model) == expected
+
+
+def test_closed_model_raises(model):
+    model.close()
+    with pytest.raises(RuntimeError):
+        model.score_positions([1], k=5)
+
+
+def test_concurrent_queries_overlap_and_match_sequential_results(model):
+    seed_lists = [[i, i + 1] for i in range(0, 40, 2)]
+    expected = [model.score_positions(seeds, k=10)[0].tolist() for seeds in seed_lists]
+    results = [None] * len(seed_lists)
+
+    def query(i):
+        results[i] = model.score_positions(seed_lists[i], k=10)[0].tolist()
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(len(seed_lists))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == expected
+    assert model.restarts == 0
+
+
+def test_coordinator_does_not_keep_the_text_features(model, catalogue):
+    assert 'soup' not in model.df.columns
+    assert model.df['title'].tolist() == catalogue['title'].tolist()
+    block_dir = model._block_dir
+    model.close()
+    assert not os.path.exists(block_dir)
@@ -0,0 +1,73 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_catalogue
+from src.app.recommendation_engine import RecommendationEngine
+from src.models.shared_model import SharedModelHandle, export_shared_model, read_manifest, remove_stale_bundles
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    return RecommendationEngine(make_catalogue(300))
+
+
+def export(engine, path):
+    return export_shared_model(engine.content_model, engine.catalogue_filter, str(path))
+
+
+def test_attached_engine_matches_the_fitted_one(fitted, tmp_path):
+    attached = RecommendationEngine.from_shared(SharedModelHandle(export(fitted, tmp_path / 'bundle')))
+
+    title = fitted.df['title'].iloc[3]
+    assert attached.recommend_similar(title, n=10) == fitted.recommend_similar(title, n=10)
+    filters = {'type': 'Movie', 'year_min': 2000}
+    assert np.array_equal(attached.catalogue_filter.mask(filters), fitted.catalogue_filter.mask(filters))
+    assert attached.search_titles(title[:-1] + 'x') == fitted.search_titles(title[:-1] + 'x')
+    assert attached.df['title'].tolist() == fitted.df['title'].tolist()
+    assert list(attached.text_columns['description']) == fitted.df['description'].tolist()
+
+
+def test_int8_bundle_keeps_the_quantised_matrix(tmp_path):
+    engine = RecommendationEngine(make_catalogue(200), content_precision='int8')
+    handle = SharedModelHandle(export(engine, tmp_path / 'bundle'))
+    assert handle.tfidf_precision == 'int8'
+    attached = RecommendationEngine.from_shared(handle)
+    seeds = [1, 2]
+    expected = engine.content_model.score_positions(seeds, k=10)
+    actual = attached.content_model.score_positions(seeds, k=10)
+    assert actual[0].tolist() == expected[0].tolist()
+    assert np.allclose(actual[1], expected[1])
+
+
+def test_attached_handle_survives_removal_of_its_bundle(fitted, tmp_path):
+    path = export(fitted, tmp_path / 'bundle')
+    engine = RecommendationEngine.from_shared(SharedModelHandle(path))
+    remove_stale_bundles(str(tmp_path), keep=export(fitted, tmp_path / 'newer'))
+    assert read_manifest(path) is None
+    assert len(engine.recommend_similar(engine.df['title'].iloc[0], n=5)) == 5
+
+
+def test_only_older_bundles_of_the_same_precision_are_removed(fitted, tmp_path):
+    older = export(fitted, tmp_path / 'older')
+    time.sleep(0.01)
+    other_precision = RecommendationEngine(make_catalogue(50), content_precision='float32')
+    kept_float32 = export(other_precision, tmp_path / 'float32')
+    current = export(fitted, tmp_path / 'current')
+    time.sleep(0.01)
+    newer = export(fitted, tmp_path / 'newer')
+
+    remove_stale_bundles(str(tmp_path), keep=current)
+    assert sorted(os.listdir(tmp_path)) == ['current', 'float32', 'newer']
+    assert read_manifest(kept_float32) is not None and read_manifest(newer) is not None
+    assert read_manifest(older) is None
+
+
+def test_export_to_an_existing_bundle_keeps_the_first(fitted, tmp_path):
+    path = export(fitted, tmp_path / 'bundle')
+    created = read_manifest(path)['created']
+    export(fitted, tmp_path / 'bundle')
+    assert read_manifest(path)['created'] == created
+    assert [name for name in os.listdir(tmp_path) if '.tmp-' in name] == []
@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks.synthetic import make_catalogue, misspell
+from src.models.title_index import TitleSearchIndex, normalize_title, title_trigrams
+
+TITLES = ['The Crown', 'Crown Heights', 'Amélie', 'Dark', 'Dark Matter', 'Darker', 'Ozark', 'dark', 'Spider-Man: Far From Home']
+
+
+@pytest.fixture(scope='module')
+def index():
+    return TitleSearchIndex().fit(TITLES + [None])
+
+
+def test_normalize_title_strips_accents_case_and_punctuation():
+    assert normalize_title('  Spider-Man: Far  From Home! ') == 'spider man far from home'
+    assert normalize_title('Amélie') == 'amelie'
+    assert normalize_title(None) == ''
+    assert title_trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+def test_lookup_is_exact_up_to_case_and_punctuation(index):
+    assert index.lookup('the crown') == 0
+    assert index.lookup('AMELIE') == 2
+    assert index.lookup('spider man far from home') == 8
+    assert index.lookup('dark') == 3  # first row wins
+    assert index.lookup('Drak') is None
+    assert index.lookup(42) is None
+    assert len(index) == len(TITLES) + 1
+
+
+def test_autocomplete_returns_prefix_matches_alphabetically(index):
+    assert index.autocomplete('dar') == [3, 7, 4, 5]
+    assert index.autocomplete('Dark M') == [4]
+    assert index.autocomplete('dar', limit=2) == [3, 7]
+    assert index.autocomplete('  ') == []
+    assert index.autocomplete('zzz') == []
+
+
+def test_fuzzy_ranks_by_trigram_similarity(index):
+    matches = index.fuzzy('The Crwn')
+    assert matches[0][0] == 0
+    scores = [score for _, score in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert all(score >= 0.3 for score in scores)
+    assert index.fuzzy('qqqq') == []
+    # Equal scores: lower row first
+    assert [pos for pos, _ in index.fuzzy('dark', limit=2)] == [3, 7]
+    assert index.fuzzy('dark', limit=0) == index.fuzzy('dark', limit=-1) == []
+    assert index.search('dark', limit=0) == []
+
+
+def test_resolve_prefers_exact_then_fuzzy(index):
+    assert index.resolve('Ozark') == 6
+    assert index.resolve('Ozzark') == 6
+    assert index.resolve('Amelei') == 2
+    assert index.resolve('completely different') is None
+
+
+def test_search_orders_exact_prefix_then_fuzzy_without_duplicates(index):
+    results = index.search('dark', limit=5)
+    assert [(r['id'], r['match']) for r in results[:4]] == [(3, 'exact'), (7, 'prefix'), (4, 'prefix'), (5, 'prefix')]
+    assert results[4]['match'] == 'fuzzy'
+    assert len({r['id'] for r in results}) == len(results) == 5
+    assert index.search('crown heights')[0] == {'id': 1, 'title': 'Crown Heights', 'score': 1.0, 'match': 'exact'}
+
+
+def test_misspelled_catalogue_titles_resolve_within_the_candidate_budget():
+    titles = make_catalogue(2000)['title'].tolist()
+    index = TitleSearchIndex(candidate_budget=200).fit(titles)
+    sample = titles[::40]
+    resolved = [index.resolve(typo) for typo in misspell(sample)]
+    hits = sum(pos is not None and titles[pos] == title for pos, title in zip(resolved, sample))
+    assert hits >= 0.9 * len(sample)
@@ -0,0 +1,45 @@
+import random
+import time
+
+import pandas as pd
+
+from src.models.trending import TrendingIndex
+
+CATALOGUE = pd.DataFrame({
+    'type': ['Movie', 'TV Show'] * 20,
+    'listed_in': ['Dramas, Comedies', 'Dramas', 'Documentaries', 'Comedies, Thrillers'] * 10,
+})
+
+
+def brute_force_top(index, n, item_type=None, genre=None):
+    ranked = []
+    for pos in range(len(CATALOGUE)):
+        row = CATALOGUE.iloc[pos]
+        genres = [g.strip().lower() for g in row['listed_in'].split(',')]
+        if item_type and row['type'].lower() != item_type.lower():
+            continue
+        if genre and genre.lower() not in genres:
+            continue
+        if index.scores[pos] > 0:
+            ranked.append((-index.scores[pos], pos))
+    return [pos for _, pos in sorted(ranked)[:n]]
+
+
+def test_future_timestamp_is_capped_at_now():
+    index = TrendingIndex(CATALOGUE)
+    index.record(3, timestamp=4e9)
+    assert index.landmark <= time.time()
+    assert [pos for pos, _ in index.top(5)] == [3]
+    assert index.current_scores([3])[0] <= 1.0 + 1e-9
+
+
+def test_incremental_top_lists_match_brute_force():
+    index = TrendingIndex(CATALOGUE, top_n=5)
+    rng = random.Random(0)
+    now = time.time()
+    for i in range(2000):
+        index.record(rng.randrange(len(CATALOGUE)), timestamp=now - 3600 * rng.random())
+
+    for item_type, genre in [(None, None), ('movie', None), (None, 'dramas'), ('TV Show', 'Comedies')]:
+        expected = brute_force_top(index, 5, item_type, genre)
+        assert [pos for pos, _ in index.top(5, item_type=item_type, genre=genre)] == expected